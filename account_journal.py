@@ -0,0 +1,273 @@
+"""This module is the append-only journal of account changes. Instead of rewriting every line of
+accounts.txt when one balance changes, each change (a new account, a credit, a debit, a new password,
+a rename, an email change or a deletion) is added to the end of accounts.journal as one JSON line.
+accounts.txt becomes a snapshot that is rewritten now and then, in the background, with the journal folded in."""
+
+import json
+import os
+
+from auth import ACCOUNTS_FILE, credential_key
+from account_shards import read_manifest
+from commit_coordinator import CommitTicket, GroupCommitter
+from jsonl_file import append_durably, read_entries
+from money_ledger import to_kobo, to_naira
+
+JOURNAL_FILE = os.path.join("data", "accounts.journal")
+
+COMPACT_EVERY = 1000  # journal entries before accounts.txt is rewritten with them folded in
+
+
+def read_snapshot_seq(accounts_file: str = ACCOUNTS_FILE) -> int:
+    """
+    Returns the last journal entry the snapshot already includes: the '#seq=N' first line of accounts.txt,
+    or the manifest's seq when the accounts are sharded. 0 if there is none.
+    """
+
+    manifest = read_manifest()
+
+    if manifest is not None:
+        return manifest["seq"]
+
+    try:
+        with open(accounts_file, 'r') as f:
+            first_line = f.readline().strip()
+
+    except FileNotFoundError:
+        return 0
+
+    if first_line.startswith("#seq="):
+        return int(first_line[len("#seq="):])
+
+    return 0
+
+
+def balance_change(entry: dict) -> int:
+    """The kobo a credit entry adds to the balance, or a debit entry takes from it (as a negative number)."""
+
+    kobo = entry["kobo"] if "kobo" in entry else to_kobo(entry["amount"])  # older entries kept naira as a float
+
+    return kobo if entry["op"] == "credit" else -kobo
+
+
+def apply_entry(accounts: dict, entry: dict) -> None:
+    """Replays one journal entry on a {credential_key(username): account} dictionary."""
+
+    op = entry["op"]
+
+    key = credential_key(entry["user"])
+
+    if op == "create":
+        accounts[key] = dict(entry["account"])
+
+        return
+
+    account = accounts.get(key)
+
+    if account is None:
+        if op == "rename" and "account" in entry:
+            accounts[credential_key(entry["new_username"])] = dict(entry["account"])  # renamed from a shard not loaded
+
+        return  # nothing to change; the account was already deleted, or lives in a shard not loaded
+
+    if op in ("credit", "debit"):
+        account['balance'] = to_naira(to_kobo(account['balance']) + balance_change(entry))
+
+    elif op == "password":
+        account['password_hash'] = entry["password_hash"]
+
+    elif op == "email":
+        account['email'] = entry["email"]
+
+    elif op == "rename":
+        del accounts[key]
+
+        account['username'] = entry["new_username"]
+
+        accounts[credential_key(entry["new_username"])] = account
+
+    elif op == "delete":
+        del accounts[key]
+
+
+class AccountJournal:
+    """
+    The journal file itself. Every entry gets the next sequence number, and accounts.txt remembers the
+    last one it includes, so replaying after a crash never applies an entry twice.
+
+    Compaction first moves the journal aside (rotate), then writes the snapshot, then deletes the moved
+    file (finish_rotation). Until the last step the moved file is still replayed on startup.
+    """
+
+    def __init__(self, path: str = JOURNAL_FILE, compact_every: int = COMPACT_EVERY):
+        self.path = path
+
+        self.rotated_path = path + ".old"
+
+        self.compact_every = compact_every
+
+        self.seq = 0
+
+        self.entries = 0  # entries written since the last rotation
+
+        self._committer = GroupCommitter(self._write_lines, name="journal-writer")
+
+        self._offset = 0  # how far into the journal file we have read, see read_new
+
+        self._end = 0  # where our next entry goes, once the ones we have queued are written
+
+        self.touched: set[str] = set()  # credential keys of the users the current file changes
+
+        self.rotated_touched: set[str] = set()  # and those the rotated file changes
+
+    def replay(self, accounts: dict, after_seq: int) -> None:
+        """Applies every entry newer than after_seq, from the rotated file and then the current one."""
+
+        self.seq = after_seq
+
+        self.entries = 0
+
+        self._offset = self._end = 0
+
+        self.touched, self.rotated_touched = set(), set()
+
+        for path in (self.rotated_path, self.path):
+            for _, end, entry in read_entries(path):
+                if path == self.path:
+                    self._offset = end
+
+                if entry is None or entry["seq"] <= after_seq:
+                    continue
+
+                apply_entry(accounts, entry)
+
+                self._touch(entry, self.rotated_touched if path == self.rotated_path else self.touched)
+
+                self.seq = max(self.seq, entry["seq"])
+
+                self.entries += 1
+
+    def entries_after(self, after_seq: int):
+        """
+        Yields the entries newer than after_seq that this journal has read so far, from the rotated file and
+        then the current one, without moving its position. Used to bring one shard's accounts up to date.
+        """
+
+        for path in (self.rotated_path, self.path):
+            for _, _, entry in read_entries(path):
+                if entry is not None and after_seq < entry["seq"] <= self.seq:
+                    yield entry
+
+    def read_new(self) -> list[dict] | None:
+        """
+        Returns the entries other sessions appended since we last looked, or None if we can't follow on
+        from where we were (another session compacted in the meantime) and everything has to be reloaded.
+        Call with the accounts lock held. Every session appends only after catching up, so seq numbers
+        have no gaps: a gap means entries went into a snapshot we haven't read.
+        """
+
+        if read_snapshot_seq() > self.seq:
+            return None
+
+        try:
+            size = os.path.getsize(self.path)
+
+        except FileNotFoundError:
+            return []
+
+        if size < self._offset:
+            return None
+
+        if size == self._offset:
+            return []
+
+        new_entries = []
+
+        for _, self._offset, entry in read_entries(self.path, self._offset):
+            if entry is None or entry["seq"] <= self.seq:
+                continue  # damaged, or one of ours, already applied
+
+            if entry["seq"] != self.seq + 1:
+                return None
+
+            new_entries.append(entry)
+
+            self._touch(entry, self.touched)
+
+            self.seq = entry["seq"]
+
+            self.entries += 1
+
+        return new_entries
+
+    def append(self, op: str, user: str, **fields) -> CommitTicket:
+        """
+        Queues one entry for the end of the journal (call with the exclusive lock held, after read_new, so
+        seq numbers stay unique across sessions). Costs the same however many accounts there are.
+        Entries queued close together are written with one fsync; wait on the returned ticket to know
+        this one is on disk. Entries reach the file in the order they were appended.
+        """
+
+        self.seq += 1
+
+        entry = {"seq": self.seq, "op": op, "user": user, **fields}
+
+        self._touch(entry, self.touched)
+
+        self.entries += 1
+
+        line = json.dumps(entry) + "\n"
+
+        # after the last complete line we read, or after the entries of ours still waiting to be written
+        offset = max(self._offset, self._end)
+
+        self._end = offset + len(line.encode())
+
+        return self._committer.submit((offset, line))
+
+    @staticmethod
+    def _touch(entry: dict, touched: set[str]) -> None:
+        touched.add(credential_key(entry["user"]))
+
+        if entry["op"] == "rename":
+            touched.add(credential_key(entry["new_username"]))
+
+    def _write_lines(self, items: list[tuple[int, str]]) -> None:
+        # a half-written line left by a crash is cut off before the batch goes in after it
+        append_durably(self.path, "".join(line for _, line in items), expected_size=items[0][0])
+
+    def needs_compaction(self) -> bool:
+        return self.entries >= self.compact_every
+
+    def rotate(self) -> int:
+        """Moves the current entries aside and returns the seq the next snapshot must be written with."""
+
+        self._committer.flush()  # everything up to self.seq has to be in the file we move
+
+        if os.path.exists(self.path):
+            if os.path.exists(self.rotated_path):
+                # an earlier compaction didn't finish: keep both sets of entries together
+                with open(self.rotated_path, 'a') as rotated, open(self.path, 'r') as current:
+                    rotated.write(current.read())
+
+                os.remove(self.path)
+
+            else:
+                os.replace(self.path, self.rotated_path)
+
+        self.entries = 0
+
+        self._offset = self._end = 0  # the next journal file starts empty
+
+        self.rotated_touched |= self.touched
+
+        self.touched = set()
+
+        return self.seq
+
+    def finish_rotation(self) -> None:
+        """Called once the snapshot holding the rotated entries is safely on disk."""
+
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+
+        self.rotated_touched = set()
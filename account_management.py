@@ -1,5 +1,10 @@
 import os
-from auth import _get_all_accounts, _save_accounts, _hash_password, _check_password_strength, generate_strong_password
+import re
+import time
+import shop_service
+from passwords import check_password_strength, generate_strong_password
+from account_store import get_account_repository
+from money_ledger import to_naira
 
 ACCOUNTS_FILE = os.path.join("data", "accounts.txt")
 
@@ -8,7 +13,7 @@ def _authenticate_user_password(current_user: dict) -> bool:
 
     password = input("Please enter your password to confirm: ").strip()
 
-    if _hash_password(password) == current_user['password_hash']:
+    if shop_service.check_password(current_user, password):
 
         return True
 
@@ -80,20 +85,9 @@ def fund_wallet(current_user: dict):
 
                     continue
 
-            current_user['balance'] += fund_amount
+            result = shop_service.fund_wallet(current_user, fund_amount)  # adds to the latest balance, even if another session changed it
 
-            accounts = _get_all_accounts()
-
-            for i, acc in enumerate(accounts):
-
-                if acc['username'] == current_user['username']:
-                    accounts[i] = current_user
-
-                    break
-
-            _save_accounts(accounts)
-
-            print(f"Wallet funded successfully! Your new balance is NGN {current_user['balance']:,.2f}")
+            print(result.message)
 
             cont_choice = input("Continue funding (Y/N)? ").strip().upper()
 
@@ -117,14 +111,13 @@ def change_username(current_user: dict):
     if not _authenticate_user_password(current_user):
         return
 
-    accounts = _get_all_accounts()
+    accounts = get_account_repository()
 
     while True:
 
         new_username = input("Enter new username: ").strip()
 
-        if any(acc['username'].lower() == new_username.lower() for acc in accounts if
-               acc['username'] != current_user['username']):
+        if accounts.username_taken(new_username, ignore=current_user):
 
             print("Username already taken. Please choose another.")
 
@@ -132,19 +125,9 @@ def change_username(current_user: dict):
 
             break
 
-    current_user['username'] = new_username
-
-    for i, acc in enumerate(accounts):
-
-        if acc['email'] == current_user['email']:  # Use unique identifier to find
-
-            accounts[i] = current_user
-
-            break
-
-    _save_accounts(accounts)
+    result = shop_service.change_username(current_user, new_username)  # the wallet history, saved cart and orders move with the account
 
-    print(f"Username changed successfully to: {new_username}")
+    print(result.message)
 
 
 def change_email(current_user: dict):
@@ -155,7 +138,7 @@ def change_email(current_user: dict):
     if not _authenticate_user_password(current_user):
         return
 
-    accounts = _get_all_accounts()
+    accounts = get_account_repository()
 
     while True:
 
@@ -165,8 +148,7 @@ def change_email(current_user: dict):
 
             print("Invalid email format. Please try again.")
 
-        elif any(
-                acc['email'].lower() == new_email.lower() for acc in accounts if acc['email'] != current_user['email']):
+        elif accounts.email_taken(new_email, ignore=current_user):
 
             print("Email already registered. Please choose another.")
 
@@ -174,19 +156,7 @@ def change_email(current_user: dict):
 
             break
 
-    current_user['email'] = new_email
-
-    for i, acc in enumerate(accounts):
-
-        if acc['username'] == current_user['username']:  # Use unique identifier to find
-
-            accounts[i] = current_user
-
-            break
-
-    _save_accounts(accounts)
-
-    print(f"Email changed successfully to: {new_email}")
+    print(shop_service.change_email(current_user, new_email).message)
 
 
 def change_password(current_user: dict):
@@ -207,7 +177,7 @@ def change_password(current_user: dict):
 
                 new_password = input("Enter new password (min 16 chars, 1 lower, 1 upper, 1 num, 1 special): ").strip()
 
-                if _check_password_strength(new_password):
+                if check_password_strength(new_password):
 
                     break
 
@@ -231,20 +201,7 @@ def change_password(current_user: dict):
 
             print("Invalid choice. Please enter 'M' or 'A'.")
 
-    current_user['password_hash'] = _hash_password(new_password)
-
-    accounts = _get_all_accounts()
-
-    for i, acc in enumerate(accounts):
-
-        if acc['username'] == current_user['username']:
-            accounts[i] = current_user
-
-            break
-
-    _save_accounts(accounts)
-
-    print("Password changed successfully!")
+    print(shop_service.change_password(current_user, new_password).message)
 
 
 def view_account_details(current_user: dict):
@@ -261,6 +218,29 @@ def view_account_details(current_user: dict):
 
     print(f"Balance: NGN {current_user['balance']:,.2f}")
 
+    details = shop_service.account_details(current_user, limit=5)
+
+    if details.activity:
+
+        print("\nRecent wallet activity:")
+
+        for entry in details.activity:
+
+            sign = "+" if entry['kind'] == "credit" else "-"
+
+            print(f"  {sign}NGN {to_naira(entry['amount']):,.2f}  {entry['note']}  (balance NGN {to_naira(entry['balance']):,.2f})")
+
+    if details.orders:
+
+        print("\nRecent orders:")
+
+        for order in details.orders:
+
+            items = ", ".join(f"{line['name']} x{line['quantity']}" for line in order['lines'])
+
+            print(f"  #{order['order']}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(order['time']))}  "
+                  f"NGN {to_naira(order['total']):,.2f}  {items}")
+
 
 def reset_balance(current_user: dict):
     """Resets user's wallet balance to zero."""
@@ -274,20 +254,7 @@ def reset_balance(current_user: dict):
 
     if confirm == 'Y':
 
-        current_user['balance'] = 0.00
-
-        accounts = _get_all_accounts()
-
-        for i, acc in enumerate(accounts):
-
-            if acc['username'] == current_user['username']:
-                accounts[i] = current_user
-
-                break
-
-        _save_accounts(accounts)
-
-        print("Your balance has been reset to NGN 0.00.")
+        print(shop_service.reset_balance(current_user).message)
 
     else:
 
@@ -307,13 +274,7 @@ def delete_account(current_user: dict):
 
     if confirm == 'Y':
 
-        accounts = _get_all_accounts()
-
-        accounts = [acc for acc in accounts if acc['username'] != current_user['username']]
-
-        _save_accounts(accounts)
-
-        print("Your account has been successfully deleted.")
+        print(shop_service.delete_account(current_user).message)  # the wallet ledger and order log keep its history
 
         return True  # Indicate account was deleted
 
@@ -0,0 +1,217 @@
+"""This module lets the accounts be split over several files instead of one big accounts.txt. Each account
+goes to the shard picked by a hash of its case-folded username, so one account is always in the same
+file, and a compaction only rewrites the shards whose accounts changed since the last one.
+
+The layout lives in data/accounts/: manifest.json names the current file of every shard and the last
+journal seq they include. Shards are written as new files and then the manifest is swapped in, so a
+crash never leaves half the shards new and half old. The single accounts.txt stays the default; convert
+either way with the resharding tool, which streams the accounts one line at a time:
+
+    python account_shards.py 16     # split into 16 shards
+    python account_shards.py 1      # back to a single accounts.txt"""
+
+import json
+import os
+import sys
+import zlib
+
+from auth import (ACCOUNTS_FILE, accounts_lock, credential_key, _format_account_line, _parse_account_line,
+                  _write_accounts_file)
+from jsonl_file import write_atomically
+
+SHARD_DIR = os.path.join("data", "accounts")
+
+MANIFEST_FILE = os.path.join(SHARD_DIR, "manifest.json")
+
+
+def shard_of(username: str, shards: int) -> int:
+    """The shard an account lives in. crc32 rather than hash(), which changes every time Python starts."""
+
+    return zlib.crc32(credential_key(username).encode()) % shards
+
+
+def read_manifest() -> dict | None:
+    """Returns {"shards", "seq", "generation", "files"}, or None when the accounts aren't sharded."""
+
+    try:
+        with open(MANIFEST_FILE, 'r') as f:
+            return json.load(f)
+
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(manifest: dict) -> None:
+    write_atomically(MANIFEST_FILE, json.dumps(manifest))
+
+
+def _iter_file(path: str):
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                account = _parse_account_line(line)
+
+                if account is not None:
+                    yield account
+
+    except FileNotFoundError:
+        return
+
+
+def iter_shard(manifest: dict, index: int):
+    """Yields the accounts of one shard, as of the manifest's seq."""
+
+    return _iter_file(os.path.join(SHARD_DIR, manifest["files"][index]))
+
+
+def iter_sharded_accounts(manifest: dict | None = None):
+    """Yields every account, shard by shard, without holding more than one line in memory."""
+
+    manifest = manifest or read_manifest()
+
+    for index in range(manifest["shards"]):
+        yield from iter_shard(manifest, index)
+
+
+def _write_shard_file(path: str, accounts) -> None:
+    with open(path, 'w') as f:
+        for account in accounts:
+            f.write(_format_account_line(account))
+
+        f.flush()
+
+        os.fsync(f.fileno())
+
+
+def save_shards(accounts: list[dict], seq: int, touched: set[str]) -> None:
+    """
+    Compaction for the sharded layout: rewrites only the shards holding a touched username (a credential
+    key from the journal) with the accounts that belong in them, then swaps in the new manifest.
+    Call with the exclusive accounts lock held.
+    """
+
+    manifest = read_manifest()
+
+    shards = manifest["shards"]
+
+    dirty = {shard_of(username, shards) for username in touched}
+
+    generation = manifest["generation"] + 1
+
+    contents = {index: [] for index in dirty}
+
+    for account in accounts:
+        index = shard_of(account['username'], shards)
+
+        if index in contents:
+            contents[index].append(account)
+
+    files = list(manifest["files"])
+
+    for index, shard_accounts in contents.items():
+        files[index] = f"shard-{index:03d}.{generation}.txt"
+
+        _write_shard_file(os.path.join(SHARD_DIR, files[index]), shard_accounts)
+
+    _write_manifest({"shards": shards, "seq": seq, "generation": generation, "files": files})
+
+    for index in dirty:
+        try:
+            os.remove(os.path.join(SHARD_DIR, manifest["files"][index]))  # replaced; nothing points at it now
+
+        except FileNotFoundError:
+            pass
+
+
+def reshard(shards: int) -> int:
+    """
+    Moves every account into a layout with the given number of shards (1 means the single accounts.txt),
+    streaming them from the current layout so memory use doesn't grow with the number of accounts.
+    The journal is left alone: it names accounts by username, so it replays onto either layout.
+    Returns the number of accounts moved.
+    """
+
+    from account_journal import read_snapshot_seq
+
+    with accounts_lock.exclusive():
+        manifest = read_manifest()
+
+        source = _iter_file(ACCOUNTS_FILE) if manifest is None else iter_sharded_accounts(manifest)
+
+        seq = read_snapshot_seq()
+
+        moved = 0
+
+        if shards <= 1:
+            def counted(accounts):
+                nonlocal moved
+
+                for account in accounts:
+                    moved += 1
+
+                    yield account
+
+            _write_accounts_file(counted(source), seq=seq)
+
+            if manifest is not None:
+                _remove_shards(manifest)
+
+                os.remove(MANIFEST_FILE)
+
+            return moved
+
+        os.makedirs(SHARD_DIR, exist_ok=True)
+
+        generation = manifest["generation"] + 1 if manifest is not None else 1
+
+        files = [f"shard-{index:03d}.{generation}.txt" for index in range(shards)]
+
+        handles = [open(os.path.join(SHARD_DIR, name), 'w') for name in files]
+
+        try:
+            for account in source:
+                handles[shard_of(account['username'], shards)].write(_format_account_line(account))
+
+                moved += 1
+
+            for handle in handles:
+                handle.flush()
+
+                os.fsync(handle.fileno())
+
+        finally:
+            for handle in handles:
+                handle.close()
+
+        _write_manifest({"shards": shards, "seq": seq, "generation": generation, "files": files})
+
+        if manifest is not None:
+            _remove_shards(manifest)
+
+        elif os.path.exists(ACCOUNTS_FILE):
+            os.remove(ACCOUNTS_FILE)  # the manifest takes over; an empty accounts.txt may be recreated at startup
+
+        return moved
+
+
+def _remove_shards(manifest: dict) -> None:
+    for name in manifest["files"]:
+        try:
+            os.remove(os.path.join(SHARD_DIR, name))
+
+        except FileNotFoundError:
+            pass
+
+
+if __name__ == "__main__":
+    # python account_shards.py <number of shards>; safe while the app runs, as it takes the exclusive accounts lock
+    if len(sys.argv) != 2 or not sys.argv[1].isdigit():
+        print(__doc__)
+
+        sys.exit(1)
+
+    count = reshard(int(sys.argv[1]))
+
+    layout = ACCOUNTS_FILE if int(sys.argv[1]) <= 1 else f"{sys.argv[1]} shards in {SHARD_DIR}"
+
+    print(f"Moved {count:,} accounts to {layout}.")
@@ -0,0 +1,551 @@
+"""This module keeps all accounts in memory for as long as the app runs, indexed by username and by email,
+so looking an account up or changing it no longer means reparsing accounts.txt and searching it line by line.
+
+On disk, accounts.txt is a snapshot and accounts.journal holds every change made since (see account_journal.py).
+A change costs one appended journal line; the snapshot is rewritten in the background once the journal grows.
+When the accounts are sharded (see account_shards.py), a shard is only read the first time one of its
+usernames is looked up; looking an account up by email still needs every shard.
+Several copies of the app can share data/: each change is made under an exclusive file lock (file_lock.py),
+after first applying whatever the other copies have journaled since."""
+
+import threading
+
+from auth import _get_all_accounts, _save_accounts, accounts_lock, credential_key
+from account_journal import AccountJournal, apply_entry, balance_change, read_snapshot_seq
+from account_shards import read_manifest, save_shards, shard_of
+from commit_coordinator import CommitTicket
+from money_ledger import to_kobo, to_naira
+from storage import InsufficientFundsError
+
+
+class AccountRepository:
+    """
+    Accounts indexed by case-folded username and by case-folded email (see auth.credential_key).
+
+    The dictionaries it hands out are the stored records themselves, so a signed-in user's dictionary
+    stays in step with the repository. Change an account through the methods below so both indexes and
+    the journal are kept up to date.
+    """
+
+    def __init__(self, journal: AccountJournal | None = None):
+        self._by_username: dict[str, dict] = {}  # also keeps the file order
+
+        self._by_email: dict[str, dict] = {}
+
+        self._saved: dict[str, tuple[int, str]] = {}  # username key -> (balance in kobo, password_hash) as last journaled
+
+        self._shards: int | None = None  # the manifest's number of shards, None for the single accounts.txt
+
+        self._loaded: set[int] = set()  # the shards read so far
+
+        self._journal = journal or AccountJournal()
+
+        self._lock = threading.RLock()  # one change (memory + journal) at a time, and none during a rotation
+
+        self._save_lock = threading.Lock()  # one snapshot write at a time, so an older one can't replace a newer one
+
+        self._compactor: threading.Thread | None = None
+
+        self.reload()
+
+    def reload(self) -> None:
+        """Rebuilds everything from the accounts.txt snapshot plus the journal entries written after it."""
+
+        with accounts_lock.shared(), self._lock:
+            self._reload()
+
+    def _reload(self) -> None:
+        while True:
+            seq = read_snapshot_seq()
+
+            manifest = read_manifest()
+
+            accounts = {} if manifest is not None else {
+                credential_key(account['username']): account for account in _get_all_accounts()}
+
+            if read_snapshot_seq() == seq:
+                break  # otherwise a compaction swapped accounts.txt between the two reads
+
+        self._journal.replay(accounts, seq)  # sharded, this only moves the journal on; each shard replays it as it loads
+
+        previous = self._by_username
+
+        self._by_username = {}
+
+        self._by_email.clear()
+
+        self._saved.clear()
+
+        self._shards, self._loaded = (manifest["shards"] if manifest is not None else None), set()
+
+        if self._shards is not None:
+            self._load_shards({shard_of(key, self._shards) for key in previous}, previous)
+
+            return
+
+        for key, account in accounts.items():
+            self._index(self._same_dict(previous, key, account))
+
+    @staticmethod
+    def _same_dict(previous: dict[str, dict], key: str, account: dict) -> dict:
+        """Keeps handing out the same dictionaries across a reload, e.g. the signed-in user's."""
+
+        if key not in previous:
+            return account
+
+        previous[key].clear()
+
+        previous[key].update(account)
+
+        return previous[key]
+
+    def _load(self, keys) -> None:
+        """
+        Makes sure the accounts under these username keys (every account when keys is None) are in memory,
+        reading the shards they belong to if they haven't been read yet. Call with accounts_lock and
+        self._lock held, after _catch_up.
+        """
+
+        if self._shards is None:
+            return  # accounts.txt is read whole
+
+        if self._missing(keys):
+            manifest = read_manifest()
+
+            if manifest is None or manifest["shards"] != self._shards:
+                self._reload()  # resharded by the tool since we loaded; start again from the new layout
+
+            if self._missing(keys):
+                self._load_shards(self._missing(keys))
+
+    def _missing(self, keys) -> set[int]:
+        if self._shards is None:
+            return set()
+
+        wanted = range(self._shards) if keys is None else {shard_of(key, self._shards) for key in keys}
+
+        return set(wanted) - self._loaded
+
+    def _load_shards(self, shards: set[int], previous: dict[str, dict] | None = None) -> None:
+        """Reads the given shards and replays the journal entries made since onto them."""
+
+        if not shards:
+            return
+
+        entries = list(self._journal.entries_after(read_snapshot_seq()))
+
+        if any(entry["op"] == "rename" and "account" not in entry for entry in entries):
+            shards = set(range(self._shards)) - self._loaded  # an older rename doesn't say which account it moved
+
+        accounts = {}
+
+        for index in shards:
+            for account in _get_all_accounts(shard=index):
+                accounts[credential_key(account['username'])] = account
+
+        for entry in entries:
+            apply_entry(accounts, entry)
+
+        self._loaded |= shards
+
+        for key, account in accounts.items():
+            # anything we already hold is up to date: every journal entry we read is applied to it
+            if key not in self._by_username and shard_of(key, self._shards) in self._loaded:
+                self._index(self._same_dict(previous or {}, key, account))
+
+    def _index(self, account: dict) -> None:
+        key = credential_key(account['username'])
+
+        self._by_username[key] = account
+
+        self._by_email[credential_key(account['email'])] = account
+
+        self._saved[key] = (to_kobo(account['balance']), account['password_hash'])
+
+    def _unindex(self, stored: dict) -> None:
+        del self._by_username[credential_key(stored['username'])]
+
+        del self._saved[credential_key(stored['username'])]
+
+        self._by_email.pop(credential_key(stored['email']), None)
+
+    def _move_username(self, stored: dict, new_username: str) -> None:
+        old_key = credential_key(stored['username'])
+
+        self._by_username[credential_key(new_username)] = self._by_username.pop(old_key)
+
+        self._saved[credential_key(new_username)] = self._saved.pop(old_key)
+
+        stored['username'] = new_username
+
+    def _move_email(self, stored: dict, new_email: str) -> None:
+        self._by_email.pop(credential_key(stored['email']), None)
+
+        stored['email'] = new_email
+
+        self._by_email[credential_key(new_email)] = stored
+
+    # --- changes made by other sessions ---
+
+    def refresh(self, keys=()) -> None:
+        """
+        Picks up what other copies of the app have changed since we last looked (usually nothing), and reads
+        the accounts under these username keys (every account when keys is None) if they aren't in memory yet.
+        """
+
+        with accounts_lock.shared(), self._lock:
+            self._catch_up()
+
+            self._load(keys)
+
+    def _catch_up(self) -> None:
+        """Applies other sessions' new journal entries. Call with accounts_lock and self._lock held."""
+
+        entries = self._journal.read_new()
+
+        if entries is None:
+            self._reload()
+
+            return
+
+        moved_blind = False
+
+        for entry in entries:
+            moved_blind |= self._apply(entry)
+
+        if moved_blind:  # an older rename moved an account we hadn't read into a shard we had
+            self._load_shards(set(range(self._shards)) - self._loaded)
+
+    def _apply(self, entry: dict) -> bool:
+        """
+        Applies one journal entry to the indexes, keeping any change of ours that isn't journaled yet.
+        Returns True for an older rename of an account in a shard we haven't read, which can't be followed.
+        """
+
+        op = entry["op"]
+
+        if op == "create":
+            self._index(dict(entry["account"]))
+
+            return False
+
+        key = credential_key(entry["user"])
+
+        stored = self._by_username.get(key)
+
+        if stored is None:
+            if op == "rename" and self._shards is not None:
+                if "account" not in entry:
+                    return shard_of(entry["new_username"], self._shards) in self._loaded
+
+                self._index(dict(entry["account"]))  # moved out of a shard we haven't read
+
+            return False
+
+        if op in ("credit", "debit"):
+            change = balance_change(entry)
+
+            balance, password_hash = self._saved[key]
+
+            stored['balance'] = to_naira(to_kobo(stored['balance']) + change)
+
+            self._saved[key] = (balance + change, password_hash)
+
+        elif op == "password":
+            stored['password_hash'] = entry["password_hash"]
+
+            self._saved[key] = (self._saved[key][0], entry["password_hash"])
+
+        elif op == "email":
+            self._move_email(stored, entry["email"])
+
+        elif op == "rename":
+            self._move_username(stored, entry["new_username"])
+
+        elif op == "delete":
+            self._unindex(stored)
+
+        return False
+
+    # --- lookups, all O(1) once the account's shard is in memory ---
+
+    def all(self) -> list[dict]:
+        self.refresh(None)
+
+        return list(self._by_username.values())
+
+    def get_by_username(self, username: str) -> dict | None:
+        self.refresh([credential_key(username)])
+
+        return self._by_username.get(credential_key(username))
+
+    def get_by_email(self, email: str) -> dict | None:
+        self.refresh(None)  # emails aren't sharded by, so any shard may hold it
+
+        return self._by_email.get(credential_key(email))
+
+    def find(self, username_or_email: str) -> dict | None:
+        """Finds an account by username or by email, the way sign in accepts either."""
+
+        return self.get_by_username(username_or_email) or self.get_by_email(username_or_email)
+
+    def username_taken(self, username: str, ignore: dict | None = None) -> bool:
+        """True if another account (not `ignore`) already uses this username, in any letter case."""
+
+        account = self.get_by_username(username)
+
+        return account is not None and account is not self._stored(ignore)
+
+    def email_taken(self, email: str, ignore: dict | None = None) -> bool:
+        account = self.get_by_email(email)
+
+        return account is not None and account is not self._stored(ignore)
+
+    def _stored(self, account: dict | None) -> dict | None:
+        """The record the repository holds for an account dictionary that may be a copy of it."""
+
+        if account is None:
+            return None
+
+        return self._by_username.get(credential_key(account['username']))
+
+    # --- changes, each one made under the exclusive lock and journaled before the method returns ---
+
+    def add(self, account: dict) -> dict:
+        """Raises ValueError if another session took the username or email since it was checked."""
+
+        with accounts_lock.exclusive():
+            with self._lock:
+                if self.username_taken(account['username']) or self.email_taken(account['email']):
+                    raise ValueError("Username or email already registered")
+
+                self._index(account)
+
+                ticket = self._journal.append("create", account['username'], account=dict(account))
+
+            ticket.wait()  # returns once the journal batch holding this change is on disk
+
+        self._compact_if_needed()
+
+        return account
+
+    def update(self, account: dict) -> None:
+        """
+        Journals changes to fields that aren't indexed: the balance (as a credit or debit) and the password hash.
+        To change a balance, prefer credit() and debit(), which start from the latest balance on disk.
+        """
+
+        with accounts_lock.exclusive():
+            with self._lock:
+                self._catch_up()
+
+                stored = self._stored(account)
+
+                if stored is None:
+                    raise KeyError(f"No account named {account['username']}")
+
+                if stored is not account:
+                    stored.update(account)
+
+                ticket = self._journal_changes(stored)
+
+            if ticket is not None:
+                ticket.wait()
+
+        self._compact_if_needed()
+
+    def _journal_changes(self, stored: dict) -> CommitTicket | None:
+        key = credential_key(stored['username'])
+
+        balance, password_hash = self._saved[key]
+
+        change = to_kobo(stored['balance']) - balance  # journaled in whole kobo, so replaying it never drifts
+
+        ticket = None
+
+        if change > 0:
+            ticket = self._journal.append("credit", stored['username'], kobo=change)
+
+        elif change < 0:
+            ticket = self._journal.append("debit", stored['username'], kobo=-change)
+
+        if stored['password_hash'] != password_hash:
+            ticket = self._journal.append("password", stored['username'], password_hash=stored['password_hash'])
+
+        self._saved[key] = (balance + change, stored['password_hash'])
+
+        return ticket
+
+    def read_modify_write(self, account: dict, change):
+        """
+        Calls change(record) on the latest version of the account and saves the result, holding the
+        exclusive lock from the read to the write so no other session's change can slip in between.
+        If change raises, nothing is saved. Returns whatever change returns.
+        """
+
+        with accounts_lock.exclusive():
+            with self._lock:
+                self._catch_up()
+
+                stored = self._stored(account)
+
+                if stored is None:
+                    raise KeyError(f"No account named {account['username']}")
+
+                result = change(stored)
+
+                if stored is not account:
+                    account.update(stored)
+
+                ticket = self._journal_changes(stored)
+
+            if ticket is not None:
+                ticket.wait()
+
+        self._compact_if_needed()
+
+        return result
+
+    def credit(self, account: dict, amount: float) -> None:
+        def add(stored: dict) -> None:
+            stored['balance'] = to_naira(to_kobo(stored['balance']) + to_kobo(amount))  # in kobo, so it never drifts
+
+        self.read_modify_write(account, add)
+
+    def debit(self, account: dict, amount: float) -> None:
+        """Takes amount from the balance, or raises InsufficientFundsError if the latest balance is too low."""
+
+        def take(stored: dict) -> None:
+            if to_kobo(stored['balance']) < to_kobo(amount):
+                raise InsufficientFundsError(f"Insufficient funds in {stored['username']}'s wallet")
+
+            stored['balance'] = to_naira(to_kobo(stored['balance']) - to_kobo(amount))
+
+        self.read_modify_write(account, take)
+
+    def rename(self, account: dict, new_username: str) -> None:
+        """Raises ValueError if another session took the new username since it was checked."""
+
+        with accounts_lock.exclusive():
+            with self._lock:
+                if self.username_taken(new_username, ignore=account):
+                    raise ValueError(f"Username {new_username} already taken")
+
+                stored = self._stored(account)
+
+                old_username = stored['username']
+
+                self._move_username(stored, new_username)
+
+                account['username'] = new_username
+
+                # the whole account goes with it, so its new shard can be read without the old one
+                ticket = self._journal.append("rename", old_username, new_username=new_username, account=dict(stored))
+
+            ticket.wait()
+
+        self._compact_if_needed()
+
+    def change_email(self, account: dict, new_email: str) -> None:
+        """Raises ValueError if another session took the new email since it was checked."""
+
+        with accounts_lock.exclusive():
+            with self._lock:
+                if self.email_taken(new_email, ignore=account):
+                    raise ValueError(f"Email {new_email} already registered")
+
+                stored = self._stored(account)
+
+                self._move_email(stored, new_email)
+
+                account['email'] = new_email
+
+                ticket = self._journal.append("email", stored['username'], email=new_email)
+
+            ticket.wait()
+
+        self._compact_if_needed()
+
+    def delete(self, account: dict) -> None:
+        with accounts_lock.exclusive():
+            with self._lock:
+                self._catch_up()
+
+                stored = self._stored(account)
+
+                if stored is None:
+                    return
+
+                self._unindex(stored)
+
+                ticket = self._journal.append("delete", stored['username'])
+
+            ticket.wait()
+
+        self._compact_if_needed()
+
+    # --- compaction ---
+
+    def save(self) -> None:
+        """Rewrites accounts.txt (or the changed shards) with every journal entry folded in, and empties the journal."""
+
+        with self._save_lock, accounts_lock.exclusive():
+            with self._lock:
+                self._catch_up()
+
+                if self._shards is not None:
+                    manifest = read_manifest()
+
+                    if manifest is None or manifest["shards"] != self._shards:
+                        self._reload()  # resharded since we loaded: what we hold is in the old layout's shards
+
+                    # every account of a shard we rewrite has to be in memory
+                    self._load(self._journal.touched | self._journal.rotated_touched)
+
+                seq = self._journal.rotate()
+
+                accounts = [dict(account) for account in self._by_username.values()]
+
+            if read_manifest() is not None:
+                save_shards(accounts, seq, self._journal.rotated_touched)  # only the shards whose accounts changed
+
+            else:
+                _save_accounts(accounts, seq=seq)  # written to a temp file and swapped in, so a crash can't truncate it
+
+            self._journal.finish_rotation()
+
+    def _compact_if_needed(self) -> None:
+        """Starts a background compaction once the journal is long enough (and none is already running)."""
+
+        if not self._journal.needs_compaction():
+            return
+
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+
+        self._compactor = threading.Thread(target=self.save, name="account-compactor", daemon=True)
+
+        self._compactor.start()
+
+    def close(self) -> None:
+        """Waits for a running compaction to finish."""
+
+        if self._compactor is not None:
+            self._compactor.join()
+
+
+_repository = None
+
+
+def get_account_repository() -> AccountRepository:
+    """Returns the app's account repository from the configured storage backend (see storage.py)."""
+
+    global _repository
+
+    if _repository is None:
+        from storage import get_storage  # imported here because storage imports this module
+
+        _repository = get_storage().account_repository()
+
+    return _repository
+
@@ -5,101 +5,138 @@ import re  # "re" stands for regular expressions. bring in Python tools for find
 
 import os   #means bring in Python's tools to work with files and folders.
 
-import random   # means bring in Python's tools to pick or create things randomly.
+from passwords import check_password_strength, generate_strong_password    # the password rules live with the hashing, so the shop service can use them too.
 
-import string    #means to bring in Python's tools for working with a letter, number, and symbols.
+from commit_coordinator import GroupCommitter    # groups writes that arrive together into one.
 
-import hashlib    # it turns words like your password into secret code that no one can read.
+from file_lock import FileLock    # keeps two terminals from changing the accounts at the same time.
 
 ACCOUNTS_FILE = os.path.join("data", "accounts.txt")
 
-def _hash_password(password: str) -> str:
-     #we hash the password using SHA256.
-     #SHA stands for Secure Hash Algorithm.
-     #use to turn a piece of text into a secret code.
+accounts_lock = FileLock(os.path.join("data", "accounts.lock"))  # shared to read the accounts, exclusive to change them
 
-    return hashlib.sha256(password.encode()).hexdigest()
-    #take the password, turn it into a secret SHA256 code and return the result.
+def credential_key(username_or_email: str) -> str:
+    """The key accounts are indexed under: case-folded, so 'Ada', 'ADA' and 'ada' are the same user.
+    casefold() is lower() made for comparing text, e.g. German 'ß' matches 'ss'."""
 
-def _check_password_strength(password: str) -> bool:
-    #Here we check if a password meets the strength criteria.
+    return username_or_email.casefold()
 
-    if len(password) < 16:
-        return False
+def _parse_account_line(line: str) -> dict | None:
 
-    if not any(c.islower() for c in password): #if the password does not have any lower letter, show an error.
-        return False
+    """Turns one 'username,email,password_hash,balance' line into an account, or None for any other line."""
 
-    if not any(c.isupper() for c in password): #if the password does not have any capital letter, show an error.
-        return False
+    parts = line.strip().split(',')
 
-    if not any(c.isdigit() for c in password): #if the password does not have any digit, show an error.
-        return False
+    if len(parts) != 4:
 
-    if not any(c in string.punctuation for c in password): #if the password does not have any special symbols. indicate
-        return False
+        return None
 
-    return True #return True as answer in this function
+    return {
 
+        "username": parts[0].strip(),
 
+        "email": parts[1].strip(),
 
-def generate_strong_password() -> str:
+        "password_hash": parts[2].strip(),
 
-    """Generates a strong password meeting the specified criteria."""
+        "balance": float(parts[3].strip())
 
-    while True:
+    }
+
+def _format_account_line(account: dict) -> str:
+
+    return f"{account['username']},{account['email']},{account['password_hash']},{account['balance']:.2f}\n"
+
+def _get_all_accounts(shard: int | None = None) -> list[dict]:
 
-        password = ''.join(random.choices(string.ascii_letters + string.digits + string.punctuation, k=16))
+    """Reads all accounts from accounts.txt. When the accounts are sharded (see account_shards.py), reads only the
+    given shard, or every shard if none is given."""
 
-        if _check_password_strength(password):
+    from account_shards import read_manifest, iter_shard, iter_sharded_accounts  # imported here because account_shards imports this module
 
-            return password
+    with accounts_lock.shared():
 
+        manifest = read_manifest()
 
+        if manifest is not None:
 
-def _get_all_accounts() -> list[dict]:
+            return list(iter_sharded_accounts(manifest) if shard is None else iter_shard(manifest, shard))
 
-    """Reads all accounts from accounts.txt."""
+        accounts = []
 
-    accounts = []
+        try:
 
-    try:
+            with open(ACCOUNTS_FILE, 'r') as f:
 
-        with open(ACCOUNTS_FILE, 'r') as f:
+                for line in f:
 
-            for line in f:
+                    account = _parse_account_line(line)
 
-                parts = line.strip().split(',')
+                    if account is not None:
 
-                if len(parts) == 4:
+                        accounts.append(account)
 
-                    accounts.append({
+        except FileNotFoundError:
 
-                        "username": parts[0].strip(),
+            pass # Will be handled by setup_data_storage
 
-                        "email": parts[1].strip(),
+        return accounts
 
-                        "password_hash": parts[2].strip(),
+def _write_accounts_file(accounts: list[dict], seq: int | None = None):
 
-                        "balance": float(parts[3].strip())
+    """Writes accounts.txt in one go.
 
-                    })
+    The new file is written next to the old one and then swapped in, so a crash halfway through can't
 
-    except FileNotFoundError:
+    leave accounts.txt truncated. seq is the last journal entry the file includes (see account_journal.py).
 
-        pass # Will be handled by setup_data_storage
+    """
 
-    return accounts
+    temp_file = ACCOUNTS_FILE + ".tmp"
 
-def _save_accounts(accounts: list[dict]):
+    with open(temp_file, 'w') as f:
 
-    """Saves all accounts back to accounts.txt."""
+        if seq is not None:
 
-    with open(ACCOUNTS_FILE, 'w') as f:
+            f.write(f"#seq={seq}\n")  # skipped by _get_all_accounts, which only reads 4-field lines
 
         for account in accounts:
 
-            f.write(f"{account['username']},{account['email']},{account['password_hash']},{account['balance']:.2f}\n")
+            f.write(_format_account_line(account))
+
+        f.flush()
+
+        os.fsync(f.fileno())
+
+    os.replace(temp_file, ACCOUNTS_FILE)
+
+
+
+def _write_latest_accounts(batch: list[tuple[list[dict], int | None]]):
+
+    """Every save holds the whole account list, so a batch of them only needs its newest one written."""
+
+    accounts, seq = batch[-1]
+
+    _write_accounts_file(accounts, seq)
+
+
+
+_accounts_committer = GroupCommitter(_write_latest_accounts, name="accounts-writer")
+
+
+
+def _save_accounts(accounts: list[dict], seq: int | None = None):
+
+    """Saves all accounts back to accounts.txt.
+
+    Saves made at nearly the same moment are grouped into one atomic write (see commit_coordinator.py);
+
+    this returns once the write holding this save is on disk.
+
+    """
+
+    _accounts_committer.commit((accounts, seq))
 
 
 
@@ -109,7 +146,9 @@ def sign_up():
 
     print("\n--- Sign Up ---")
 
-    accounts = _get_all_accounts()
+    from account_store import get_account_repository  # imported here because account_store imports this module
+
+    accounts = get_account_repository()
 
 
 
@@ -117,7 +156,7 @@ def sign_up():
 
         username = input("Enter desired username: ").strip()
 
-        if any(acc['username'].lower() == username.lower() for acc in accounts):
+        if accounts.username_taken(username):
 
             print("Username already taken. Please choose another.")
 
@@ -135,7 +174,7 @@ def sign_up():
 
             print("Invalid email format. Please try again.")
 
-        elif any(acc['email'].lower() == email.lower() for acc in accounts):
+        elif accounts.email_taken(email):
 
             print("Email already registered. Please choose another or sign in.")
 
@@ -155,7 +194,7 @@ def sign_up():
 
                 password = input("Enter password (min 16 chars, 1 lower, 1 upper, 1 num, 1 special): ").strip()
 
-                if _check_password_strength(password):
+                if check_password_strength(password):
 
                     break
 
@@ -178,21 +217,19 @@ def sign_up():
         else:
             print("Wrong option. Please enter 'Manuel'✅✅ or 'Automatic'📩📩.")  # CHOOSE MANUEL OR AUTOMATIC.
 
-    hashed_password: str = _hash_password(password)
+    import shop_service  # imported here because shop_service imports account_store, which imports this module
 
-    new_account = {
-        "username": username,
-        "email": email,
-        "password_hash": hashed_password,
-        "balance": 0.00
-    }
+    result = shop_service.sign_up(username, email, password)  #checks everything again and saves the account to the repository.
+
+    if not result.ok:
 
-    accounts.append(new_account)  #add the new account to the end of the account list.
-    _save_accounts(accounts)   #Call a function named _save_accounts and give it the account list to save.
+        print(result.message)
+
+        return None
 
     print("Account created successfully! ✅✅✅🫂")
 
-    return new_account # Return the newly created account for immediate login
+    return result.account # Return the newly created account for immediate login
 
 
 def sign_in():
@@ -202,33 +239,20 @@ def sign_in():
     print("\n--- SIGN IN ---")
     print("=" * 40)
 
-    accounts: list[dict] = _get_all_accounts()
+    import shop_service
+
     max_attempts: int = 4
     attempts: int = 0
 
     while attempts < max_attempts:
         user_input: str = input("Enter username or email 📩: ").strip()
         password: str = input("Enter password 🔏: ").strip()
-        hashed_password: str = _hash_password(password)
-
-        found_account = None        #no account found
-
-        for account in accounts:    #go through each account in the account list, one by one.
-
-            if (account['username'].lower() == user_input.lower() or
-
-                account['email'].lower() == user_input.lower()):
-
-                if account['password_hash'] == hashed_password:
-
-                    found_account = account
-
-                    break  #stop the loop and jump out!
+        result = shop_service.sign_in(user_input, password)    #one index lookup by username or email; old password hashes are upgraded on the way.
 
-        if found_account:
+        if result.ok:
             print("Login successful!🫂✅")
 
-            return found_account #that means we found your account
+            return result.account #that means we found your account
 
         else:
             attempts += 1 #👈add one to the number stored an attempt.
@@ -1,10 +1,12 @@
-import os
-
 import time
 
+import shop_service
+from reservations import reservations_for
+from shopping_cart import Cart
+
 
-def display_cart(user_cart: dict, inventory: dict):
-    """Displays items currently in the user's cart."""
+def display_cart(user_cart: Cart, inventory: dict):
+    """Displays items currently in the user's cart. The total is the cart's running subtotal."""
 
     print("\n--- Your Shopping Cart ---")
 
@@ -13,8 +15,6 @@ def display_cart(user_cart: dict, inventory: dict):
 
         return
 
-    total_price = 0.0
-
     print(f"{'Item Name':<30} {'Quantity':<10} {'Price (each)':<15} {'Subtotal':<15}")
 
     print("-" * 70)
@@ -22,95 +22,92 @@ def display_cart(user_cart: dict, inventory: dict):
     for item_name, qty in user_cart.items():
 
         if item_name in inventory:
-            price_each = inventory[item_name]['price']
+            price_each = user_cart.unit_price(item_name)
 
             subtotal = price_each * qty
 
-            total_price += subtotal
-
             print(f"{item_name:<30} {qty:<10} NGN {price_each:,.2f}   NGN {subtotal:,.2f}")
 
     print("-" * 70)
 
-    print(f"{'Total:':<55} NGN {total_price:,.2f}")
+    print(f"{'Total:':<55} NGN {user_cart.subtotal:,.2f}")
 
 
-def add_item_to_cart(user_cart: dict, inventory: dict, item_name: str, quantity: int = 1):
-    """Adds an item to the cart and updates inventory."""
+def add_item_to_cart(user_cart: Cart, inventory: dict, item_name: str, quantity: int = 1):
+    """Adds an item to the cart and holds the stock for it, warehouse by warehouse, for RESERVATION_TTL seconds."""
 
-    if item_name not in inventory:
-        print(f"Error: '{item_name}' not found in inventory.")
+    result = shop_service.add_to_cart(user_cart, inventory, item_name, quantity)
 
-        return False
+    print(result.message)
 
-    if inventory[item_name]['quantity'] < quantity:
-        print(f"Error: Not enough stock for '{item_name}'. Available: {inventory[item_name]['quantity']}")
+    return result.ok
 
-        return False
 
-    user_cart[item_name] = user_cart.get(item_name, 0) + quantity
+def remove_item_from_cart(user_cart: Cart, inventory: dict, item_name: str, quantity: int = 1):
+    """Removes an item from the cart and updates inventory."""
 
-    inventory[item_name]['quantity'] -= quantity
+    result = shop_service.remove_from_cart(user_cart, inventory, item_name, quantity)
 
-    print(f"'{item_name}' (x{quantity}) added to cart.")
+    print(result.message)
 
-    return True
+    return result.ok
 
 
-def remove_item_from_cart(user_cart: dict, inventory: dict, item_name: str, quantity: int = 1):
-    """Removes an item from the cart and updates inventory."""
-
-    if item_name not in user_cart:
-        print(f"Error: '{item_name}' not in your cart.")
+def clear_cart(user_cart: Cart, inventory: dict):
+    """Clears all items from the cart and restores inventory quantities."""
 
-        return False
+    if not user_cart:
+        print("Your cart is already empty.")
 
-    if user_cart[item_name] <= quantity:
+        return
 
-        inventory[item_name]['quantity'] += user_cart[item_name]  # Return all quantity to inventory
+    confirm = input("Are you sure you want to clear your entire cart? (Y/N): ").strip().upper()
 
-        del user_cart[item_name]
+    if confirm == 'Y':
 
-        print(f"'{item_name}' removed from cart.")
+        print(shop_service.clear_cart(user_cart, inventory).message)
 
     else:
 
-        user_cart[item_name] -= quantity
+        print("Cart clear operation cancelled.")
 
-        inventory[item_name]['quantity'] += quantity
 
-        print(f"Removed {quantity} of '{item_name}' from cart. Remaining: {user_cart[item_name]}")
+def bulk_add_to_cart(user_cart: Cart, inventory: dict, text: str) -> list[dict]:
+    """Adds a whole list of items to the cart (see shop_service.bulk_add), prints the lines that
+    couldn't be added and a summary, and returns the per-line report."""
 
-    return True
+    result = shop_service.bulk_add(user_cart, inventory, text)
 
+    for entry in result.report:
+        if entry['status'] == "insufficient stock":
+            print(f"Line {entry['line']}: not enough stock for '{entry['name']}'. Available: {entry['available']}")
 
-def clear_cart(user_cart: dict, inventory: dict):
-    """Clears all items from the cart and restores inventory quantities."""
+        elif entry['status'] != "added":
+            print(f"Line {entry['line']}: '{entry['name']}' - {entry['status']}.")
 
-    if not user_cart:
-        print("Your cart is already empty.")
+    print(result.message)
 
-        return
+    return result.report
 
-    confirm = input("Are you sure you want to clear your entire cart? (Y/N): ").strip().upper()
 
-    if confirm == 'Y':
+def restore_cart(user_cart: Cart, inventory: dict, saved_cart: dict):
+    """Puts a saved cart back and holds its stock again (see shop_service.restore_cart), and says what changed."""
 
-        for item_name, qty in user_cart.items():
+    result = shop_service.restore_cart(user_cart, inventory, saved_cart)
 
-            if item_name in inventory:
-                inventory[item_name]['quantity'] += qty
+    if result.message:
+        print(result.message)
 
-        user_cart.clear()
 
-        print("Your cart has been cleared.")
+def release_cart(user_cart: Cart, inventory: dict):
+    """Gives the stock held by the cart back when the user logs out. The saved copy of the cart is kept."""
 
-    else:
+    reservations_for(inventory).release_all(user_cart)
 
-        print("Cart clear operation cancelled.")
+    user_cart.clear()
 
 
-def checkout(user_cart: dict, current_user: dict, inventory: dict) -> bool:
+def checkout(user_cart: Cart, current_user: dict, inventory: dict) -> bool:
     """Processes the checkout, updates balance, and clears cart."""
 
     if not user_cart:
@@ -120,14 +117,7 @@ def checkout(user_cart: dict, current_user: dict, inventory: dict) -> bool:
 
     display_cart(user_cart, inventory)
 
-    total_fee = 0.0
-
-    for item_name, qty in user_cart.items():
-
-        if item_name in inventory:
-            total_fee += inventory[item_name]['price'] * qty
-
-    print(f"\nTotal checkout price: NGN {total_fee:,.2f}")
+    print(f"\nTotal checkout price: NGN {user_cart.subtotal:,.2f}")
 
     confirm = input("Proceed to payment? (Y/N): ").strip().upper()
 
@@ -136,52 +126,41 @@ def checkout(user_cart: dict, current_user: dict, inventory: dict) -> bool:
 
         return False
 
-    if current_user['balance'] < total_fee:
-
-        print(f"Insufficient funds! Your current balance is NGN {current_user['balance']:,.2f}.")
+    result = shop_service.checkout(current_user, user_cart, inventory)
 
-        print("Please fund your wallet before attempting to checkout.")
-
-        # Revert inventory changes if checkout fails due to insufficient funds (optional, but good practice)
-
-        for item_name, qty in user_cart.items():
+    if result.error == "insufficient_funds":
 
-            if item_name in inventory:
-                inventory[item_name]['quantity'] += qty  # Put items back to stock
+        print(result.message)
 
-        user_cart.clear()  # Clear cart as items are effectively not purchased
+        print("Please fund your wallet before attempting to checkout.")
 
         return False
 
-    # Process payment
-
-    current_user['balance'] -= total_fee
-
-    # Update accounts.txt (important for persistence)
+    if result.error == "sold_out":
 
-    from auth import _get_all_accounts, _save_accounts
+        for item_name in result.sold_out:
+            print(f"Sorry, '{item_name}' sold out while it sat in your cart. Please remove it or lower the quantity.")
 
-    accounts = _get_all_accounts()
+        print("You have not been charged.")
 
-    for i, acc in enumerate(accounts):
+        return False
 
-        if acc['username'] == current_user['username']:
-            accounts[i] = current_user
+    if not result.ok:
 
-            break
+        print(result.message)
 
-    _save_accounts(accounts)
+        return False
 
     print("\n--- Transaction Successful! ---")
 
-    print(f"Amount paid: NGN {total_fee:,.2f}")
+    print(f"Order number: {result.order['order']}")
 
-    print(f"Your new balance: NGN {current_user['balance']:,.2f}")
+    print(f"Amount paid: NGN {result.total:,.2f}")
 
-    print("Thank you for your purchase!")
+    print(f"Your new balance: NGN {result.balance:,.2f}")
 
-    user_cart.clear()  # Empty cart after successful purchase
+    print("Thank you for your purchase!")
 
     time.sleep(2)  # Pause for user to read message
 
-    return True
\ No newline at end of file
+    return True
@@ -0,0 +1,77 @@
+"""This module keeps every user's cart on disk, so a cart survives logging out, closing the app or a crash.
+Carts are kept in a small key-value database (the standard library's dbm): the key is the case-folded
+username and the value is the cart as compact JSON. Saving or loading one cart touches only that key,
+however many users have carts. Only the quantities are stored; the stock for them is held again when the
+cart is restored at sign in (see cart.restore_cart)."""
+
+import dbm
+import json
+import os
+
+from auth import credential_key
+from file_lock import FileLock
+
+CART_STORE_FILE = os.path.join("data", "carts")
+
+
+class CartStore:
+    """
+    Per-user carts in a dbm file. Each call opens the database under an exclusive file lock and closes
+    it again, so several copies of the app can share it (not every dbm flavour allows two writers at once).
+    """
+
+    def __init__(self, path: str = CART_STORE_FILE):
+        self.path = path
+
+        self._file_lock = FileLock(path + ".lock")
+
+    def load(self, username: str) -> dict[str, int]:
+        """The saved cart as {item_name: quantity}, empty if the user has none."""
+
+        with self._file_lock.exclusive(), dbm.open(self.path, 'c') as db:
+            value = db.get(credential_key(username).encode())
+
+        return json.loads(value) if value else {}
+
+    def save(self, username: str, cart: dict[str, int]) -> None:
+        """Replaces the user's saved cart. An empty cart removes the key."""
+
+        key = credential_key(username).encode()
+
+        with self._file_lock.exclusive(), dbm.open(self.path, 'c') as db:
+            if cart:
+                db[key] = json.dumps(cart, separators=(",", ":"))
+
+            elif key in db:
+                del db[key]
+
+    def delete(self, username: str) -> None:
+        self.save(username, {})
+
+    def rename(self, old_username: str, new_username: str) -> None:
+        """Moves a cart to the user's new username."""
+
+        old_key, new_key = credential_key(old_username).encode(), credential_key(new_username).encode()
+
+        if old_key == new_key:
+            return
+
+        with self._file_lock.exclusive(), dbm.open(self.path, 'c') as db:
+            if old_key in db:
+                db[new_key] = db[old_key]
+
+                del db[old_key]
+
+
+_cart_store = None
+
+
+def get_cart_store() -> CartStore:
+    """Returns the app's cart store, creating it the first time."""
+
+    global _cart_store
+
+    if _cart_store is None:
+        _cart_store = CartStore()
+
+    return _cart_store
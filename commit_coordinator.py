@@ -0,0 +1,123 @@
+"""This module batches writes that arrive close together. When many funding and checkout operations
+happen at the same moment, each one would otherwise open, write, fsync and close the same file on its own.
+A GroupCommitter collects everything submitted within a short window and hands it to one write function,
+then tells every caller that its change is on disk."""
+
+import threading
+import time
+
+COMMIT_WINDOW = 0.002  # seconds to wait for more writes after the first one of a batch arrives
+
+
+class CommitTicket:
+    """Returned by GroupCommitter.submit(); wait() returns once the batch holding the write is durable."""
+
+    __slots__ = ("_done", "_error")
+
+    def __init__(self):
+        self._done = threading.Event()
+
+        self._error: BaseException | None = None
+
+    def _finish(self, error: BaseException | None = None) -> None:
+        self._error = error
+
+        self._done.set()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Blocks until the write is on disk. Raises the error the batch failed with, if any."""
+
+        if not self._done.wait(timeout):
+            return False
+
+        if self._error is not None:
+            raise self._error
+
+        return True
+
+
+class GroupCommitter:
+    """
+    Collects submitted items and writes them in batches on a background thread.
+
+    write_batch(items) gets the items in the order they were submitted and must make them durable
+    (for example by fsyncing) before it returns. If it raises, every ticket in that batch gets the error.
+    """
+
+    def __init__(self, write_batch, window: float = COMMIT_WINDOW, name: str = "group-commit"):
+        self._write_batch = write_batch
+
+        self._window = window
+
+        self._name = name
+
+        self._pending: list[tuple[object, CommitTicket]] = []
+
+        self._writing = False
+
+        self._condition = threading.Condition()
+
+        self._thread: threading.Thread | None = None
+
+    def submit(self, item) -> CommitTicket:
+        """Queues an item for the next batch and returns straight away."""
+
+        ticket = CommitTicket()
+
+        with self._condition:
+            self._pending.append((item, ticket))
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+
+                self._thread.start()
+
+            self._condition.notify_all()
+
+        return ticket
+
+    def commit(self, item) -> None:
+        """Queues an item and waits until the batch it went into has been written."""
+
+        self.submit(item).wait()
+
+    def flush(self) -> None:
+        """Waits until everything submitted so far has been written."""
+
+        with self._condition:
+            while self._pending or self._writing:
+                self._condition.wait()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+
+                deadline = time.monotonic() + self._window
+
+                while (remaining := deadline - time.monotonic()) > 0:
+                    self._condition.wait(remaining)  # give writes arriving right behind this one a chance to join
+
+                batch, self._pending = self._pending, []
+
+                self._writing = True
+
+            error = None
+
+            try:
+                self._write_batch([item for item, _ in batch])
+
+            except BaseException as e:
+                error = e
+
+            for _, ticket in batch:
+                ticket._finish(error)
+
+            with self._condition:
+                self._writing = False
+
+                self._condition.notify_all()
@@ -0,0 +1,89 @@
+"""This module provides the advisory file locks that let several terminals run main.py against the same
+data/ directory. Reads take a shared lock, so any number of sessions can read together; writes take an
+exclusive lock, so one session's change can never be lost under another's. On systems without fcntl
+(Windows) the locks do nothing and the app behaves as before."""
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+
+class FileLock:
+    """
+    A shared/exclusive lock on a lock file, taken with fcntl.flock.
+
+    The lock is held per process: the first thread to take it opens the lock file and flocks it, other
+    threads of the same process join in, and the flock is dropped when the last of them leaves. Threads
+    inside one process still need their own lock (like AccountRepository's) to keep out of each other's way.
+    A thread that wants the exclusive lock while the process only holds the shared one waits for the
+    shared holders to leave first.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        self._condition = threading.Condition()
+
+        self._exclusive = False  # what the process currently holds, when _holders > 0
+
+        self._holders = 0
+
+        self._fd: int | None = None
+
+    @contextmanager
+    def shared(self):
+        """Lock for reading: other readers may hold it too, writers wait."""
+
+        self._acquire(exclusive=False)
+
+        try:
+            yield
+
+        finally:
+            self._release()
+
+    @contextmanager
+    def exclusive(self):
+        """Lock for writing: every other process waits until it is released."""
+
+        self._acquire(exclusive=True)
+
+        try:
+            yield
+
+        finally:
+            self._release()
+
+    def _acquire(self, exclusive: bool) -> None:
+        with self._condition:
+            while self._holders and exclusive and not self._exclusive:
+                self._condition.wait()
+
+            if self._holders == 0:
+                if fcntl is not None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+                    fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+                self._exclusive = exclusive
+
+            self._holders += 1
+
+    def _release(self) -> None:
+        with self._condition:
+            self._holders -= 1
+
+            if self._holders == 0:
+                if self._fd is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+                    os.close(self._fd)
+
+                    self._fd = None
+
+                self._condition.notify_all()
@@ -1,74 +1,485 @@
 """ This module manages the product inventory which will be responsible for loading items from warehouse*.txt files, parsing them,
 and providing functions to search and update item quantities."""
+import json
 import os
-import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from inventory_store import InventoryStore
+from jsonl_file import write_atomically
 DATA_DIR = "data"
 
+SNAPSHOT_FILE = os.path.join(DATA_DIR, "inventory.snapshot")  # parsed warehouse files, see load_inventory_from_files
 
+SNAPSHOT_VERSION = 3  # 3: JSON, as the data folder is writable and a pickle could run code when loaded
 
-def load_inventory_from_files() -> dict:
+WATCH_INTERVAL = 2.0  # seconds between two checks of the warehouse files, see start_inventory_watcher
+
+CHUNK_SIZE = 64 * 1024  # how many characters of a warehouse file are read at a time
+
+_search_index: dict = {}  # index built by the last load_inventory_from_files call, see build_search_index
+
+_loaded_files: dict = {}  # {"inventory": the live inventory, "files": {filename: {"size", "mtime", "items"}}}
+
+_inventory_lock = threading.RLock()  # held while the live inventory or its search index changes shape
+
+
+
+def _parse_item(item_str: str, filename: str) -> tuple[str, float] | None:
+
+    """Parses one 'name: price' record, printing a warning and returning None if it is malformed."""
+
+    item_str = item_str.strip()
+
+    if not item_str:
+
+        return None  # nothing between two ';' (or after the last one)
+
+    if ':' not in item_str:
+
+        print(f"Warning: Invalid item format '{item_str}' in {filename}. Skipping.")
+
+        return None
+
+    name, price_str = item_str.split(':', 1)
+
+    try:
+
+        return name, float(price_str)
+
+    except ValueError:
+
+        print(f"Warning: Invalid price format for item '{name}' in {filename}. Skipping.")
+
+        return None
+
+
+
+def iter_warehouse_items(filepath: str, chunk_size: int = CHUNK_SIZE):
+
+    """
+
+    Reads a warehouse file in fixed-size chunks and yields (name, price) pairs one record at a time,
+
+    so only one chunk of the file is held in memory no matter how big the file gets.
+
+    """
+
+    filename = os.path.basename(filepath)
+
+    leftover = ""  # the start of a record that was cut off at the end of the previous chunk
+
+    with open(filepath, 'r') as f:
+
+        while True:
+
+            chunk = f.read(chunk_size)
+
+            if not chunk:
+
+                break
+
+            records = (leftover + chunk).split(';')
+
+            leftover = records.pop()  # the last piece may continue in the next chunk
+
+            for item_str in records:
+
+                item = _parse_item(item_str, filename)
+
+                if item:
+
+                    yield item
+
+    item = _parse_item(leftover, filename)
+
+    if item:
+
+        yield item
+
+
+
+def _warehouse_number(filename: str) -> int:
+
+    """Returns the number in a warehouse file name (warehouse12.txt -> 12), or 0 if it has none."""
+
+    digits = filename[len("warehouse"):-len(".txt")]
+
+    return int(digits) if digits.isdigit() else 0
+
+
+
+def _merge_key(filename: str) -> tuple[int, str]:
+
+    """Sort key for the warehouse merge order: by warehouse number, then by name."""
+
+    return _warehouse_number(filename), filename
+
+
+
+def _warehouse_files() -> list[str]:
+
+    """Lists the warehouse*.txt files in the data directory in merge order (lowest warehouse number first)."""
+
+    filenames = [filename for filename in os.listdir(DATA_DIR)
+
+                 if filename.startswith("warehouse") and filename.endswith(".txt")]
+
+    return sorted(filenames, key=_merge_key)
+
+
+
+def _parse_warehouse_file(filepath: str) -> list[tuple[str, float]]:
+
+    """Parses a whole warehouse file. Lives at module level so worker processes can run it."""
+
+    return list(iter_warehouse_items(filepath))
+
+
+
+def _merge_items(inventory: InventoryStore, items, warehouse: int) -> None:
+
+    """Stocks (name, price) pairs in one warehouse. An item listed by several warehouses gets a location in each."""
+
+    for name, price in items:
+
+        # Assuming initial quantity for each item is 10 per warehouse for simplicity
+
+        # For a mock app, a simple quantity might suffice.
+
+        inventory.set_stock(name, warehouse, price, 10) # Placeholder quantity
+
+
+
+def _read_snapshot() -> dict:
+
+    """Reads the parsed-inventory snapshot, returning {} if there is none or it can't be used.
+    It is plain JSON, and any entry that isn't shaped like the ones _write_snapshot writes is left out."""
+
+    try:
+
+        with open(SNAPSHOT_FILE, 'r', encoding='utf-8') as f:
+
+            snapshot = json.load(f)
+
+    except FileNotFoundError:
+
+        return {}
+
+    except Exception as e:
+
+        print(f"Warning: Ignoring unreadable inventory snapshot {SNAPSHOT_FILE}: {e}")
+
+        return {}
+
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION or not isinstance(snapshot.get("files"), dict):
+
+        return {}
+
+    return {filename: entry for filename, entry in snapshot["files"].items() if _is_snapshot_entry(entry)}
+
+
+
+def _is_snapshot_entry(entry) -> bool:
+
+    """True for {"size": int, "mtime": int, "items": {name: price}}."""
+
+    return (isinstance(entry, dict) and isinstance(entry.get("size"), int) and isinstance(entry.get("mtime"), int)
+
+            and isinstance(entry.get("items"), dict)
+
+            and all(isinstance(price, (int, float)) for price in entry["items"].values()))
+
+
+
+def _write_snapshot(files: dict) -> None:
+
+    """Writes the snapshot to a temporary file first so a crash can never leave a half-written one behind."""
+
+    try:
+
+        write_atomically(SNAPSHOT_FILE, json.dumps({"version": SNAPSHOT_VERSION, "files": files}))
+
+    except OSError as e:
+
+        print(f"Warning: Could not save inventory snapshot {SNAPSHOT_FILE}: {e}")
+
+
+
+def _file_signature(filepath: str) -> tuple[int, int]:
+
+    """The (size, mtime) pair a snapshot entry is keyed on."""
+
+    stat = os.stat(filepath)
+
+    return stat.st_size, stat.st_mtime_ns
+
+
+
+def load_inventory_from_files(parallel: bool = False, max_workers: int | None = None, use_snapshot: bool = True) -> InventoryStore:
     """ this function is just telling it to load items from all warehouse*.txt files in the data directory whereby
-    it returns a dictionary where keys are item names and values are dictionaries
-    containing 'price' and 'quantity'.
+    it returns an InventoryStore, which works like a dictionary where keys are item names and values are
+    dictionaries containing 'price' and 'quantity', but keeps them in compact arrays.
+
+    Files are merged in warehouse-number order, so when the same item is listed in several warehouses
+    the price from the highest-numbered warehouse wins (warehouse10.txt beats warehouse9.txt), no matter
+    what order the directory lists them in. With parallel=True the files are parsed in a process pool
+    and merged in that same order, so both modes give exactly the same inventory.
+
+    Every warehouse listing an item stocks 10 of it, and the store tracks price and stock per warehouse
+    (see InventoryStore.locations), so an item in three warehouses has 30 available in total.
+
+    With use_snapshot=True the parsed items of every file are kept in SNAPSHOT_FILE, keyed on the file's
+    size and modification time, and only files that changed since the snapshot was written are parsed again.
     """
-    inventory = {}
+    inventory = InventoryStore()
 
-    for filename in os.listdir(DATA_DIR):
+    filenames = _warehouse_files()
 
-        if filename.startswith("warehouse") and filename.endswith(".txt"):
+    snapshot = _read_snapshot() if use_snapshot else {}
 
-            filepath = os.path.join(DATA_DIR, filename)
+    files: dict[str, dict] = {}  # filename -> {"size", "mtime", "items": {name: price}}
 
-            try:
+    stale: list[str] = []  # files that have to be parsed again
 
-                with open(filepath, 'r') as f: """just open the file and read it"""
+    for filename in filenames:
 
-                    content = f.read().strip()
+        filepath = os.path.join(DATA_DIR, filename)
 
-                    if not content:
+        try:
 
-                        continue
+            size, mtime = _file_signature(filepath)
 
-                    items_str = content.split(';')
+        except FileNotFoundError:
 
-                    for item_str in items_str:
+            print(f"Error: {filepath} not found.")
 
-                        if ':' in item_str:
+            continue
 
-                            name, price_str = item_str.strip().split(':', 1)
+        cached = snapshot.get(filename)
 
-                            try:
+        if cached and (cached["size"], cached["mtime"]) == (size, mtime):
 
-                                price = float(price_str)
+            files[filename] = cached
 
-                                # Assuming initial quantity for each item is 1 for simplicity
+        else:
 
-                                # You might need to adjust this based on how stock is defined.
+            files[filename] = {"size": size, "mtime": mtime, "items": None}
 
-                                # For a mock app, a simple quantity might suffice.
+            stale.append(filename)
 
-                                inventory[name] = {"price": price, "quantity": 10} # Placeholder quantity
+    if parallel and len(stale) > 1:
 
-                            except ValueError:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
 
-                                print(f"Warning: Invalid price format for item '{name}' in {filename}. Skipping.")
+            futures = [pool.submit(_parse_warehouse_file, os.path.join(DATA_DIR, filename)) for filename in stale]
 
-                        else:
+            for filename, future in zip(stale, futures):
 
-                            print(f"Warning: Invalid item format '{item_str}' in {filename}. Skipping.")
+                files[filename]["items"] = _collect_parsed(future.result, filename)
 
-            except FileNotFoundError:
+    else:
 
-                print(f"Error: {filepath} not found.")
+        for filename in stale:
 
-            except Exception as e:
+            files[filename]["items"] = _collect_parsed(lambda: _parse_warehouse_file(os.path.join(DATA_DIR, filename)), filename)
+
+    # files that failed to parse are left out, so they are tried again next time
+
+    files = {filename: entry for filename, entry in files.items() if entry["items"] is not None}
+
+    for filename in filenames:  # merge in warehouse order, not in the order the files were parsed
 
-                print(f"Error reading {filepath}: {e}")
+        if filename in files:
+
+            _merge_items(inventory, files[filename]["items"].items(), _warehouse_number(filename))
+
+    if use_snapshot and (stale or set(snapshot) != set(files)):
+
+        _write_snapshot(files)
+
+    _loaded_files.clear()
+
+    _loaded_files.update({"inventory": inventory, "files": files})
+
+    _get_search_index(inventory)  # build the search index once, up front
 
     return inventory
 
 
 
+def _collect_parsed(parse, filename: str) -> dict[str, float] | None:
+
+    """Runs a parse, turning a failure into the usual error message and None so it isn't saved to the snapshot."""
+
+    filepath = os.path.join(DATA_DIR, filename)
+
+    try:
+
+        return dict(parse())  # a name listed twice in one file keeps its last price, as before
+
+    except FileNotFoundError:
+
+        print(f"Error: {filepath} not found.")
+
+    except Exception as e:
+
+        print(f"Error reading {filepath}: {e}")
+
+    return None
+
+
+
+def build_search_index(inventory: dict) -> dict:
+
+    """
+
+    Builds a token index over the item names so a search doesn't have to scan every item.
+
+    Every name is split into lower-cased words and each word points at the set of positions
+
+    (in inventory order) of the items that contain it. Every three-letter slice of a word
+
+    (its trigrams) is indexed the same way, so fragments like "pho" still find "iPhone".
+
+    """
+
+    index = {"inventory": inventory, "names": [], "lowered": [], "positions": {}, "tokens": {}, "trigrams": {}}
+
+    for name in inventory:
+
+        add_to_search_index(index, name)
+
+    return index
+
+
+
+def _index_keys(lowered_name: str):
+
+    """Yields the (table, key) pairs an item name is filed under: each word, then each trigram of that word."""
+
+    for token in set(lowered_name.split()):
+
+        yield "tokens", token
+
+        for start in range(len(token) - 2):
+
+            yield "trigrams", token[start:start + 3]
+
+
+
+def add_to_search_index(index: dict, name: str) -> None:
+
+    """Indexes one more item name. It is placed last in the result order, like a new key in a dict."""
+
+    if name in index["positions"]:
+
+        return
+
+    position = len(index["names"])
+
+    lowered = name.lower()
+
+    index["names"].append(name)
+
+    index["lowered"].append(lowered)
+
+    index["positions"][name] = position
+
+    for table, key in _index_keys(lowered):
+
+        index[table].setdefault(key, set()).add(position)
+
+
+
+def remove_from_search_index(index: dict, name: str) -> None:
+
+    """Drops an item name from the index. Its position is left empty so the others don't move."""
+
+    position = index["positions"].pop(name, None)
+
+    if position is None:
+
+        return
+
+    for table, key in _index_keys(index["lowered"][position]):
+
+        postings = index[table].get(key)
+
+        if postings is not None:
+
+            postings.discard(position)
+
+            if not postings:
+
+                del index[table][key]
+
+    index["names"][position] = None
+
+    index["lowered"][position] = ""
+
+
+
+def _get_search_index(inventory: dict) -> dict:
+
+    """Returns the index built for this inventory, rebuilding it if it belongs to another one."""
+
+    global _search_index
+
+    if _search_index.get("inventory") is not inventory or len(_search_index["positions"]) != len(inventory):
+
+        _search_index = build_search_index(inventory)
+
+    return _search_index
+
+
+
+def _term_postings(term: str, index: dict) -> set[int]:
+
+    """Returns the positions of the items whose name contains the term (case-insensitive)."""
+
+    if len(term) >= 3:
+
+        return _trigram_postings(term, index)
+
+    # Terms shorter than a trigram fall back to the word list. A query term never contains spaces,
+    # so it can only match inside one word of a name, and there are far fewer words than items.
+
+    positions: set[int] = set()
+
+    for token, token_positions in index["tokens"].items():
+
+        if term in token:
+
+            positions |= token_positions
+
+    return positions
+
+
+
+def _trigram_postings(term: str, index: dict) -> set[int]:
+
+    """Finds the items containing a term of three or more letters through the trigram index."""
+
+    trigrams: dict[str, set[int]] = index["trigrams"]
+
+    term_trigrams = {term[start:start + 3] for start in range(len(term) - 2)}
+
+    if any(trigram not in trigrams for trigram in term_trigrams):
+
+        return set()
+
+    postings: list[set[int]] = sorted((trigrams[trigram] for trigram in term_trigrams), key=len)
+
+    candidates: set[int] = postings[0].intersection(*postings[1:])
+
+    # sharing every trigram doesn't guarantee they are next to each other, so check the survivors
+
+    lowered: list[str] = index["lowered"]
+
+    return {position for position in candidates if term in lowered[position]}
+
+
+
 def search_inventory(query: str, inventory: dict) -> list[tuple[str, float]]:
 
     """
@@ -79,24 +490,206 @@ def search_inventory(query: str, inventory: dict) -> list[tuple[str, float]]:
 
     """
 
-    search_terms: list[str] = query.split()
+    with _inventory_lock:  # a hot reload could otherwise change the index halfway through the search
 
-    regex_patterns: list[re.Pattern[str]] = [re.compile(re.escape(term), re.IGNORECASE) for term in search_terms]
+        return _search(query.lower().split(), inventory)
 
 
 
-    search_output: list[tuple[str, float]] = []
+def _search(search_terms: list[str], inventory: dict) -> list[tuple[str, float]]:
+
+    """Does the work for search_inventory."""
+
+    index = _get_search_index(inventory)
+
+    names: list[str] = index["names"]
+
+    if not search_terms:
+
+        return [(name, inventory[name]["price"]) for name in names if name is not None]
+
+    postings: list[set[int]] = sorted((_term_postings(term, index) for term in set(search_terms)), key=len)
+
+    # intersect the smallest posting list first so the working set only ever shrinks
+
+    matched: set[int] = set(postings[0])
+
+    for term_postings in postings[1:]:
 
-    for item_name, details in inventory.items():
+        if not matched:
 
-        if all(pattern.search(item_name) for pattern in regex_patterns):
+            break
 
-            search_output.append((item_name, details["price"]))
+        matched &= term_postings
+
+    search_output: list[tuple[str, float]] = []
+
+    for position in sorted(matched):
+
+        search_output.append((names[position], inventory[names[position]]["price"]))
 
     return search_output
 
 
 
+def reload_changed_files() -> dict:
+
+    """
+
+    Re-parses only the warehouse files that changed since the inventory was loaded and applies the
+
+    difference to the live inventory and its search index, one warehouse location at a time. Stock of items
+
+    that didn't change is left alone, repriced items keep their stock and new locations start with the usual 10.
+
+    Returns {"added": [names], "removed": [names], "repriced": [(name, old_price, new_price)]}.
+
+    """
+
+    diff: dict = {"added": [], "removed": [], "repriced": []}
+
+    inventory = _loaded_files.get("inventory")
+
+    if inventory is None:
+
+        return diff
+
+    files: dict[str, dict] = _loaded_files["files"]
+
+    changes: list[tuple[int, dict, dict]] = []  # (warehouse, its items before, its items now) for every changed file
+
+    for filename in sorted(set(_warehouse_files()) | set(files), key=_merge_key):
+
+        filepath = os.path.join(DATA_DIR, filename)
+
+        entry = files.get(filename)
+
+        try:
+
+            size, mtime = _file_signature(filepath)
+
+        except FileNotFoundError:  # the file was deleted: all of its items go
+
+            if entry:
+
+                changes.append((_warehouse_number(filename), files.pop(filename)["items"], {}))
+
+            continue
+
+        if entry and (entry["size"], entry["mtime"]) == (size, mtime):
+
+            continue
+
+        new_items = _collect_parsed(lambda: _parse_warehouse_file(filepath), filename)
+
+        if new_items is None:
+
+            continue  # keep what we had until the file can be read again
+
+        changes.append((_warehouse_number(filename), entry["items"] if entry else {}, new_items))
+
+        files[filename] = {"size": size, "mtime": mtime, "items": new_items}
+
+    if not changes:
+
+        return diff
+
+    with _inventory_lock:
+
+        index = _get_search_index(inventory)
+
+        affected: set[str] = set()
+
+        for _, old_items, new_items in changes:
+
+            affected.update(old_items.keys() ^ new_items.keys())
+
+            affected.update(name for name, price in new_items.items() if name in old_items and old_items[name] != price)
+
+        prices_before = {name: inventory[name]["price"] for name in affected if name in inventory}
+
+        for warehouse, old_items, new_items in changes:
+
+            for name in old_items.keys() - new_items.keys():
+
+                if name in inventory:
+
+                    inventory.remove_stock(name, warehouse)
+
+            for name, price in new_items.items():
+
+                if name not in old_items:
+
+                    inventory.set_stock(name, warehouse, price, 10) # Placeholder quantity
+
+                elif old_items[name] != price:
+
+                    inventory.set_price(name, price, warehouse)  # stock in that warehouse stays as it is
+
+        for name in sorted(affected):
+
+            if name not in inventory:
+
+                if name in prices_before:
+
+                    remove_from_search_index(index, name)
+
+                    diff["removed"].append(name)
+
+            elif name not in prices_before:
+
+                add_to_search_index(index, name)
+
+                diff["added"].append(name)
+
+            elif inventory[name]["price"] != prices_before[name]:
+
+                diff["repriced"].append((name, prices_before[name], inventory[name]["price"]))
+
+    _write_snapshot(files)
+
+    return diff
+
+
+
+def start_inventory_watcher(interval: float = WATCH_INTERVAL, on_change=None) -> threading.Event:
+
+    """
+
+    Starts a background thread that checks the warehouse files every `interval` seconds and hot-reloads
+
+    the ones whose size or modification time changed. on_change(diff) is called after every reload that
+
+    changed something. Set the returned event to stop the watcher.
+
+    """
+
+    stop = threading.Event()
+
+    def watch():
+
+        while not stop.wait(interval):
+
+            try:
+
+                diff = reload_changed_files()
+
+            except Exception as e:
+
+                print(f"Warning: Could not reload the warehouse files: {e}")
+
+                continue
+
+            if on_change and any(diff.values()):
+
+                on_change(diff)
+
+    threading.Thread(target=watch, name="inventory-watcher", daemon=True).start()
+
+    return stop
+
+
+
 # Example Usage (for testing)
 
 # if __name__ == "__main__":
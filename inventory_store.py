@@ -0,0 +1,610 @@
+"""This module holds the compact inventory store. Instead of one small dictionary per item, it keeps a
+name -> slot map plus typed arrays for prices and quantities, while still behaving like the old
+{item_name: {"price": float, "quantity": int}} dictionary for the rest of the app.
+
+Stock is kept per (item, warehouse) pair. Each item has a short chain of locations, one per warehouse
+that lists it, ordered from the highest warehouse number down. The first location sets the item's price
+(the highest-numbered warehouse wins, like the loader's merge order) and is the first one stock is taken from.
+The item's total available quantity is kept up to date in its own array, so reading it is O(1).
+A warehouse taken off an item while carts still hold units from it leaves the chain but is kept as a
+tombstone until those holds are sold or given back; units given back to a tombstone leave with it.
+
+Changes to an item's stock happen under that item's lock, one of LOCK_STRIPES locks picked by a hash of
+its name, so threads working on different items don't wait for each other and a check of the stock is
+never separated from taking it. reserve_many() takes several items at once, locking their stripes in
+ascending order so two such calls can't deadlock."""
+
+import itertools
+import threading
+from array import array
+from contextlib import contextmanager
+
+LOCK_STRIPES = 64  # item locks; two items share one only when their names hash to the same stripe
+
+
+class InsufficientStockError(ValueError):
+    """Raised when an item doesn't have the stock asked for. `short` lists the names that fell short."""
+
+    def __init__(self, message: str, short: list[str]):
+        super().__init__(message)
+
+        self.short = short
+
+
+def _check_quantity(quantity: int) -> None:
+    """Stock moves by whole units, at least one at a time; a zero or negative amount would run the move backwards."""
+
+    if quantity < 1:
+        raise ValueError(f"Quantity must be at least 1, not {quantity}")
+
+
+class _ItemView:
+    """Looks like an item's {"price": ..., "quantity": ...} dictionary but reads and writes the store's arrays."""
+
+    __slots__ = ("_store", "_slot")
+
+    _FIELDS = ("price", "quantity")
+
+    def __init__(self, store: "InventoryStore", slot: int):
+        self._store = store
+
+        self._slot = slot
+
+    def __getitem__(self, field: str):
+        if field == "price":
+            return self._store._prices[self._slot]
+
+        if field == "quantity":
+            return self._store._quantities[self._slot]
+
+        raise KeyError(field)
+
+    def __setitem__(self, field: str, value):
+        store = self._store
+
+        name = store._names[self._slot]
+
+        if field == "price":
+            store.set_price(name, value)
+
+        elif field == "quantity":
+            with store.locked(name):
+                # old-style code writes the new total; turn it into taking stock away or adding it
+                change = value - store._quantities[self._slot]
+
+                if change < 0:
+                    store.take_stock(name, -change)
+
+                elif change > 0:
+                    store.add_stock(name, change)
+
+        else:
+            raise KeyError(field)  # the arrays only have room for price and quantity
+
+    def get(self, field: str, default=None):
+        return self[field] if field in self._FIELDS else default
+
+    def keys(self):
+        return list(self._FIELDS)
+
+    def items(self):
+        return [(field, self[field]) for field in self._FIELDS]
+
+    def __iter__(self):
+        return iter(self._FIELDS)
+
+    def __contains__(self, field) -> bool:
+        return field in self._FIELDS
+
+    def copy(self) -> dict:
+        return dict(self.items())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (_ItemView, dict)):
+            return self.copy() == dict(other.items())
+
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(self.copy())
+
+
+class InventoryStore:
+    """
+    Dictionary-like inventory backed by typed arrays.
+
+    Every item gets a slot: its name is kept in a list and a name -> slot map, its price in an array of
+    doubles and its total available quantity in an array of 64-bit integers. inventory[name] returns a
+    small view, so code like inventory[name]['quantity'] -= 1 keeps working. Deleting an item leaves its
+    slot empty so the other slots don't move, and items are iterated in the order they were first added.
+
+    Locations live in their own arrays (item slot, warehouse, price, available, held, next location).
+    'held' counts units taken out of a warehouse for a cart that hasn't been checked out yet.
+
+    The stock methods are safe to call from several threads: each one holds the item's stripe lock, and
+    adding or deleting a slot or a location also holds the structure lock (always taken after a stripe).
+    """
+
+    def __init__(self):
+        self._slots: dict[str, int] = {}
+
+        self._names: list[str | None] = []
+
+        self._prices = array('d')
+
+        self._quantities = array('q')  # total available over all of the item's warehouses
+
+        self._first_location = array('q')  # -1 when the item has no location
+
+        self._location_item = array('q')
+
+        self._location_warehouse = array('i')
+
+        self._location_price = array('d')
+
+        self._location_available = array('q')
+
+        self._location_held = array('q')
+
+        self._location_next = array('q')  # next location of the same item, -1 at the end of the chain
+
+        self._tombstones: dict[int, list[int]] = {}  # slot -> removed locations that carts still hold units from
+
+        self.ledger = None  # a StockLedger that hears about every change to warehouse stock, see stock_ledger.py
+
+        self.reservations = None  # the timed holds carts have on this stock, see reservations.py
+
+        self._stripes = [threading.RLock() for _ in range(LOCK_STRIPES)]
+
+        self._structure_lock = threading.RLock()  # held while slots or locations are added or an item is deleted
+
+    # --- locking ---
+
+    def _stripe(self, name: str) -> int:
+        return hash(name) % LOCK_STRIPES
+
+    @contextmanager
+    def locked(self, *names: str):
+        """Holds the locks of the given items, taken in stripe order so no two callers can deadlock."""
+
+        stripes = [self._stripes[index] for index in sorted({self._stripe(name) for name in names})]
+
+        for lock in stripes:
+            lock.acquire()
+
+        try:
+            yield
+
+        finally:
+            for lock in reversed(stripes):
+                lock.release()
+
+    # --- per-warehouse stock ---
+
+    def _slot_for(self, name: str) -> int:
+        """Returns the item's slot, creating an empty item if it isn't there yet."""
+
+        slot = self._slots.get(name)
+
+        if slot is None:
+            with self._structure_lock:
+                slot = len(self._names)
+
+                self._names.append(name)
+
+                self._prices.append(0.0)
+
+                self._quantities.append(0)
+
+                self._first_location.append(-1)
+
+                self._slots[name] = slot  # last, so other threads never see a slot whose arrays aren't there yet
+
+        return slot
+
+    def _chain(self, slot: int):
+        """Yields the item's location numbers, highest warehouse first."""
+
+        location = self._first_location[slot]
+
+        while location != -1:
+            yield location
+
+            location = self._location_next[location]
+
+    def _find_location(self, slot: int, warehouse: int) -> int:
+        for location in self._chain(slot):
+            if self._location_warehouse[location] == warehouse:
+                return location
+
+        return -1
+
+    def set_stock(self, name: str, warehouse: int, price: float, quantity: int) -> None:
+        """Sets the price and available quantity of an item in one warehouse, adding the item if needed."""
+
+        with self.locked(name):
+            slot = self._slot_for(name)
+
+            location = self._find_location(slot, warehouse)
+
+            if location == -1:
+                if self.ledger is not None:
+                    quantity += self.ledger.total(name, warehouse)  # a warehouse coming back keeps its recorded sales
+
+                with self._structure_lock:
+                    location = len(self._location_item)
+
+                    self._location_item.append(slot)
+
+                    self._location_warehouse.append(warehouse)
+
+                    self._location_price.append(price)
+
+                    self._location_available.append(0)
+
+                    self._location_held.append(0)
+
+                    self._location_next.append(-1)
+
+                self._link(slot, location)
+
+            self._location_price[location] = price
+
+            self._quantities[slot] += quantity - self._location_available[location]
+
+            self._location_available[location] = quantity
+
+            self._prices[slot] = self._location_price[self._first_location[slot]]
+
+    def _link(self, slot: int, location: int) -> None:
+        """Inserts a location into the item's chain, keeping it sorted from the highest warehouse down."""
+
+        warehouse = self._location_warehouse[location]
+
+        previous, current = -1, self._first_location[slot]
+
+        while current != -1 and self._location_warehouse[current] > warehouse:
+            previous, current = current, self._location_next[current]
+
+        self._location_next[location] = current
+
+        if previous == -1:
+            self._first_location[slot] = location
+
+        else:
+            self._location_next[previous] = location
+
+    def remove_stock(self, name: str, warehouse: int) -> None:
+        """Takes a warehouse off an item. The item itself goes once no warehouse lists it any more."""
+
+        with self.locked(name):
+            slot = self._slots[name]
+
+            previous, current = -1, self._first_location[slot]
+
+            while current != -1 and self._location_warehouse[current] != warehouse:
+                previous, current = current, self._location_next[current]
+
+            if current == -1:
+                return
+
+            if previous == -1:
+                self._first_location[slot] = self._location_next[current]
+
+            else:
+                self._location_next[previous] = self._location_next[current]
+
+            self._quantities[slot] -= self._location_available[current]
+
+            self._location_available[current] = 0
+
+            if self._location_held[current]:
+                self._tombstones.setdefault(slot, []).append(current)  # see release() and commit()
+
+            if self._first_location[slot] == -1:
+                del self[name]
+
+            else:
+                self._prices[slot] = self._location_price[self._first_location[slot]]
+
+    def set_price(self, name: str, price: float, warehouse: int | None = None) -> None:
+        """Changes the price in one warehouse, or in the warehouse that sets the item's price if none is given."""
+
+        with self.locked(name):
+            slot = self._slots[name]
+
+            location = self._first_location[slot] if warehouse is None else self._find_location(slot, warehouse)
+
+            if location == -1:
+                raise KeyError(f"{name} is not stocked in warehouse {warehouse}")
+
+            self._location_price[location] = price
+
+            self._prices[slot] = self._location_price[self._first_location[slot]]
+
+    def locations(self, name: str) -> list[tuple[int, float, int]]:
+        """Returns (warehouse, price, available) for every warehouse that stocks the item, highest warehouse first."""
+
+        slot = self._slots[name]
+
+        return [(self._location_warehouse[location], self._location_price[location], self._location_available[location])
+                for location in self._chain(slot)]
+
+    def available(self, name: str) -> int:
+        """Total available quantity of an item over all warehouses. O(1)."""
+
+        slot = self._slots.get(name)
+
+        return 0 if slot is None else self._quantities[slot]
+
+    def allocate(self, name: str, quantity: int) -> list[tuple[int, int]]:
+        """
+        Holds stock for a cart, taking it from the item's warehouses in order (highest warehouse first).
+        Returns the (warehouse, quantity) pairs it took. Raises InsufficientStockError (a ValueError) if
+        there isn't enough stock. Raises ValueError if the quantity isn't at least 1.
+        """
+
+        _check_quantity(quantity)
+
+        with self.locked(name):
+            slot = self._slots[name]
+
+            if self._quantities[slot] < quantity:
+                raise InsufficientStockError(f"Not enough stock for '{name}'. Available: {self._quantities[slot]}", [name])
+
+            allocations = []
+
+            remaining = quantity
+
+            for location in self._chain(slot):
+                if remaining == 0:
+                    break
+
+                taken = min(remaining, self._location_available[location])
+
+                if taken:
+                    self._location_available[location] -= taken
+
+                    self._location_held[location] += taken
+
+                    allocations.append((self._location_warehouse[location], taken))
+
+                    remaining -= taken
+
+            self._quantities[slot] -= quantity
+
+            return allocations
+
+    def reserve_many(self, quantities: dict[str, int]) -> dict[str, list[tuple[int, int]]]:
+        """
+        Holds stock for several items as one step: either every item gets its quantity or none does.
+        Returns {name: (warehouse, quantity) pairs}. Raises InsufficientStockError naming every item
+        that is short (or not in the inventory), or ValueError for a quantity below 1, having taken nothing.
+        """
+
+        for quantity in quantities.values():
+            _check_quantity(quantity)  # before anything is taken, so a bad last entry can't strand the first ones
+
+        with self.locked(*quantities):
+            short = [name for name, quantity in quantities.items() if self.available(name) < quantity]
+
+            if short:
+                raise InsufficientStockError(f"Not enough stock for {', '.join(map(repr, short))}.", short)
+
+            return {name: self.allocate(name, quantity) for name, quantity in quantities.items()}
+
+    def release(self, name: str, quantity: int) -> list[tuple[int, int]]:
+        """
+        Puts held stock back into the warehouses it was taken from (lowest warehouse first). Returns the
+        (warehouse, quantity) pairs it put back. Units held from a warehouse that no longer lists the item
+        are dropped: they left with the listing, so they aren't credited anywhere or recorded in the ledger.
+        """
+
+        _check_quantity(quantity)
+
+        with self.locked(name):
+            slot = self._slots[name]
+
+            releases = []
+
+            remaining = quantity
+
+            for location in self._tombstones.get(slot, ()):
+                dropped = min(remaining, self._location_held[location])
+
+                self._location_held[location] -= dropped
+
+                remaining -= dropped
+
+            self._bury(slot)
+
+            for location in reversed(list(self._chain(slot))):
+                if remaining == 0:
+                    break
+
+                returned = min(remaining, self._location_held[location])
+
+                if returned:
+                    self._location_held[location] -= returned
+
+                    self._location_available[location] += returned
+
+                    releases.append((self._location_warehouse[location], returned))
+
+                    self._quantities[slot] += returned
+
+                    remaining -= returned
+
+            return releases  # anything left over was held from a listing that is gone, e.g. before a reload re-added the item
+
+    def add_stock(self, name: str, quantity: int) -> None:
+        """Adds new units to the item's first warehouse and records them in the ledger."""
+
+        _check_quantity(quantity)
+
+        with self.locked(name):
+            slot = self._slots[name]
+
+            first = self._first_location[slot]
+
+            self._location_available[first] += quantity
+
+            self._quantities[slot] += quantity
+
+            self._record(first, quantity)
+
+    def take_stock(self, name: str, quantity: int) -> None:
+        """
+        Takes available units out of the item's warehouses for good (highest warehouse first) and records
+        them in the ledger; no cart holds them. Raises InsufficientStockError if there aren't that many.
+        """
+
+        _check_quantity(quantity)
+
+        with self.locked(name):
+            slot = self._slots[name]
+
+            if self._quantities[slot] < quantity:
+                raise InsufficientStockError(f"Not enough stock for '{name}'. Available: {self._quantities[slot]}", [name])
+
+            remaining = quantity
+
+            for location in self._chain(slot):
+                if remaining == 0:
+                    break
+
+                taken = min(remaining, self._location_available[location])
+
+                if taken:
+                    self._location_available[location] -= taken
+
+                    self._record(location, -taken)
+
+                    remaining -= taken
+
+            self._quantities[slot] -= quantity
+
+    def _bury(self, slot: int) -> None:
+        """Forgets the item's tombstones that no cart holds anything from any more."""
+
+        tombstones = self._tombstones.get(slot)
+
+        if tombstones is not None:
+            tombstones[:] = [location for location in tombstones if self._location_held[location]]
+
+            if not tombstones:
+                del self._tombstones[slot]
+
+    def commit(self, name: str, quantity: int) -> None:
+        """Marks held stock as sold at checkout: it leaves the warehouses for good."""
+
+        _check_quantity(quantity)
+
+        with self.locked(name):
+            slot = self._slots.get(name)
+
+            if slot is None:
+                return
+
+            remaining = quantity
+
+            for location in itertools.chain(self._chain(slot), self._tombstones.get(slot, ())):
+                sold = min(remaining, self._location_held[location])
+
+                self._location_held[location] -= sold
+
+                remaining -= sold
+
+                self._record(location, -sold)
+
+            self._bury(slot)
+
+    def adjust_stock(self, name: str, warehouse: int, delta: int) -> None:
+        """Adds a delta to an item's available stock in one warehouse (never below zero). Not recorded in the ledger."""
+
+        with self.locked(name):
+            slot = self._slots[name]
+
+            location = self._find_location(slot, warehouse)
+
+            if location == -1:
+                return  # that warehouse doesn't list the item any more
+
+            new_quantity = max(0, self._location_available[location] + delta)
+
+            self._quantities[slot] += new_quantity - self._location_available[location]
+
+            self._location_available[location] = new_quantity
+
+    def _record(self, location: int, delta: int) -> None:
+        if self.ledger is not None and delta:
+            self.ledger.record(self._names[self._location_item[location]], self._location_warehouse[location], delta)
+
+    def set_item(self, name: str, price: float, quantity: int) -> None:
+        """Old-style update for code that doesn't know about warehouses: sets the price and total quantity."""
+
+        slot = self._slots.get(name)
+
+        if slot is None or self._first_location[slot] == -1:
+            self.set_stock(name, 0, price, quantity)
+
+            return
+
+        self.set_price(name, price)
+
+        view = _ItemView(self, slot)
+
+        view["quantity"] = quantity
+
+    def in_stock(self) -> list[str]:
+        """Names of the items with a quantity above zero, read straight off the quantity array."""
+
+        names = self._names
+
+        return [names[slot] for slot, quantity in enumerate(self._quantities) if quantity > 0 and names[slot] is not None]
+
+    # --- dictionary interface ---
+
+    def __getitem__(self, name: str) -> _ItemView:
+        return _ItemView(self, self._slots[name])
+
+    def __setitem__(self, name: str, details: dict):
+        self.set_item(name, details["price"], details["quantity"])
+
+    def __delitem__(self, name: str):
+        with self.locked(name), self._structure_lock:
+            slot = self._slots.pop(name)
+
+            self._names[slot] = None
+
+            self._quantities[slot] = 0
+
+            self._first_location[slot] = -1
+
+            self._tombstones.pop(slot, None)  # what carts held of it leaves with it
+
+    def __contains__(self, name) -> bool:
+        return name in self._slots
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __iter__(self):
+        return (name for name in self._names if name is not None)
+
+    def get(self, name: str, default=None):
+        slot = self._slots.get(name)
+
+        return default if slot is None else _ItemView(self, slot)
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [_ItemView(self, slot) for slot, name in enumerate(self._names) if name is not None]
+
+    def items(self):
+        return [(name, _ItemView(self, slot)) for slot, name in enumerate(self._names) if name is not None]
+
+    def __repr__(self) -> str:
+        return f"InventoryStore({len(self)} items)"
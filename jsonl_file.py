@@ -0,0 +1,71 @@
+"""This module holds the file handling the app's append-only logs share: the stock ledger, the account
+journal, the order log and the money ledger all keep one JSON value per line, read the lines other
+copies of the app appended by starting from an offset, append with an fsync, and write their
+snapshots and checkpoints to a temporary file that is moved into place once it is on disk."""
+
+import json
+import os
+
+
+def read_entries(path: str, offset: int = 0):
+    """
+    Yields (offset, next offset, entry) for every complete line of the file from `offset` on, so callers
+    can remember how far they read. entry is None for a damaged line, which callers step over. Stops at
+    a line without its newline (still being written, or cut short by a crash). A missing file has no lines.
+    """
+
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+
+            for line in f:
+                if not line.endswith(b"\n"):
+                    return
+
+                try:
+                    entry = json.loads(line)
+
+                except ValueError:
+                    entry = None
+
+                yield offset, offset + len(line), entry
+
+                offset += len(line)
+
+    except FileNotFoundError:
+        return
+
+
+def append_durably(path: str, data: str | bytes, expected_size: int | None = None) -> None:
+    """
+    Appends to the file and fsyncs it, so the data is on disk when this returns. With expected_size,
+    anything past that size (a half-written line left by a crash) is cut off first.
+    """
+
+    if isinstance(data, str):
+        data = data.encode()
+
+    with open(path, 'ab') as f:
+        if expected_size is not None and f.tell() != expected_size:
+            f.truncate(expected_size)
+
+        f.write(data)
+
+        f.flush()
+
+        os.fsync(f.fileno())
+
+
+def write_atomically(path: str, text: str) -> None:
+    """Replaces the file's contents all at once: a crash leaves either the old file or the new one, never half of one."""
+
+    temp_file = path + ".tmp"
+
+    with open(temp_file, 'w') as f:
+        f.write(text)
+
+        f.flush()
+
+        os.fsync(f.fileno())
+
+    os.replace(temp_file, path)
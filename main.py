@@ -5,14 +5,6 @@ import os #means bring in Python's tools to work with files and folders.
 
 import time #means to bring in Python's clock tools to help with time / delays.
 
-import re # "re" stands for regular expressions. bring in Python tools for finding patterns in text.
-
-import hashlib # it turns words like your password into secret code that no one can read.
-
-import random   #means bring in Python's tools to pick or create things randomly.
-
-import string #means to bring in Python's tools for working with a letter, number, and symbols.
-
 #Utility Functions (in utils.py)
 DATA_DIR: str = "data"
 
@@ -40,808 +32,38 @@ def setup_data_storage():
 
 #Authentication Functions (auth.py)
 
-def _hash_password(password: str) -> str:
-    """Hashes a password using SHA256."""
-
-    return hashlib.sha256(password.encode()).hexdigest()
-
-
-def _check_password_strength(password: str) -> bool:
-    """Checks if a password meets the strength criteria."""
-
-    if len(password) < 16:
-        return False
-
-    if not any(c.islower() for c in password):
-        return False
-
-    if not any(c.isupper() for c in password):
-        return False
-
-    if not any(c.isdigit() for c in password):
-        return False
-
-    if not any(c in string.punctuation for c in password):  # Includes common special symbols
-
-        return False
-
-    return True
-
-
-def generate_strong_password() -> str:
-    """Generates a strong password meeting the specified criteria."""
-
-    while True:
-
-        password = ''.join(random.choices(string.ascii_letters + string.digits + string.punctuation, k=16))
-
-        if _check_password_strength(password):
-            return password
-
-
-def _get_all_accounts() -> list[dict]:
-    """Reads all accounts from accounts.txt."""
-
-    accounts = []
-
-    try:
-
-        with open(ACCOUNTS_FILE, 'r') as f:
-
-            for line in f:
-
-                parts = line.strip().split(',')
-
-                if len(parts) == 4:
-                    accounts.append({
-
-                        "username": parts[0].strip(),
-
-                        "email": parts[1].strip(),
-
-                        "password_hash": parts[2].strip(),
-
-                        "balance": float(parts[3].strip())
-
-                    })
-
-    except FileNotFoundError:
-
-        pass  # Will be handled by setup_data_storage
-
-    return accounts
-
-
-def _save_accounts(accounts: list[dict]):
-    """Saves all accounts back to accounts.txt."""
-
-    with open(ACCOUNTS_FILE, 'w') as f:
-        for account in accounts:
-            f.write(f"{account['username']},{account['email']},{account['password_hash']},{account['balance']:.2f}\n")
-
-
-def sign_up():
-    """Handles new user registration."""
-
-    print("\n--- Sign Up ---")
-
-    accounts = _get_all_accounts()
-
-    while True:
-
-        username = input("Enter desired username: ").strip()
-
-        if any(acc['username'].lower() == username.lower() for acc in accounts):
-
-            print("Username already taken. Please choose another.")
-
-        else:
-
-            break
-
-    while True:
-
-        email = input("Enter email address: ").strip()
-
-        if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
-
-            print("Invalid email format. Please try again.")
-
-        elif any(acc['email'].lower() == email.lower() for acc in accounts):
-
-            print("Email already registered. Please choose another or sign in.")
-
-        else:
-
-            break
-
-    while True:
-
-        password_choice = input("Create password manually (M) or generate automatically (A)? ").strip().upper()
-
-        if password_choice == 'M':
-
-            while True:
-
-                password = input("Enter password (min 16 chars, 1 lower, 1 upper, 1 num, 1 special): ").strip()
-
-                if _check_password_strength(password):
-
-                    break
-
-                else:
-
-                    print("Password does not meet strength requirements. Please try again.")
-
-            break
-
-        elif password_choice == 'A':
-
-            password = generate_strong_password()
-
-            print(f"Generated password: {password}")
-
-            input("Press Enter to continue after noting your password...")  # Give user time to note it
-
-            break
-
-        else:
-
-            print("Invalid choice. Please enter 'M' or 'A'.")
-
-    hashed_password = _hash_password(password)
-
-    new_account = {
-
-        "username": username,
-
-        "email": email,
-
-        "password_hash": hashed_password,
-
-        "balance": 0.00
-
-    }
-
-    accounts.append(new_account)
-
-    _save_accounts(accounts)
-
-    print("Account created successfully!")
-
-    return new_account  # Return the newly created account for immediate login
-
-
-def sign_in():
-    """Handles existing user login."""
-
-    print("\n--- Sign In ---")
-
-    accounts = _get_all_accounts()
-
-    max_attempts = 3
-
-    attempts = 0
-
-    while attempts < max_attempts:
-
-        user_input = input("Enter username or email: ").strip()
-
-        password = input("Enter password: ").strip()
-
-        hashed_password = _hash_password(password)
-
-        found_account = None
-
-        for account in accounts:
-
-            if (account['username'].lower() == user_input.lower() or
-
-                    account['email'].lower() == user_input.lower()):
-
-                if account['password_hash'] == hashed_password:
-                    found_account = account
-
-                    break
-
-        if found_account:
-
-            print("Login successful!")
-
-            return found_account
-
-        else:
-
-            attempts += 1
-
-            print(f"Invalid username/email or password. {max_attempts - attempts} attempts remaining.")
-
-    print("Too many failed attempts. Returning to main menu.")
-
-    return None
+from auth import sign_up, sign_in  #👈accounts are looked up through the account repository in account_store.py
 
 
 # --- Inventory Functions (inventory.py) ---
 
-def load_inventory_from_files() -> dict:
-  #loads inventory items from all warehouse*.txt files in the data directory.
-  # returns a dictionary where keys are item names and values are dictionaries
-  # containing 'price' and 'quantity'.
-
-    inventory: dict = {}
-
-    for filename in os.listdir(DATA_DIR):
-
-        if filename.startswith("warehouse") and filename.endswith(".txt"):
-
-            filepath = os.path.join(DATA_DIR, filename)
-
-            try:
-
-                with open(filepath, 'r') as f:
-
-                    content = f.read().strip()
-
-                    if not content:
-                        continue
-
-                    items_str = content.split(';')
-
-                    for item_str in items_str:
-
-                        if ':' in item_str:
-
-                            name, price_str = item_str.strip().split(':', 1)
-
-                            try:
-
-                                price = float(price_str)
-
-                                # Assuming initial quantity for each item is 10 for simplicity
-
-                                inventory[name] = {"price": price, "quantity": 10}
-
-                            except ValueError:
-
-                                print(f"Warning: Invalid price format for item '{name}' in {filename}. Skipping.")
+from inventory import load_inventory_from_files, start_inventory_watcher  #👈the search index lives in inventory.py
 
-                        else:
+import shop_service  #👈the shop's actions without the menus; the menus below ask, call it and print the answer
 
-                            print(f"Warning: Invalid item format '{item_str}' in {filename}. Skipping.")
-
-            except FileNotFoundError:
-
-                print(f"Error: {filepath} not found.")
-
-            except Exception as e:
-
-                print(f"Error reading {filepath}: {e}")
-
-    return inventory
-
-
-def search_inventory(query: str, inventory: dict) -> list[tuple[str, float]]:
-    """
-
-    Searches the inventory for items matching the query.
-
-    Returns a list of (item_name, item_price) tuples.
-
-    """
-
-    search_terms: list[str] = query.split()
-
-    regex_patterns: list[re.Pattern[str]] = [re.compile(re.escape(term), re.IGNORECASE) for term in search_terms]
-
-    search_output: list[tuple[str, float]] = []
-
-    for item_name, details in inventory.items():
-
-        if all(pattern.search(item_name) for pattern in regex_patterns):
-            search_output.append((item_name, details["price"]))
-
-    return search_output
+from storage import get_storage  #👈text files or SQLite, picked with the SHOP_STORAGE environment variable
 
 
 # --- Account Management Functions (account_management.py) ---
 
-def _authenticate_user_password(current_user: dict) -> bool:
-    """Prompts for password and verifies it against the current user's password."""
-
-    password = input("Please enter your password to confirm: ").strip()
-
-    if _hash_password(password) == current_user['password_hash']:
-
-        return True
-
-    else:
-
-        print("Incorrect password. Operation cancelled.")
-
-        return False
-
-
-def fund_wallet(current_user: dict):
-    """Allows user to add money to their wallet."""
-
-    print("\n--- Fund Wallet ---")
-
-    options = [10000, 20000, 50000, 100000]
-
-    for i, amount in enumerate(options):
-        print(f"{i + 1}. NGN {amount:,.2f}")
-
-    print("5. Custom Amount")
-
-    print("6. Back to Run Menu")
-
-    while True:
-
-        try:
-
-            choice = input("Select an option to fund your wallet: ").strip()
-
-            if choice == '6':
-                return
-
-            fund_amount = 0.0
-
-            if choice == '5':
-
-                while True:
-
-                    try:
-
-                        custom_amount = float(input("Enter custom amount to deposit (NGN): "))
-
-                        if custom_amount > 0:
-
-                            fund_amount = custom_amount
-
-                            break
-
-                        else:
-
-                            print("Amount must be positive.")
-
-                    except ValueError:
-
-                        print("Invalid amount. Please enter a number.")
-
-            else:
-
-                choice_index = int(choice) - 1
-
-                if 0 <= choice_index < len(options):
-
-                    fund_amount = options[choice_index]
-
-                else:
-
-                    print("Invalid option. Please try again.")
-
-                    continue
-
-            current_user['balance'] += fund_amount
-
-            accounts = _get_all_accounts()
-
-            for i, acc in enumerate(accounts):
-
-                if acc['username'] == current_user['username']:
-                    accounts[i] = current_user
-
-                    break
-
-            _save_accounts(accounts)
-
-            print(f"Wallet funded successfully! Your new balance is NGN {current_user['balance']:,.2f}")
-
-            cont_choice = input("Continue funding (Y/N)? ").strip().upper()
-
-            if cont_choice != 'Y':
-                break
-
-        except ValueError:
-
-            print("Invalid input. Please enter a number.")
-
-        except Exception as e:
-
-            print(f"An error occurred: {e}")
-
-
-def change_username(current_user: dict):
-    """Allows user to change their username."""
-
-    print("\n--- Change Username ---")
-
-    if not _authenticate_user_password(current_user):
-        return
-
-    accounts = _get_all_accounts()
-
-    while True:
-
-        new_username = input("Enter new username: ").strip()
-
-        if any(acc['username'].lower() == new_username.lower() for acc in accounts if
-               acc['username'] != current_user['username']):
-
-            print("Username already taken. Please choose another.")
-
-        else:
-
-            break
-
-    current_user['username'] = new_username
-
-    for i, acc in enumerate(accounts):
-
-        if acc['email'] == current_user['email']:  # Use unique identifier to find
-
-            accounts[i] = current_user
-
-            break
-
-    _save_accounts(accounts)
-
-    print(f"Username changed successfully to: {new_username}")
-
-
-def change_email(current_user: dict):
-    """Allows user to change their email."""
-
-    print("\n--- Change Email ---")
-
-    if not _authenticate_user_password(current_user):
-        return
-
-    accounts = _get_all_accounts()
-
-    while True:
-
-        new_email = input("Enter new email: ").strip()
-
-        if not re.match(r"[^@]+@[^@]+\.[^@]+", new_email):
-
-            print("Invalid email format. Please try again.")
-
-        elif any(
-                acc['email'].lower() == new_email.lower() for acc in accounts if acc['email'] != current_user['email']):
-
-            print("Email already registered. Please choose another.")
-
-        else:
-
-            break
-
-    current_user['email'] = new_email
-
-    for i, acc in enumerate(accounts):
-
-        if acc['username'] == current_user['username']:  # Use unique identifier to find
-
-            accounts[i] = current_user
-
-            break
-
-    _save_accounts(accounts)
-
-    print(f"Email changed successfully to: {new_email}")
-
-
-def change_password(current_user: dict):
-    """Allows user to change their password."""
-
-    print("\n--- Change Password ---")
-
-    if not _authenticate_user_password(current_user):
-        return
-
-    while True:
-
-        password_choice = input("Create new password manually (M) or generate automatically (A)? ").strip().upper()
-
-        if password_choice == 'M':
-
-            while True:
-
-                new_password = input("Enter new password (min 16 chars, 1 lower, 1 upper, 1 num, 1 special): ").strip()
-
-                if _check_password_strength(new_password):
-
-                    break
-
-                else:
-
-                    print("Password does not meet strength requirements. Please try again.")
-
-            break
-
-        elif password_choice == 'A':
-
-            new_password = generate_strong_password()
-
-            print(f"Generated new password: {new_password}")
-
-            input("Press Enter to continue after noting your new password...")
-
-            break
-
-        else:
-
-            print("Invalid choice. Please enter 'M' or 'A'.")
-
-    current_user['password_hash'] = _hash_password(new_password)
-
-    accounts = _get_all_accounts()
-
-    for i, acc in enumerate(accounts):
-
-        if acc['username'] == current_user['username']:
-            accounts[i] = current_user
-
-            break
-
-    _save_accounts(accounts)
-
-    print("Password changed successfully!")
-
-
-def view_account_details(current_user: dict):
-    """Displays user account balance and details."""
-
-    print("\n--- Account Details ---")
-
-    if not _authenticate_user_password(current_user):
-        return
-
-    print(f"Username: {current_user['username']}")
-
-    print(f"Email: {current_user['email']}")
-
-    print(f"Balance: NGN {current_user['balance']:,.2f}")
-
-
-def reset_balance(current_user: dict):
-    """Resets user's wallet balance to zero."""
-
-    print("\n--- Reset Balance ---")
-
-    if not _authenticate_user_password(current_user):
-        return
-
-    confirm = input("Are you sure you want to reset your balance to NGN 0.00? (Y/N): ").strip().upper()
-
-    if confirm == 'Y':
-
-        current_user['balance'] = 0.00
-
-        accounts = _get_all_accounts()
-
-        for i, acc in enumerate(accounts):
-
-            if acc['username'] == current_user['username']:
-                accounts[i] = current_user
-
-                break
-
-        _save_accounts(accounts)
-
-        print("Your balance has been reset to NGN 0.00.")
-
-    else:
-
-        print("Balance reset cancelled.")
-
-
-def delete_account(current_user: dict):
-    """Permanently deletes the user's account."""
-
-    print("\n--- Delete Account ---")
-
-    if not _authenticate_user_password(current_user):
-        return
-
-    confirm = input(
-        "Are you absolutely sure you want to delete your account? This action cannot be undone. (Y/N): ").strip().upper()
-
-    if confirm == 'Y':
-
-        accounts = _get_all_accounts()
-
-        accounts = [acc for acc in accounts if acc['username'] != current_user['username']]
-
-        _save_accounts(accounts)
-
-        print("Your account has been successfully deleted.")
-
-        return True  # Indicate an account was deleted
-
-    else:
-        print("Account deletion cancelled.")
-
-        return False  # Indicate an account was not deleted
+from account_management import (fund_wallet, change_username, change_email, change_password, view_account_details,
+                                reset_balance, delete_account)
 
 
 # --- Cart Functions (cart.py) ---
 
-def display_cart(user_cart: dict, inventory: dict):
-    """Displays items currently in the user's cart."""
-
-    print("\n--- Your Shopping Cart ---")
-
-    if not user_cart:
-        print("Your cart is empty.")
-
-        return
-
-    total_price = 0.0
-
-    print(f"{'Item Name':<30} {'Quantity':<10} {'Price (each)':<15} {'Subtotal':<15}")
-
-    print("-" * 70)
-
-    for item_name, qty in user_cart.items():
-
-        if item_name in inventory:
-            price_each = inventory[item_name]['price']
-
-            subtotal = price_each * qty
+from cart import (Cart, display_cart, add_item_to_cart, remove_item_from_cart, clear_cart, checkout,
+                  restore_cart, release_cart, bulk_add_to_cart)  #👈stock is held per warehouse in cart.py
 
-            total_price += subtotal
+from cart_store import get_cart_store  #👈every user's cart is saved on disk, so it is still there next time
 
-            print(f"{item_name:<30} {qty:<10} NGN {price_each:,.2f}   NGN {subtotal:,.2f}")
-
-    print("-" * 70)
-
-    print(f"{'Total:':<55} NGN {total_price:,.2f}")
-
-
-def add_item_to_cart(user_cart: dict, inventory: dict, item_name: str, quantity: int = 1):
-    """Adds an item to the cart and updates inventory."""
-
-    if item_name not in inventory:
-        print(f"Error: '{item_name}' not found in inventory.")
-
-        return False
-
-    if inventory[item_name]['quantity'] < quantity:
-        print(f"Error: Not enough stock for '{item_name}'. Available: {inventory[item_name]['quantity']}")
-
-        return False
-
-    user_cart[item_name] = user_cart.get(item_name, 0) + quantity
-
-    inventory[item_name]['quantity'] -= quantity
-
-    print(f"'{item_name}' (x{quantity}) added to cart.")
-
-    return True
-
-
-def remove_item_from_cart(user_cart: dict, inventory: dict, item_name: str, quantity: int = 1):
-    """Removes an item from the cart and updates inventory."""
-
-    if item_name not in user_cart:
-        print(f"Error: '{item_name}' not in your cart.")
-
-        return False
-
-    if user_cart[item_name] <= quantity:
-
-        inventory[item_name]['quantity'] += user_cart[item_name]  # Return all quantity to inventory
-
-        del user_cart[item_name]
-
-        print(f"'{item_name}' removed from cart.")
-
-    else:
-
-        user_cart[item_name] -= quantity
-
-        inventory[item_name]['quantity'] += quantity
-
-        print(f"Removed {quantity} of '{item_name}' from cart. Remaining: {user_cart[item_name]}")
-
-    return True
-
-
-def clear_cart(user_cart: dict, inventory: dict):
-    """Clears all items from the cart and restores inventory quantities."""
-
-    if not user_cart:
-        print("Your cart is already empty.")
-
-        return
-
-    confirm: str = input("Are you sure you want to clear your entire cart? (Y/N): ").strip().upper()
-
-    if confirm == 'Y':
-
-        for item_name, qty in user_cart.items():
-
-            if item_name in inventory:
-                inventory[item_name]['quantity'] += qty
-
-        user_cart.clear() #👈to clear the user_cart
-
-        print("Your cart has been cleared 🤗.")
-
-    else:
-        print("Cart clear operation cancelled. ❌")
-
-
-def checkout(user_cart: dict, current_user: dict, inventory: dict) -> bool: #👈 return True / False
-    #Here we process the checkout, updates balance, and clears cart.
-
-    if not user_cart:
-        print("Your cart is empty. Nothing to checkout.🤳")
-
-        return False
-
-    display_cart(user_cart, inventory)
-
-    total_fee: float = 0.0
-
-    for item_name, qty in user_cart.items():
-
-        if item_name in inventory:
-            total_fee += inventory[item_name]['price'] * qty
-
-    print(f"\nTotal checkout price: NGN {total_fee:,.2f}")
-
-    confirm = input("Proceed to payment? (Y/N): ").strip().upper() #👈clear unnecessary space and all letters to CAPITALS.
-
-    if confirm != 'Y':
-        print("Checkout cancelled. Returning to Purchase menu.🤳")
-        return False
-
-    if current_user['balance'] < total_fee:
-
-        print(f"Insufficient funds!❌ Your current balance is NGN {current_user['balance']:,.2f}.")
-        print("Please fund your wallet before attempting to checkout.💰💰💰")
-
-        #revert inventory changes if checkout fails due to insufficient funds (optional, but good practice)
-
-        for item_name, qty in user_cart.items():
-
-            if item_name in inventory:
-                inventory[item_name]['quantity'] += qty  #👈Put items back to stock
-
-        user_cart.clear()  #👈Clear cart as items are effectively not purchased
-        return False
-
-    #payment process
-    current_user['balance'] -= total_fee
-
-    #Update accounts.txt (important for persistence)
-    accounts = _get_all_accounts()  #👈Use the function from auth.py
-
-    for i, acc in enumerate(accounts): #👈Go into the account list, one by one and me both.
-
-        if acc['username'] == current_user['username']: #chech if the both are the same
-            accounts[i] = current_user
-            break #👈stop the loop immediately and jump out!
-
-    _save_accounts(accounts)  #👈Use the function from auth.py
-
-    print("\n--- TRANSACTION SUCCESSFUL! 💰✅😁---")
-    print(f"Amount paid: NGN {total_fee:,.2f}")
-    print(f"Your new balance: NGN {current_user['balance']:,.2f}")
-    print("Thank you for your purchase!🫂🙏")
-
-    user_cart.clear()  #👈Empty cart after successful purchase
-
-    time.sleep(3)  #👈Pause for user to read the message
-    return True
+from reservations import Reservations  #👈cart holds run out after a while, so idle carts don't hide stock
 
 
 #Global variables for current user and inventory
 current_user: None = None
 inventory = {}  #👈This will store {item_name: {"price": float, "quantity": int}}
-user_cart = {}  #👈This will store {item_name: quantity_in_cart}
+user_cart = Cart()  #👈This will store {item_name: quantity_in_cart}, and keeps its total as items go in and out
 
 def main_menu():
     #This menu displays the main login/signup menu.
@@ -891,7 +113,23 @@ def run_section():
 
     global inventory
 
-    inventory = load_inventory_from_files()  # Load inventory once user logs in
+    inventory = load_inventory_from_files(parallel=(os.cpu_count() or 1) > 1)  # Load inventory once user logs in, one process per core
+
+    stock_ledger = get_storage().stock_ledger()  #👈keeps sales and restocks across restarts
+
+    stock_ledger.attach(inventory)  #👈put back the stock sold (or restocked) since the warehouse files were written
+
+    reservations = Reservations()
+
+    reservations.attach(inventory)  #👈stock held by the cart goes back after RESERVATION_TTL seconds without activity
+
+    user_cart.bind(inventory)  #👈the cart's running total uses this inventory's prices
+
+    stop_watcher = start_inventory_watcher(on_change=user_cart.reprice)  #👈pick up warehouse files dropped into data/ while we are logged in; new prices reach the cart
+
+    restore_cart(user_cart, inventory, get_cart_store().load(current_user['username']))  #👈bring back the cart from last time
+
+    save_cart()  #👈items that ran out while we were away are gone from the saved cart too
 
     while True:
 
@@ -945,6 +183,61 @@ def run_section():
 
         time.sleep(1)
 
+    release_cart(user_cart, inventory)  #👈give back the stock the cart was holding; the saved cart stays for next time
+
+    reservations.close()  #👈stop the thread that hands back expired holds
+
+    stop_watcher.set()  #👈stop watching the warehouse files once we log out
+
+    stock_ledger.close()  #👈write out any stock changes still waiting in the queue
+
+
+def save_cart():
+    #write the cart to disk after every change, so it is still there the next time this user signs in.
+
+    if current_user is not None:
+        get_cart_store().save(current_user['username'], user_cart)
+
+
+def handle_bulk_add():
+    """Adds a pasted list, or one read from a file, to the cart in one go."""
+
+    clear_screen()
+
+    print("\n--- Add Items from a List ---")
+
+    print("Enter a file path, or paste one 'name,qty' per line (or JSON) and finish with an empty line.")
+
+    first_line = input("> ").strip()
+
+    if os.path.isfile(first_line):
+
+        try:
+            with open(first_line, 'r', encoding='utf-8') as f:
+                text = f.read()
+
+        except OSError as e:
+            print(f"Error: Could not read '{first_line}': {e}")
+
+            input("Press Enter to continue...")
+
+            return
+
+    else:
+
+        lines = [first_line]
+
+        while lines[-1]:  #👈keep reading until the empty line
+            lines.append(input("> ").strip())
+
+        text = "\n".join(lines)
+
+    bulk_add_to_cart(user_cart, inventory, text)
+
+    save_cart()
+
+    input("Press Enter to continue...")
+
 
 def purchase_menu():
     """This menu handles product search, cart management, and checkout."""
@@ -956,7 +249,8 @@ def purchase_menu():
         print("1. Search Items")
         print("2. Manage Cart")
         print("3. Checkout")
-        print("4. Exit Purchase Menu")
+        print("4. Add Items from a List")  #👈for long shopping lists: "name,qty" lines or JSON
+        print("5. Exit Purchase Menu")
 
         option: str = input("Enter your any option: ").strip() #👈 means remove any space from the beginning of the word.
 
@@ -971,13 +265,21 @@ def purchase_menu():
         elif option == '3':
 
             # we check if checkout was successful and the cart is empty before breaking
-            if checkout(user_cart, current_user, inventory):
+            checked_out = checkout(user_cart, current_user, inventory)
+
+            save_cart()  #👈a checkout empties the cart, and so does running out of money
+
+            if checked_out:
 
                 # Break if checkout was successful (cart empty)
                 break
 
         elif option == '4':
 
+            handle_bulk_add()
+
+        elif option == '5':
+
             print("You're leaving the Purchase Menu.")
 
             time.sleep(1) #👈 means pause the program for 1 second.
@@ -1000,21 +302,13 @@ def handle_search_items():
 
         query: str = input("Enter item name or brand to search (e.g., 'Apple Watch'): ").strip()
 
-        matched_items_tuples: list[tuple[str, float]] = search_inventory(query, inventory)
+        result = shop_service.search(query, inventory)  #👈 in-stock matches as {"name", "price", "quantity"} dicts
 
-        #convert tuples to a list of dicts for easier manipulation
-        # and filter out items with 0 quantity
-
-        available_matched_items: list = [] #👈 this is the list that will contain all the items.
-
-        for name, price in matched_items_tuples: #👈 Go through the list one by one, give me the name / price.
-
-            if inventory[name]['quantity'] > 0:
-                available_matched_items.append({"name": name, "price": price, "quantity": inventory[name]['quantity']})
+        available_matched_items: list = result.items #👈 this is the list that will contain all the items.
 
         if not available_matched_items:
 
-            print(f"sorry {name} items matched your query or are currently out of stock.")
+            print(result.message)
 
         else:
             print("\n--- Matched Items ---")
@@ -1079,6 +373,8 @@ def handle_search_items():
 
                                     add_item_to_cart(user_cart, inventory, selected_item['name'], qty_to_add)
 
+                                    save_cart()
+
                                     break
 
                             except ValueError:
@@ -1143,7 +439,7 @@ def manage_cart_menu():
 
             print("\n--- Add More Items to Cart ---")
 
-            all_available_items = [name for name, details in inventory.items() if details['quantity'] > 0]
+            all_available_items = inventory.in_stock()  # reads the quantity array directly
 
             if not all_available_items:
                 print("No items currently available to add.")
@@ -1192,6 +488,8 @@ def manage_cart_menu():
 
                                     add_item_to_cart(user_cart, inventory, selected_item_name, qty_to_add)
 
+                                    save_cart()
+
                                     break  # Break from inner qty loop
 
                             except ValueError:
@@ -1268,6 +566,8 @@ def manage_cart_menu():
 
                                     remove_item_from_cart(user_cart, inventory, item_name, qty_to_remove)
 
+                                    save_cart()
+
                                     break  # Break from inner qty loop
 
                             except ValueError:
@@ -1292,6 +592,8 @@ def manage_cart_menu():
 
             clear_cart(user_cart, inventory)
 
+            save_cart()
+
             time.sleep(1)
 
         elif choice == '5':
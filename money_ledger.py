@@ -0,0 +1,386 @@
+"""This module keeps a history of every naira that moves in or out of a wallet. Amounts are whole kobo
+(integers), so adding up thousands of payments never drifts the way float balances do.
+
+Each credit or debit is appended to data/money.ledger as one JSON line that also carries the user's
+balance after it. The ledger keeps every user's running balance in memory, so balance() is a dictionary
+lookup, and every so often it writes a checkpoint (the balances plus how far into the ledger they go),
+so startup only replays the entries after the last checkpoint. Like the order log, every entry carries
+the byte offset of the same user's previous entry ("prev") and the ledger remembers each user's latest
+one, so history() reads only the entries it returns. reconcile() checks the whole history in one
+streaming pass, reading a line at a time, however long the ledger has grown."""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from decimal import Decimal, ROUND_HALF_UP
+
+from auth import credential_key
+from commit_coordinator import GroupCommitter
+from file_lock import FileLock
+from jsonl_file import append_durably, read_entries, write_atomically
+
+DATA_DIR = "data"
+
+MONEY_LEDGER_FILE = os.path.join(DATA_DIR, "money.ledger")
+
+MONEY_CHECKPOINT_FILE = os.path.join(DATA_DIR, "money.checkpoint")
+
+CHECKPOINT_EVERY = 1000  # entries between two checkpoints
+
+KOBO_PER_NAIRA = 100
+
+
+def to_kobo(amount) -> int:
+    """Converts a naira amount (float, str, int or Decimal) to whole kobo, rounding half a kobo up."""
+
+    return int((Decimal(str(amount)) * KOBO_PER_NAIRA).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_naira(kobo: int) -> float:
+    """The float balance accounts.txt stores. Exact to the kobo, since it is only ever made from kobo."""
+
+    return kobo / KOBO_PER_NAIRA
+
+
+class MoneyLedger:
+    """
+    The append-only wallet history, with a running balance per user (keyed by auth.credential_key).
+
+    Entries look like {"seq", "user", "kind", "amount", "balance", "time", "note", "prev"}; kind is one
+    of "opening" (the balance a user had before the ledger first saw them), "credit", "debit", "rename"
+    (the balance and history move to "new_username") or "close" (the account was deleted). prev is the
+    offset of the user's previous entry, None for their first; a rename links the new name's chain to
+    the old one's, and a close ends the chain, so a new account with that name starts a new one.
+    Several copies of the app can append to it: each entry is written under an exclusive file lock,
+    after reading whatever the other copies appended.
+    """
+
+    def __init__(self, path: str = MONEY_LEDGER_FILE, checkpoint_file: str = MONEY_CHECKPOINT_FILE,
+                 checkpoint_every: int = CHECKPOINT_EVERY):
+        self.path = path
+
+        self.checkpoint_file = checkpoint_file
+
+        self.checkpoint_every = checkpoint_every
+
+        self._balances: dict[str, int] = {}  # user key -> kobo
+
+        self._latest: dict[str, int] = {}  # user key -> offset of their latest entry
+
+        self._seq = 0
+
+        self._offset = 0  # how far into the ledger _balances goes
+
+        self._since_checkpoint = 0
+
+        self._lock = threading.RLock()
+
+        self._file_lock = FileLock(os.path.splitext(path)[0] + ".lock")
+
+        self._committer = GroupCommitter(self._write_lines, name="money-ledger-writer")
+
+        with self._file_lock.shared(), self._lock:
+            self._load_checkpoint()
+
+            self._catch_up()
+
+    def _load_checkpoint(self) -> None:
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                checkpoint = json.load(f)
+
+        except FileNotFoundError:
+            return
+
+        if "latest" not in checkpoint:
+            return  # written before entries were linked: replaying the ledger once finds everyone's latest entry
+
+        self._seq, self._offset = checkpoint["seq"], checkpoint["offset"]
+
+        self._balances, self._latest = checkpoint["balances"], checkpoint["latest"]
+
+    def _catch_up(self) -> None:
+        """Applies the entries after self._offset (written by other processes, or since the checkpoint)."""
+
+        for offset, self._offset, entry in read_entries(self.path, self._offset):
+            if entry is not None and entry["seq"] > self._seq:
+                self._apply(entry, offset)
+
+    def _apply(self, entry: dict, offset: int) -> None:
+        key = credential_key(entry["user"])
+
+        if entry["kind"] == "rename":
+            new_key = credential_key(entry["new_username"])
+
+            self._balances[new_key] = self._balances.pop(key, 0)
+
+            self._latest.pop(key, None)
+
+            self._latest[new_key] = offset
+
+        elif entry["kind"] == "close":
+            self._balances.pop(key, None)
+
+            self._latest.pop(key, None)
+
+        else:
+            self._balances[key] = entry["balance"]
+
+            self._latest[key] = offset
+
+        self._seq = entry["seq"]
+
+        self._since_checkpoint += 1
+
+    def _write_lines(self, items: list[tuple[int, str]]) -> None:
+        # the batch goes where its first line was counted; a half-written line left there by a crash is cut off
+        append_durably(self.path, "".join(line for _, line in items), expected_size=items[0][0])
+
+    # --- reading, O(1) ---
+
+    def balance(self, username: str) -> int:
+        """The user's balance in kobo as of the last entry, 0 for a user the ledger hasn't seen."""
+
+        with self._lock:
+            return self._balances.get(credential_key(username), 0)
+
+    def knows(self, username: str) -> bool:
+        with self._lock:
+            return credential_key(username) in self._balances
+
+    # --- writing ---
+
+    def credit(self, username: str, amount: int, balance_after: int, note: str = "") -> dict:
+        """
+        Records money added to a wallet. balance_after is the wallet's balance once it is in; the first
+        time the ledger sees a user it uses it to write their opening balance.
+        """
+
+        return self._record(username, "credit", amount, balance_after - amount, note)
+
+    def debit(self, username: str, amount: int, balance_after: int, note: str = "") -> dict:
+        """Records money taken from a wallet. Same arguments as credit()."""
+
+        return self._record(username, "debit", amount, balance_after + amount, note)
+
+    def rename(self, old_username: str, new_username: str) -> None:
+        """Moves a user's balance and history over to their new username."""
+
+        self._write({"user": old_username, "kind": "rename", "new_username": new_username})
+
+    def close(self, username: str) -> None:
+        """Records that the account was deleted, so a new account with the same name starts from nothing."""
+
+        self._write({"user": username, "kind": "close"})
+
+    def _write(self, entry: dict) -> None:
+        with self._file_lock.exclusive():
+            with self._lock:
+                self._catch_up()
+
+                ticket = self._append(entry)
+
+            ticket.wait()
+
+    def _record(self, username: str, kind: str, amount: int, opening_balance: int, note: str) -> dict:
+        with self._file_lock.exclusive():
+            with self._lock:
+                self._catch_up()
+
+                key = credential_key(username)
+
+                if key not in self._balances:
+                    self._append({"user": username, "kind": "opening", "amount": opening_balance,
+                                  "balance": opening_balance, "note": "balance before the ledger"})
+
+                change = amount if kind == "credit" else -amount
+
+                entry = {"user": username, "kind": kind, "amount": amount,
+                         "balance": self._balances[key] + change, "note": note}
+
+                ticket = self._append(entry)
+
+            ticket.wait()  # on disk before we return, but written together with other threads' entries
+
+        if self._since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+        return entry
+
+    def _append(self, entry: dict):
+        entry["seq"] = self._seq + 1
+
+        entry["time"] = round(time.time(), 3)
+
+        entry["prev"] = self._latest.get(credential_key(entry["user"]))
+
+        line = json.dumps(entry) + "\n"
+
+        offset = self._offset
+
+        self._apply(entry, offset)
+
+        self._offset += len(line.encode())
+
+        return self._committer.submit((offset, line))
+
+    def checkpoint(self) -> None:
+        """Writes the running balances and how far they go, so the next startup can skip to there."""
+
+        with self._file_lock.exclusive(), self._lock:
+            self._committer.flush()  # the offset we store has to be on disk already
+
+            self._catch_up()
+
+            write_atomically(self.checkpoint_file, json.dumps(
+                {"seq": self._seq, "offset": self._offset, "balances": self._balances, "latest": self._latest}))
+
+            self._since_checkpoint = 0
+
+    # --- history ---
+
+    def history(self, username: str, limit: int | None = None) -> list[dict]:
+        """
+        The user's entries, oldest first (only the last `limit` of them if given), including those made
+        under earlier usernames. Follows the chain back from the latest entry, so it reads `limit` lines
+        however long the ledger is. Entries written before entries were linked end the chain.
+        """
+
+        self._committer.flush()
+
+        with self._file_lock.shared(), self._lock:
+            self._catch_up()
+
+            offset = self._latest.get(credential_key(username))
+
+        entries = []
+
+        with open(self.path, 'rb') if offset is not None else nullcontext() as f:
+            while offset is not None and (limit is None or len(entries) < limit):
+                f.seek(offset)
+
+                entry = json.loads(f.readline())
+
+                entries.append(entry)
+
+                offset = entry.get("prev")
+
+        return entries[::-1]
+
+    def flush(self) -> None:
+        """Waits until every entry appended so far is on disk."""
+
+        self._committer.flush()
+
+
+def iter_entries(path: str = MONEY_LEDGER_FILE):
+    """Yields the ledger's entries one at a time, oldest first, without reading the file into memory."""
+
+    for _, _, entry in read_entries(path):
+        if entry is not None:
+            yield entry
+
+
+def reconcile(path: str = MONEY_LEDGER_FILE, checkpoint_file: str = MONEY_CHECKPOINT_FILE,
+              accounts: list[dict] | None = None) -> dict:
+    """
+    Checks the ledger in one streaming pass, holding only one running balance per user:
+    every seq follows the one before it, every entry's balance equals the previous balance plus or
+    minus its amount, no balance goes below zero, the checkpoint matches the entries it covers, and
+    (if accounts are given) each account's balance matches the ledger. Returns a report with the
+    number of entries and users, the total money held, and a list of problems found.
+    """
+
+    balances: dict[str, int] = {}
+
+    problems = []
+
+    entries = 0
+
+    expected_seq = 1
+
+    try:
+        with open(checkpoint_file, 'r') as f:
+            checkpoint = json.load(f)
+
+    except FileNotFoundError:
+        checkpoint = None
+
+    for entry in iter_entries(path):
+        entries += 1
+
+        seq, key = entry["seq"], credential_key(entry["user"])
+
+        if seq != expected_seq:
+            problems.append(f"seq {seq}: expected seq {expected_seq}")
+
+        expected_seq = seq + 1
+
+        if entry["kind"] == "rename":
+            balances[credential_key(entry["new_username"])] = balances.pop(key, 0)
+
+        elif entry["kind"] == "close":
+            balances.pop(key, None)
+
+        else:
+            before = balances.get(key, 0)
+
+            expected = {"opening": entry["amount"], "credit": before + entry["amount"],
+                        "debit": before - entry["amount"]}[entry["kind"]]
+
+            if entry["balance"] != expected:
+                problems.append(f"seq {seq}: {entry['user']} has balance {entry['balance']}, expected {expected}")
+
+            if entry["balance"] < 0:
+                problems.append(f"seq {seq}: {entry['user']} went below zero")
+
+            balances[key] = entry["balance"]
+
+        if checkpoint is not None and seq == checkpoint["seq"] and balances != checkpoint["balances"]:
+            problems.append(f"checkpoint at seq {seq} doesn't match the entries before it")
+
+    for account in accounts or []:
+        key = credential_key(account['username'])
+
+        if key in balances and balances[key] != to_kobo(account['balance']):
+            problems.append(f"{account['username']}: wallet holds {to_kobo(account['balance'])} kobo, "
+                            f"ledger says {balances[key]}")
+
+    return {"entries": entries, "users": len(balances), "total": sum(balances.values()), "problems": problems}
+
+
+_ledger = None
+
+
+def get_money_ledger() -> MoneyLedger:
+    """Returns the app's money ledger, creating it the first time."""
+
+    global _ledger
+
+    if _ledger is None:
+        _ledger = MoneyLedger()
+
+    return _ledger
+
+
+if __name__ == "__main__":
+    # python money_ledger.py [ledger file]: checks the ledger against accounts.txt and its journal
+    from account_store import AccountRepository
+
+    ledger_file = sys.argv[1] if len(sys.argv) > 1 else MONEY_LEDGER_FILE
+
+    start = time.perf_counter()
+
+    report = reconcile(ledger_file, accounts=AccountRepository().all())
+
+    print(f"{report['entries']:,} entries for {report['users']:,} users checked in {time.perf_counter() - start:.2f} s")
+
+    print(f"Money held in wallets: NGN {to_naira(report['total']):,.2f}")
+
+    for problem in report["problems"]:
+        print("  " + problem)
+
+    print("Ledger is consistent." if not report["problems"] else f"{len(report['problems'])} problem(s) found.")
@@ -0,0 +1,224 @@
+"""This module keeps a record of every order placed at checkout, for support, refunds and sales figures.
+
+Orders are appended to data/orders.log, one JSON line each, and never changed afterwards. Every order
+also carries the byte offset of the same user's previous order ("prev"), so a user's orders form a chain
+through the log, newest first. A small index (a dbm file, like the saved carts) maps each case-folded
+username to the offset of their latest order, so fetching someone's last N orders reads N lines from the
+log, however many millions of orders it holds. The index can always be rebuilt from the log:
+
+    python order_log.py rebuild"""
+
+import dbm
+import json
+import os
+import sys
+import time
+
+from auth import credential_key
+from file_lock import FileLock
+from jsonl_file import append_durably, read_entries
+from money_ledger import to_naira
+
+ORDER_LOG_FILE = os.path.join("data", "orders.log")
+
+ORDER_INDEX_FILE = os.path.join("data", "orders.index")
+
+_END_KEY = b"\0end"  # how far into the log the index goes; no username starts with a NUL
+
+_COUNT_KEY = b"\0count"  # orders in the log, which also numbers the next one
+
+
+class OrderLog:
+    """
+    The append-only order history with its per-user index.
+
+    Orders look like {"order", "user", "time", "lines", "total", "prev"}, where lines are
+    {"name", "quantity", "price"} with prices and the total in kobo. Several copies of the app can
+    record orders: each one is written under an exclusive file lock, after indexing whatever the
+    other copies (or a crash between writing an order and indexing it) left unindexed.
+    """
+
+    def __init__(self, path: str = ORDER_LOG_FILE, index_path: str = ORDER_INDEX_FILE):
+        self.path = path
+
+        self.index_path = index_path
+
+        self._file_lock = FileLock(os.path.splitext(path)[0] + ".lock")
+
+    def _catch_up(self, index) -> None:
+        """Indexes the orders after the index's end offset. Nothing to do unless another copy or a crash got there first."""
+
+        end = int(index.get(_END_KEY, b"0"))
+
+        count = int(index.get(_COUNT_KEY, b"0"))
+
+        latest: dict[str, int] = {}  # only each user's last order reaches the index, written once
+
+        # a line cut short by a crash ends the pass; the next order is written over it
+        for offset, end, order in read_entries(self.path, end):
+            if order is None:
+                continue  # damaged: stepped over, and not counted
+
+            latest[credential_key(order["user"])] = offset
+
+            count += 1
+
+        for key, offset in latest.items():
+            index[key.encode()] = str(offset).encode()
+
+        index[_END_KEY], index[_COUNT_KEY] = str(end).encode(), str(count).encode()
+
+    def record(self, username: str, lines: list[tuple[str, int, int]], total: int) -> dict:
+        """Appends an order. lines are (item name, quantity, unit price in kobo); total is in kobo."""
+
+        key = credential_key(username).encode()
+
+        with self._file_lock.exclusive(), dbm.open(self.index_path, 'c') as index:
+            self._catch_up(index)
+
+            offset = int(index[_END_KEY])
+
+            previous = index.get(key)
+
+            order = {"order": int(index[_COUNT_KEY]) + 1, "user": username, "time": round(time.time(), 3),
+                     "lines": [{"name": name, "quantity": quantity, "price": price} for name, quantity, price in lines],
+                     "total": total, "prev": int(previous) if previous is not None else None}
+
+            data = (json.dumps(order) + "\n").encode()
+
+            append_durably(self.path, data, expected_size=offset)  # drops a half-written line left by a crash
+
+            index[key] = str(offset).encode()
+
+            index[_END_KEY], index[_COUNT_KEY] = str(offset + len(data)).encode(), str(order["order"]).encode()
+
+        return order
+
+    def recent(self, username: str, limit: int = 10) -> list[dict]:
+        """The user's last `limit` orders, newest first, following the chain back from the index."""
+
+        orders = []
+
+        with self._file_lock.shared():
+            try:
+                with dbm.open(self.index_path, 'r') as index:
+                    offset = index.get(credential_key(username).encode())
+
+            except dbm.error:  # no order has been placed yet
+                return orders
+
+            if offset is None:
+                return orders
+
+            offset = int(offset)
+
+            with open(self.path, 'rb') as f:
+                while offset is not None and len(orders) < limit:
+                    f.seek(offset)
+
+                    order = json.loads(f.readline())
+
+                    orders.append(order)
+
+                    offset = order["prev"]
+
+            return orders
+
+    def rename(self, old_username: str, new_username: str) -> None:
+        """Moves a user's orders over to their new username (the orders keep the name they were placed under)."""
+
+        old_key, new_key = credential_key(old_username).encode(), credential_key(new_username).encode()
+
+        if old_key == new_key:
+            return
+
+        with self._file_lock.exclusive(), dbm.open(self.index_path, 'c') as index:
+            self._catch_up(index)
+
+            if old_key in index:
+                index[new_key] = index[old_key]
+
+                del index[old_key]
+
+    def forget(self, username: str) -> None:
+        """Unlinks a deleted account's orders from its name, so a new account with that name starts with none.
+        The orders stay in the log for the sales figures."""
+
+        key = credential_key(username).encode()
+
+        with self._file_lock.exclusive(), dbm.open(self.index_path, 'c') as index:
+            self._catch_up(index)
+
+            if key in index:
+                del index[key]
+
+    def rebuild_index(self) -> int:
+        """
+        Builds the index again from the log in one streaming pass and returns the number of orders.
+        Renames and deletions aren't in the log, so orders are indexed under the name they were placed
+        under; run it only if the index file was lost.
+        """
+
+        with self._file_lock.exclusive():
+            for suffix in ("", ".dat", ".dir", ".bak", ".db"):
+                try:
+                    os.remove(self.index_path + suffix)
+
+                except FileNotFoundError:
+                    pass
+
+            with dbm.open(self.index_path, 'c') as index:
+                self._catch_up(index)
+
+                return int(index[_COUNT_KEY])
+
+
+def iter_orders(path: str = ORDER_LOG_FILE):
+    """Yields every order, oldest first, one line at a time (for reports that need all of them)."""
+
+    for _, _, order in read_entries(path):
+        if order is not None:
+            yield order
+
+
+_order_log = None
+
+
+def get_order_log() -> OrderLog:
+    """Returns the app's order log, creating it the first time."""
+
+    global _order_log
+
+    if _order_log is None:
+        _order_log = OrderLog()
+
+    return _order_log
+
+
+if __name__ == "__main__":
+    # python order_log.py rebuild: builds data/orders.index again from data/orders.log
+    # python order_log.py <username> [N]: shows the user's last N orders
+    if len(sys.argv) < 2:
+        print(__doc__)
+
+        sys.exit(1)
+
+    if sys.argv[1] == "rebuild":
+        start = time.perf_counter()
+
+        count = get_order_log().rebuild_index()
+
+        print(f"Indexed {count:,} orders in {time.perf_counter() - start:.2f} s")
+
+        sys.exit(0)
+
+    start = time.perf_counter()
+
+    orders = get_order_log().recent(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 10)
+
+    for order in orders:
+        placed = time.strftime("%Y-%m-%d %H:%M", time.localtime(order["time"]))
+
+        print(f"Order #{order['order']}  {placed}  NGN {to_naira(order['total']):,.2f}  ({len(order['lines'])} line(s))")
+
+    print(f"{len(orders)} order(s) read in {(time.perf_counter() - start) * 1000:.1f} ms")
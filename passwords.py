@@ -0,0 +1,214 @@
+"""This module hashes and checks passwords. New hashes are salted and stretched with PBKDF2 or scrypt
+(both from hashlib) and say how they were made, so the cost can be raised later without breaking old
+accounts. Two older formats are still accepted so nobody is locked out: the plain SHA-256 hex digest the
+app used to store, and the 'salt:hash' base64 pairs found in accounts.log.txt.
+
+Hashes look like this (none of them contain a comma, so they fit in accounts.txt):
+
+    pbkdf2_sha256$<iterations>$<salt>$<hash>
+    scrypt$<n>$<r>$<p>$<salt>$<hash>
+
+Pick the scheme and its cost with SHOP_PASSWORD_SCHEME ("pbkdf2_sha256" or "scrypt"),
+SHOP_PBKDF2_ITERATIONS and SHOP_SCRYPT_N. Run this file to find a cost that fits your machine."""
+
+import base64
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import string
+import sys
+import time
+
+PASSWORD_SCHEME = os.environ.get("SHOP_PASSWORD_SCHEME", "pbkdf2_sha256")
+
+PBKDF2_ITERATIONS = int(os.environ.get("SHOP_PBKDF2_ITERATIONS", 600_000))
+
+SCRYPT_N = int(os.environ.get("SHOP_SCRYPT_N", 2 ** 14))  # must be a power of two
+
+SCRYPT_R = 8
+
+SCRYPT_P = 1
+
+SALT_BYTES = 16
+
+MIN_PASSWORD_LENGTH = 16
+
+LEGACY_SALTED_ITERATIONS = 100_000  # what the 'salt:hash' entries were made with (PBKDF2-HMAC-SHA256)
+
+TARGET_SECONDS = 0.25  # how long one check should take, for calibrate()
+
+_SHA256_HEX = re.compile(r"[0-9a-f]{64}")
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=32,
+                          maxmem=128 * r * (n + p + 2) + 1024 * 1024)  # the default 32 MB is too little past n=2**14
+
+
+def hash_password(password: str, scheme: str = PASSWORD_SCHEME) -> str:
+    """Returns a new salted hash of the password in the configured scheme and cost."""
+
+    salt = os.urandom(SALT_BYTES)
+
+    if scheme == "pbkdf2_sha256":
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, PBKDF2_ITERATIONS)
+
+        return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64(salt)}${_b64(digest)}"
+
+    if scheme == "scrypt":
+        digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+    raise ValueError(f"Unknown password scheme '{scheme}'. Use 'pbkdf2_sha256' or 'scrypt'.")
+
+
+def verify_password(password: str, stored_hash: str) -> bool:
+    """
+    Checks a password against a hash in any format we know. Unknown or damaged hashes never match.
+    Runs in the caller's thread; the shop service calls it on its bounded password pool, so only a few
+    slow checks run at once however many sessions sign in.
+    """
+
+    try:
+        if stored_hash.startswith("pbkdf2_sha256$"):
+            _, iterations, salt, expected = stored_hash.split("$")
+
+            digest = hashlib.pbkdf2_hmac("sha256", password.encode(), base64.b64decode(salt), int(iterations))
+
+        elif stored_hash.startswith("scrypt$"):
+            _, n, r, p, salt, expected = stored_hash.split("$")
+
+            digest = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+
+        elif ":" in stored_hash:
+            salt, expected = stored_hash.split(":")
+
+            digest = hashlib.pbkdf2_hmac("sha256", password.encode(), base64.b64decode(salt), LEGACY_SALTED_ITERATIONS)
+
+        elif _SHA256_HEX.fullmatch(stored_hash):
+            return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored_hash)
+
+        else:
+            return False
+
+        return hmac.compare_digest(digest, base64.b64decode(expected))
+
+    except ValueError:  # bad base64, a missing field, a number that isn't one
+        return False
+
+
+def check_password_strength(password: str) -> bool:
+    """True if the password is long enough and has a lower and an upper case letter, a digit and a symbol."""
+
+    return (len(password) >= MIN_PASSWORD_LENGTH and any(c.islower() for c in password)
+            and any(c.isupper() for c in password) and any(c.isdigit() for c in password)
+            and any(c in string.punctuation for c in password))
+
+
+def generate_strong_password() -> str:
+    """A random password that passes check_password_strength()."""
+
+    alphabet = string.ascii_letters + string.digits + string.punctuation
+
+    while True:
+        password = ''.join(secrets.choice(alphabet) for _ in range(MIN_PASSWORD_LENGTH))
+
+        if check_password_strength(password):
+            return password
+
+
+def needs_rehash(stored_hash: str) -> bool:
+    """True if the hash is in an old format or cheaper than the current settings, so it should be replaced at login."""
+
+    if stored_hash.startswith("pbkdf2_sha256$"):
+        return PASSWORD_SCHEME != "pbkdf2_sha256" or int(stored_hash.split("$")[1]) < PBKDF2_ITERATIONS
+
+    if stored_hash.startswith("scrypt$"):
+        _, n, r, p, _, _ = stored_hash.split("$")
+
+        return PASSWORD_SCHEME != "scrypt" or (int(n), int(r), int(p)) < (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+    return True
+
+
+def _time_check(scheme: str, cost: int) -> float:
+    salt = os.urandom(SALT_BYTES)
+
+    start = time.perf_counter()
+
+    if scheme == "pbkdf2_sha256":
+        hashlib.pbkdf2_hmac("sha256", b"benchmark password", salt, cost)
+
+    else:
+        _scrypt("benchmark password", salt, cost, SCRYPT_R, SCRYPT_P)
+
+    return time.perf_counter() - start
+
+
+def calibrate(target_seconds: float = TARGET_SECONDS, scheme: str = PASSWORD_SCHEME) -> int:
+    """
+    Returns the cost (PBKDF2 iterations, or scrypt's n) whose check takes about target_seconds here.
+    PBKDF2's time grows in a straight line with the iterations, so one timing is enough to scale from;
+    scrypt's n has to be a power of two, so it is doubled until a check takes long enough.
+    """
+
+    if scheme == "pbkdf2_sha256":
+        sample = 100_000
+
+        elapsed = min(_time_check(scheme, sample) for _ in range(3))
+
+        return max(sample, int(round(sample * target_seconds / elapsed, -4)))
+
+    if scheme == "scrypt":
+        n = 2 ** 10
+
+        while _time_check(scheme, n) < target_seconds and n < 2 ** 22:
+            n *= 2
+
+        return n
+
+    raise ValueError(f"Unknown password scheme '{scheme}'. Use 'pbkdf2_sha256' or 'scrypt'.")
+
+
+if __name__ == "__main__":
+    # python passwords.py [target seconds per check]
+    target = float(sys.argv[1]) if len(sys.argv) > 1 else TARGET_SECONDS
+
+    print(f"Timing one password check, aiming for {target * 1000:.0f} ms\n")
+
+    for scheme, costs in (("pbkdf2_sha256", (100_000, 300_000, 600_000, 1_200_000)),
+                          ("scrypt", (2 ** 13, 2 ** 14, 2 ** 15, 2 ** 16))):
+        for cost in costs:
+            print(f"  {scheme:<14} cost {cost:>9,}: {_time_check(scheme, cost) * 1000:7.1f} ms")
+
+        print()
+
+    iterations = calibrate(target, "pbkdf2_sha256")
+
+    n = calibrate(target, "scrypt")
+
+    print("Suggested settings:")
+
+    print(f"  SHOP_PASSWORD_SCHEME=pbkdf2_sha256 SHOP_PBKDF2_ITERATIONS={iterations}")
+
+    print(f"  SHOP_PASSWORD_SCHEME=scrypt SHOP_SCRYPT_N={n}")
+
+    # checks from several threads at once should take about as long as one per core, since the KDFs release the GIL
+    from concurrent.futures import ThreadPoolExecutor
+
+    stored = hash_password("benchmark password")
+
+    for concurrent in (1, os.cpu_count() or 1):
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=concurrent) as sessions:
+            assert all(sessions.map(lambda _: verify_password("benchmark password", stored), range(concurrent)))
+
+        print(f"\n{concurrent} check(s) in {concurrent} thread(s) at once: {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,314 @@
+"""This module puts a time limit on the stock a cart holds. Adding an item to the cart still takes it out of
+the warehouses straight away, but the hold now lasts RESERVATION_TTL seconds after the cart was last
+changed. A reaper thread gives expired holds back in batches, so a cart left open in an idle session no
+longer makes a popular item look sold out. The cart keeps the items; checkout takes the stock again if it
+is still there, or says which items ran out."""
+
+import heapq
+import threading
+import time
+
+from inventory_store import InsufficientStockError
+
+RESERVATION_TTL = 15 * 60  # seconds a cart holds its stock without any activity
+
+REAP_INTERVAL = 5.0  # seconds between two runs of the reaper
+
+
+class Reservations:
+    """
+    Timed holds on an InventoryStore's stock, per cart and item.
+
+    Holds belong to a cart and are filed under its hold_key (see shopping_cart.Cart), a random token rather than
+    id(cart), which Python hands to a new cart once the old one is freed. Every change to a cart pushes its
+    expiry back by the TTL, and all of a cart's holds expire together, so a cart has one expiry time
+    however many lines it has. Expiry times sit in a min-heap of (expires_at, cart key); a refresh pushes
+    a new entry and leaves the old one, which is skipped when it comes off the heap (or dropped when the
+    heap is rebuilt because stale entries pile up).
+    """
+
+    def __init__(self, ttl: float = RESERVATION_TTL, reap_interval: float = REAP_INTERVAL, clock=time.monotonic):
+        self.ttl = ttl
+
+        self.reap_interval = reap_interval
+
+        self.inventory = None
+
+        self._clock = clock
+
+        self._holds: dict[tuple[str, str], int] = {}  # (cart key, name) -> quantity held
+
+        self._cart_items: dict[str, set[str]] = {}  # cart key -> names it holds
+
+        self._expiry: dict[str, float] = {}  # cart key -> when its holds expire
+
+        self._heap: list[tuple[float, str]] = []
+
+        self._lock = threading.RLock()
+
+        self._stop = threading.Event()
+
+        self._thread: threading.Thread | None = None
+
+    def attach(self, inventory, reaper: bool = True) -> None:
+        """Becomes the inventory's reservations (inventory.reservations) and starts the reaper thread."""
+
+        self.inventory = inventory
+
+        inventory.reservations = self
+
+        if reaper:
+            self.start()
+
+    # --- holds ---
+
+    def hold(self, cart: dict, name: str, quantity: int) -> list[tuple[int, int]]:
+        """
+        Takes stock for the cart (see InventoryStore.allocate) and renews the cart's other holds.
+        Returns the (warehouse, quantity) pairs taken. Raises ValueError if there isn't enough stock.
+        The stock is taken under the item's own lock only, so carts adding different items don't queue here.
+        """
+
+        self.reap_if_due()
+
+        allocations = self.inventory.allocate(name, quantity)
+
+        with self._lock:
+            self._add_hold(cart, name, quantity)
+
+            self._refresh(cart)
+
+        return allocations
+
+    def hold_each(self, cart: dict, quantities: dict[str, int]) -> dict[str, list[tuple[int, int]] | None]:
+        """
+        hold() for many items in one pass, renewing the cart's holds once at the end instead of per item.
+        Each item is taken on its own: maps it to its (warehouse, quantity) pairs, or None if it couldn't
+        be taken (short, gone from the inventory, or a quantity below 1). Never raises for one item, so
+        the holds already taken for the others are always recorded.
+        """
+
+        self.reap_if_due()
+
+        results = {}
+
+        for name, quantity in quantities.items():
+            try:
+                results[name] = self.inventory.allocate(name, quantity)
+
+            except (KeyError, ValueError):  # ValueError covers InsufficientStockError; KeyError, removed by a reload
+                results[name] = None
+
+        with self._lock:
+            for name, allocations in results.items():
+                if allocations is not None:
+                    self._add_hold(cart, name, quantities[name])
+
+            self._refresh(cart)
+
+        return results
+
+    def held(self, cart: dict, name: str) -> int:
+        with self._lock:
+            return self._holds.get((cart.hold_key, name), 0)
+
+    def release(self, cart: dict, name: str, quantity: int) -> int:
+        """Gives back up to `quantity` of what the cart holds of an item. Returns how many were given back."""
+
+        if quantity < 1:
+            raise ValueError(f"Quantity must be at least 1, not {quantity}")
+
+        with self._lock:
+            held = self._holds.get((cart.hold_key, name), 0)
+
+            returned = min(quantity, held)
+
+            if returned:
+                self._set_held(cart, name, held - returned)
+
+                self._refresh(cart)
+
+        if returned and name in self.inventory:  # a hot reload may have taken the item out of the catalogue
+            self.inventory.release(name, returned)
+
+        return returned
+
+    def release_all(self, cart: dict) -> None:
+        """Gives back everything the cart holds, e.g. when it is cleared or its user logs out."""
+
+        with self._lock:
+            for name in list(self._cart_items.get(cart.hold_key, ())):
+                self.release(cart, name, self.held(cart, name))
+
+    def _add_hold(self, cart: dict, name: str, quantity: int) -> None:
+        self._holds[(cart.hold_key, name)] = self._holds.get((cart.hold_key, name), 0) + quantity
+
+        self._cart_items.setdefault(cart.hold_key, set()).add(name)
+
+    def _set_held(self, cart: dict, name: str, quantity: int) -> None:
+        key = (cart.hold_key, name)
+
+        if quantity:
+            self._holds[key] = quantity
+
+            return
+
+        self._holds.pop(key, None)
+
+        names = self._cart_items.get(cart.hold_key)
+
+        if names is not None:
+            names.discard(name)
+
+            if not names:
+                del self._cart_items[cart.hold_key]
+
+                self._expiry.pop(cart.hold_key, None)
+
+    def _take_holds(self, cart: dict) -> dict[str, int]:
+        """Drops all of the cart's holds from the books and returns them as {name: quantity}."""
+
+        key = cart.hold_key
+
+        self._expiry.pop(key, None)
+
+        return {name: self._holds.pop((key, name)) for name in self._cart_items.pop(key, ())}
+
+    def _refresh(self, cart: dict) -> None:
+        """Starts the TTL again for the cart's holds. O(log carts), however many lines the cart has."""
+
+        if cart.hold_key not in self._cart_items:
+            return
+
+        expires_at = self._expiry[cart.hold_key] = self._clock() + self.ttl
+
+        heapq.heappush(self._heap, (expires_at, cart.hold_key))
+
+        if len(self._heap) > 2 * len(self._expiry) + 64:  # mostly superseded entries: keep only the live ones
+            self._heap = [(expires_at, key) for key, expires_at in self._expiry.items()]
+
+            heapq.heapify(self._heap)
+
+    # --- checkout ---
+
+    def confirm(self, cart: dict, pay) -> list[str]:
+        """
+        Checks out the whole cart as one step. Takes stock again for holds that expired, calls pay(), then
+        marks every item as sold (InventoryStore.commit). If some item no longer has enough stock, nothing
+        happens and the names of those items are returned. If pay() raises, nothing is sold and the cart
+        keeps its holds. The cart's holds come off the books before pay() runs, so the reaper can't expire
+        them halfway through, and pay() (which may wait for the disk) runs without the lock other carts need.
+        """
+
+        with self._lock:
+            self._reap_due()
+
+            # items a hot reload took out of the catalogue aren't charged for (see checkout) and are skipped here too
+            missing = {name: qty - self.held(cart, name) for name, qty in cart.items()
+                       if qty > self.held(cart, name) and name in self.inventory}
+
+            try:
+                self.inventory.reserve_many(missing)  # all of them or none
+
+            except InsufficientStockError as e:
+                return e.short
+
+            for name, qty in missing.items():
+                self._add_hold(cart, name, qty)
+
+            holds = self._take_holds(cart)
+
+        try:
+            pay()
+
+        except BaseException:
+            with self._lock:
+                for name, quantity in holds.items():
+                    self._add_hold(cart, name, quantity)
+
+                self._refresh(cart)
+
+            raise
+
+        for name, held in holds.items():
+            if name not in self.inventory:
+                continue
+
+            sold = min(cart.get(name, 0), held)
+
+            if sold:
+                self.inventory.commit(name, sold)
+
+            if held > sold:  # held beyond what the cart lists, e.g. a line lowered without its hold: give it back
+                self.inventory.release(name, held - sold)
+
+        return []
+
+    # --- expiry ---
+
+    def reap(self) -> int:
+        """Gives back every hold that has expired, added up per item so each item is released once. Returns the units freed."""
+
+        with self._lock:
+            return self._reap_due()
+
+    def reap_if_due(self) -> int:
+        """reap(), but only takes the lock when the earliest expiry has passed, so the common case costs one comparison."""
+
+        if self._heap and self._heap[0][0] <= self._clock():
+            return self.reap()
+
+        return 0
+
+    def _reap_due(self) -> int:
+        now = self._clock()
+
+        expired: dict[str, int] = {}
+
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._heap)
+
+            if self._expiry.get(key) != expires_at:
+                continue  # emptied, or renewed since this entry was pushed
+
+            del self._expiry[key]
+
+            for name in self._cart_items.pop(key):
+                expired[name] = expired.get(name, 0) + self._holds.pop((key, name))
+
+        for name, quantity in expired.items():
+            if name in self.inventory:
+                self.inventory.release(name, quantity)
+
+        return sum(expired.values())
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+
+            self._thread = threading.Thread(target=self._run, name="reservation-reaper", daemon=True)
+
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.reap_interval):
+            self.reap()
+
+    def close(self) -> None:
+        """Stops the reaper thread. Holds still in place are left as they are."""
+
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+            self._thread = None
+
+
+def reservations_for(inventory) -> Reservations:
+    """The inventory's reservations; one without a reaper thread is attached if none was (e.g. in a script)."""
+
+    if getattr(inventory, "reservations", None) is None:
+        Reservations().attach(inventory, reaper=False)
+
+    return inventory.reservations
@@ -0,0 +1,523 @@
+"""This module is the shop without its menus: every action takes plain arguments and returns a result
+object instead of asking with input() or answering with print(), so scripts, batch jobs, a web server or
+a benchmark can drive the shop directly. The menus in main.py, auth.py, account_management.py and
+cart.py ask their questions, call these functions and print what comes back.
+
+Every result has ok, a short error code for programs to check ("" when ok) and a message for people.
+Nothing here sleeps or clears the screen; a user is the account dict that sign_in() returns."""
+
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from account_store import get_account_repository
+from cart_store import get_cart_store
+from inventory import search_inventory
+from inventory_store import InsufficientStockError
+from money_ledger import get_money_ledger, to_kobo
+from order_log import get_order_log
+from passwords import check_password_strength, generate_strong_password, hash_password, needs_rehash, verify_password
+from reservations import reservations_for
+from shopping_cart import Cart, parse_item_list, resolve_names
+
+_EMAIL = re.compile(r"[^@]+@[^@]+\.[^@]+")
+
+# password hashes are made and checked on a few worker threads: however many sessions sign in at once,
+# only this many slow KDFs run side by side, and the other sessions' cart and wallet calls keep a core
+PASSWORD_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+
+_password_pool = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="password-check")
+
+
+def _on_password_pool(function, *args):
+    """Runs a password hash or check on the bounded pool and waits for its answer."""
+
+    return _password_pool.submit(function, *args).result()
+
+
+@dataclass
+class Result:
+    ok: bool
+
+    error: str = ""  # e.g. "username_taken"; empty when ok
+
+    message: str = ""
+
+
+@dataclass
+class AccountResult(Result):
+    account: dict | None = None
+
+    password: str = ""  # the generated password, when sign_up() made one
+
+
+@dataclass
+class SearchResult(Result):
+    items: list[dict] = field(default_factory=list)  # {"name", "price", "quantity"}, in stock only
+
+
+@dataclass
+class CartResult(Result):
+    item_name: str = ""
+
+    quantity: int = 0  # how many of the item are in the cart now
+
+    allocations: list[tuple[int, int]] = field(default_factory=list)  # (warehouse, quantity) taken or put back
+
+    available: int = 0
+
+
+@dataclass
+class BulkResult(Result):
+    report: list[dict] = field(default_factory=list)  # one entry per line, see bulk_add()
+
+
+@dataclass
+class CheckoutResult(Result):
+    total: float = 0.0
+
+    balance: float = 0.0
+
+    order: dict | None = None
+
+    sold_out: list[str] = field(default_factory=list)
+
+
+@dataclass
+class WalletResult(Result):
+    amount: float = 0.0  # what went in or out
+
+    balance: float = 0.0
+
+
+@dataclass
+class DetailsResult(Result):
+    activity: list[dict] = field(default_factory=list)  # the last wallet ledger entries, oldest first
+
+    orders: list[dict] = field(default_factory=list)  # the last orders, newest first
+
+
+# --- accounts ---
+
+def sign_up(username: str, email: str, password: str | None = None) -> AccountResult:
+    """Creates an account with a zero balance. Leave password out to have a strong one generated."""
+
+    accounts = get_account_repository()
+
+    if accounts.username_taken(username):
+        return AccountResult(False, "username_taken", "Username already taken. Please choose another.")
+
+    if not _EMAIL.match(email):
+        return AccountResult(False, "invalid_email", "Invalid email format. Please try again.")
+
+    if accounts.email_taken(email):
+        return AccountResult(False, "email_taken", "Email already registered. Please choose another or sign in.")
+
+    generated = password is None
+
+    if generated:
+        password = generate_strong_password()
+
+    elif not check_password_strength(password):
+        return AccountResult(False, "weak_password", "Password does not meet strength requirements. Please try again.")
+
+    account = {"username": username, "email": email, "password_hash": _on_password_pool(hash_password, password),
+               "balance": 0.00}
+
+    try:
+        accounts.add(account)
+
+    except ValueError:
+        return AccountResult(False, "taken", "That username or email was just registered in another session. Please sign up again.")
+
+    return AccountResult(True, message="Account created successfully!", account=account,
+                         password=password if generated else "")
+
+
+def sign_in(username_or_email: str, password: str) -> AccountResult:
+    """Checks the credentials (one index lookup) and upgrades an old password hash while it has the password."""
+
+    accounts = get_account_repository()
+
+    account = accounts.find(username_or_email)
+
+    if account is None or not _on_password_pool(verify_password, password, account['password_hash']):
+        return AccountResult(False, "invalid_credentials", "Invalid username/email or password.")
+
+    if needs_rehash(account['password_hash']):
+        account['password_hash'] = _on_password_pool(hash_password, password)
+
+        accounts.update(account)
+
+    return AccountResult(True, message="Login successful!", account=account)
+
+
+def check_password(user: dict, password: str) -> bool:
+    return _on_password_pool(verify_password, password, user['password_hash'])
+
+
+def change_username(user: dict, new_username: str) -> AccountResult:
+    """Renames the account; its wallet history, saved cart and orders move with it."""
+
+    accounts = get_account_repository()
+
+    if accounts.username_taken(new_username, ignore=user):
+        return AccountResult(False, "username_taken", "Username already taken. Please choose another.")
+
+    old_username = user['username']
+
+    try:
+        accounts.rename(user, new_username)
+
+    except ValueError:
+        return AccountResult(False, "username_taken", "Username was just taken in another session. Please try again.")
+
+    get_money_ledger().rename(old_username, new_username)
+
+    get_cart_store().rename(old_username, new_username)
+
+    get_order_log().rename(old_username, new_username)
+
+    return AccountResult(True, message=f"Username changed successfully to: {new_username}", account=user)
+
+
+def change_email(user: dict, new_email: str) -> AccountResult:
+    accounts = get_account_repository()
+
+    if not _EMAIL.match(new_email):
+        return AccountResult(False, "invalid_email", "Invalid email format. Please try again.")
+
+    if accounts.email_taken(new_email, ignore=user):
+        return AccountResult(False, "email_taken", "Email already registered. Please choose another.")
+
+    try:
+        accounts.change_email(user, new_email)
+
+    except ValueError:
+        return AccountResult(False, "email_taken", "Email was just registered in another session. Please try again.")
+
+    return AccountResult(True, message=f"Email changed successfully to: {new_email}", account=user)
+
+
+def change_password(user: dict, new_password: str | None = None) -> AccountResult:
+    """Sets a new password. Leave it out to have a strong one generated (returned in the result)."""
+
+    generated = new_password is None
+
+    if generated:
+        new_password = generate_strong_password()
+
+    elif not check_password_strength(new_password):
+        return AccountResult(False, "weak_password", "Password does not meet strength requirements. Please try again.")
+
+    user['password_hash'] = _on_password_pool(hash_password, new_password)
+
+    get_account_repository().update(user)
+
+    return AccountResult(True, message="Password changed successfully!", account=user,
+                         password=new_password if generated else "")
+
+
+def delete_account(user: dict) -> Result:
+    """Deletes the account for good. The wallet ledger and order log keep its history."""
+
+    get_account_repository().delete(user)
+
+    get_money_ledger().close(user['username'])
+
+    get_cart_store().delete(user['username'])
+
+    get_order_log().forget(user['username'])
+
+    return Result(True, message="Your account has been successfully deleted.")
+
+
+def account_details(user: dict, limit: int = 5) -> DetailsResult:
+    activity = [entry for entry in get_money_ledger().history(user['username'], limit=limit)
+                if entry['kind'] in ("credit", "debit")]
+
+    return DetailsResult(True, activity=activity, orders=get_order_log().recent(user['username'], limit=limit))
+
+
+# --- wallet ---
+
+def fund_wallet(user: dict, amount: float) -> WalletResult:
+    """Adds money to the latest balance, even if another session changed it, and records it in the ledger."""
+
+    if amount <= 0:
+        return WalletResult(False, "invalid_amount", "Amount must be positive.")
+
+    get_account_repository().credit(user, amount)
+
+    get_money_ledger().credit(user['username'], to_kobo(amount), to_kobo(user['balance']), note="wallet funding")
+
+    return WalletResult(True, message=f"Wallet funded successfully! Your new balance is NGN {user['balance']:,.2f}",
+                        amount=amount, balance=user['balance'])
+
+
+def reset_balance(user: dict) -> WalletResult:
+    def set_to_zero(account: dict) -> float:
+        removed = account['balance']
+
+        account['balance'] = 0.00
+
+        return removed
+
+    removed = get_account_repository().read_modify_write(user, set_to_zero)
+
+    if removed:
+        get_money_ledger().debit(user['username'], to_kobo(removed), 0, note="balance reset")
+
+    return WalletResult(True, message="Your balance has been reset to NGN 0.00.", amount=removed, balance=0.0)
+
+
+# --- catalogue and cart ---
+
+def search(query: str, inventory: dict) -> SearchResult:
+    """Items matching every word of the query that are in stock, in catalogue order."""
+
+    items = [{"name": name, "price": price, "quantity": inventory.available(name)}
+             for name, price in search_inventory(query, inventory) if inventory.available(name) > 0]
+
+    if not items:
+        return SearchResult(False, "no_match", f"Sorry, no items matched '{query}' or they are currently out of stock.")
+
+    return SearchResult(True, items=items)
+
+
+def _invalid_quantity(item_name: str, quantity: int) -> CartResult:
+    return CartResult(False, "invalid_quantity", f"Error: Quantity must be at least 1 (got {quantity}).", item_name=item_name)
+
+
+def add_to_cart(cart: Cart, inventory: dict, item_name: str, quantity: int = 1) -> CartResult:
+    """Puts the item in the cart and holds its stock (see reservations.py)."""
+
+    if quantity < 1:
+        return _invalid_quantity(item_name, quantity)
+
+    if item_name not in inventory:
+        return CartResult(False, "not_found", f"Error: '{item_name}' not found in inventory.", item_name=item_name)
+
+    try:
+        allocations = reservations_for(inventory).hold(cart, item_name, quantity)  # checks and takes the stock in one step
+
+    except InsufficientStockError:
+        available = inventory.available(item_name)
+
+        return CartResult(False, "insufficient_stock", f"Error: Not enough stock for '{item_name}'. Available: {available}",
+                          item_name=item_name, quantity=cart.get(item_name, 0), available=available)
+
+    cart[item_name] = cart.get(item_name, 0) + quantity
+
+    sources = ", ".join(f"warehouse {warehouse} x{qty}" for warehouse, qty in allocations)
+
+    return CartResult(True, message=f"'{item_name}' (x{quantity}) added to cart (from {sources}).", item_name=item_name,
+                      quantity=cart[item_name], allocations=allocations, available=inventory.available(item_name))
+
+
+def remove_from_cart(cart: Cart, inventory: dict, item_name: str, quantity: int = 1) -> CartResult:
+    """Takes some (or all) of an item out of the cart and gives back the stock it still holds."""
+
+    if quantity < 1:
+        return _invalid_quantity(item_name, quantity)
+
+    if item_name not in cart:
+        return CartResult(False, "not_in_cart", f"Error: '{item_name}' not in your cart.", item_name=item_name)
+
+    quantity = min(quantity, cart[item_name])
+
+    reservations_for(inventory).release(cart, item_name, quantity)  # only what is still held goes back to the warehouses
+
+    if quantity == cart[item_name]:
+        del cart[item_name]
+
+        return CartResult(True, message=f"'{item_name}' removed from cart.", item_name=item_name)
+
+    cart[item_name] -= quantity
+
+    return CartResult(True, message=f"Removed {quantity} of '{item_name}' from cart. Remaining: {cart[item_name]}",
+                      item_name=item_name, quantity=cart[item_name])
+
+
+def clear_cart(cart: Cart, inventory: dict) -> Result:
+    if not cart:
+        return Result(False, "empty_cart", "Your cart is already empty.")
+
+    reservations_for(inventory).release_all(cart)
+
+    cart.clear()
+
+    return Result(True, message="Your cart has been cleared.")
+
+
+def bulk_add(cart: Cart, inventory: dict, text: str) -> BulkResult:
+    """
+    Adds a whole list of items (see shopping_cart.parse_item_list) to the cart, holding the stock for all of them in
+    one pass. Lines for the same item are added together. The report has one entry per line:
+    {"line", "name", "quantity", "status", "available"} where status is "added", "insufficient stock",
+    "not found" or "invalid quantity".
+    """
+
+    entries = parse_item_list(text)
+
+    resolved = resolve_names({name for _, name, qty in entries if qty}, inventory)
+
+    wanted: dict[str, int] = {}
+
+    for _, name, qty in entries:
+        if qty and name in resolved:
+            wanted[resolved[name]] = wanted.get(resolved[name], 0) + qty
+
+    held = reservations_for(inventory).hold_each(cart, wanted)
+
+    for item_name, allocations in held.items():
+        if allocations is not None:
+            cart[item_name] = cart.get(item_name, 0) + wanted[item_name]
+
+    report = []
+
+    for number, name, qty in entries:
+        item_name = resolved.get(name)
+
+        if qty is None:
+            status = "invalid quantity"
+
+        elif item_name is None or (held[item_name] is None and item_name not in inventory):
+            status = "not found"  # never listed, or removed by a reload while we held the others
+
+        else:
+            status = "added" if held[item_name] is not None else "insufficient stock"
+
+        report.append({"line": number, "name": item_name or name, "quantity": qty, "status": status,
+                       "available": inventory.available(item_name) if item_name else 0})
+
+    added = [entry for entry in report if entry['status'] == "added"]
+
+    return BulkResult(bool(added), "" if added else "nothing_added",
+                      f"{len(added)} of {len(report)} line(s) added to cart ({sum(entry['quantity'] for entry in added)} item(s)).",
+                      report=report)
+
+
+def restore_cart(cart: Cart, inventory: dict, saved: dict[str, int]) -> BulkResult:
+    """
+    Puts a saved cart back, holding the stock for all of its items in one pass. Items that left the catalogue,
+    or no longer have enough stock, are cut down to what is left or dropped; error is then "partial" and the
+    message names them all at once. The report has one entry per saved item: {"name", "quantity", "restored"}.
+    """
+
+    wanted = {}
+
+    for name, qty in saved.items():
+        restored = min(qty, inventory.available(name) if name in inventory else 0)
+
+        if restored:
+            wanted[name] = restored
+
+    held = reservations_for(inventory).hold_each(cart, wanted) if wanted else {}
+
+    report = []
+
+    for name, qty in saved.items():
+        restored = wanted[name] if held.get(name) is not None else 0  # None: it sold out since we looked
+
+        if restored:
+            cart[name] = cart.get(name, 0) + restored
+
+        report.append({"name": name, "quantity": qty, "restored": restored})
+
+    cut = [entry for entry in report if entry['restored'] < entry['quantity']]
+
+    lines = []
+
+    if cut:
+        lines.append("Some of your saved cart is no longer in stock: " + ", ".join(
+            f"'{entry['name']}' ({entry['restored']} of {entry['quantity']} kept)" for entry in cut) + ".")
+
+    if cart:
+        lines.append(f"Welcome back! Your cart from last time has {cart.item_count} item(s) in it.")
+
+    return BulkResult(not cut, "partial" if cut else "", "\n".join(lines), report=report)
+
+
+def checkout(user: dict, cart: Cart, inventory: dict) -> CheckoutResult:
+    """
+    Pays for the cart and marks its stock as sold, then records the order and empties the cart. If the
+    balance is too low the cart is emptied and its stock given back; if an item sold out while its hold
+    had expired, nothing is charged and the cart stays as it is.
+    """
+
+    from storage import get_storage, InsufficientFundsError
+
+    if not cart:
+        return CheckoutResult(False, "empty_cart", "Your cart is empty. Nothing to checkout.")
+
+    total = cart.subtotal  # kept up to date line by line, so a long cart costs nothing extra here
+
+    try:
+        # the debit and the stock leaving the warehouses are saved together (in one transaction with SQLite);
+        # holds that expired while the cart sat idle are taken again first, if the stock is still there.
+        # debit() checks the latest balance, including money added in another session, so there's no check here
+        with get_storage().transaction():
+            sold_out = reservations_for(inventory).confirm(cart, lambda: get_account_repository().debit(user, total))
+
+    except InsufficientFundsError:
+        reservations_for(inventory).release_all(cart)
+
+        cart.clear()
+
+        return CheckoutResult(False, "insufficient_funds", f"Insufficient funds! Your current balance is NGN {user['balance']:,.2f}.",
+                              total=total, balance=user['balance'])
+
+    if sold_out:
+        return CheckoutResult(False, "sold_out", "Some items sold out while they sat in your cart. You have not been charged.",
+                              total=total, balance=user['balance'], sold_out=sold_out)
+
+    get_money_ledger().debit(user['username'], to_kobo(total), to_kobo(user['balance']),
+                             note=f"checkout of {cart.item_count} item(s)")
+
+    order = get_order_log().record(user['username'], [line for line in cart.lines() if line[0] in inventory], to_kobo(total))
+
+    cart.clear()
+
+    return CheckoutResult(True, message="Transaction Successful!", total=total, balance=user['balance'], order=order)
+
+
+if __name__ == "__main__":
+    # python shop_service.py [operations]: times cart operations on an in-memory catalogue, no menus involved
+    from inventory_store import InventoryStore
+
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    store = InventoryStore()
+
+    for i in range(10_000):
+        store.set_stock(f"Item {i}", 1 + i % 4, 100.0 + i, 1_000_000)
+
+    cart = Cart(store)
+
+    start = time.perf_counter()
+
+    for i in range(operations // 2):
+        add_to_cart(cart, store, f"Item {i % 10_000}", 2)
+
+        remove_from_cart(cart, store, f"Item {i % 10_000}", 1)
+
+    elapsed = time.perf_counter() - start
+
+    print(f"{operations:,} cart operations in {elapsed:.2f} s ({operations / elapsed:,.0f} per second)")
+
+    print(f"Cart: {len(cart):,} lines, {cart.item_count:,} items, NGN {cart.subtotal:,.2f}")
+
+    start = time.perf_counter()
+
+    for i in range(1_000):
+        search(f"item {i}", store)
+
+    print(f"1,000 searches in {time.perf_counter() - start:.2f} s")
+
+    clear_cart(cart, store)
+
+    print(f"Stock held after clearing the cart: {sum(store._location_held)}")
@@ -0,0 +1,220 @@
+"""This module holds the shopping cart itself and the parsing of item lists, with no menus, so the shop
+service and the cart menus in cart.py can share them. The cart keeps its running total as lines change;
+parse_item_list() and resolve_names() turn a pasted list or file into catalogue names and quantities."""
+
+import json
+import threading
+import uuid
+
+from money_ledger import to_kobo, to_naira
+
+
+class Cart(dict):
+    """
+    The user's cart, {item_name: quantity}, keeping its total price and number of items up to date as
+    lines change, so showing the total or checking out doesn't walk every line. Each line remembers its
+    unit price in kobo; reprice() moves the lines a hot reload repriced, and only those.
+    """
+
+    def __init__(self, inventory=None):
+        super().__init__()
+
+        self.inventory = inventory
+
+        self.hold_key = uuid.uuid4().hex  # files the cart's stock holds (see reservations.py); id(cart) is reused once a cart is freed
+
+        self.item_count = 0  # units over all lines; len(cart) is the number of lines
+
+        self._unit_prices: dict[str, int] = {}  # item name -> kobo
+
+        self._subtotal = 0  # kobo
+
+        self._lock = threading.RLock()  # the inventory watcher reprices from its own thread
+
+    @property
+    def subtotal(self) -> float:
+        return to_naira(self._subtotal)
+
+    def unit_price(self, item_name: str) -> float:
+        return to_naira(self._unit_prices.get(item_name, 0))
+
+    def lines(self) -> list[tuple[str, int, int]]:
+        """(item name, quantity, unit price in kobo) for every line, as the order log stores them."""
+
+        with self._lock:
+            return [(item_name, quantity, self._unit_prices[item_name]) for item_name, quantity in self.items()]
+
+    def _price_of(self, item_name: str) -> int:
+        if self.inventory is not None and item_name in self.inventory:
+            return to_kobo(self.inventory[item_name]['price'])
+
+        return 0  # not in the catalogue (any more), so not charged for, as before
+
+    def __setitem__(self, item_name: str, quantity: int):
+        with self._lock:
+            change = quantity - self.get(item_name, 0)
+
+            if item_name not in self._unit_prices:
+                self._unit_prices[item_name] = self._price_of(item_name)
+
+            super().__setitem__(item_name, quantity)
+
+            self._subtotal += change * self._unit_prices[item_name]
+
+            self.item_count += change
+
+    def __delitem__(self, item_name: str):
+        with self._lock:
+            quantity = self[item_name]
+
+            super().__delitem__(item_name)
+
+            self._subtotal -= quantity * self._unit_prices.pop(item_name)
+
+            self.item_count -= quantity
+
+    def pop(self, item_name: str, *default):
+        with self._lock:
+            if item_name not in self:
+                if default:
+                    return default[0]
+
+                raise KeyError(item_name)
+
+            quantity = self[item_name]
+
+            del self[item_name]
+
+            return quantity
+
+    def popitem(self) -> tuple[str, int]:
+        with self._lock:
+            if not self:
+                raise KeyError("popitem(): cart is empty")
+
+            item_name = next(reversed(self))
+
+            return item_name, self.pop(item_name)
+
+    def setdefault(self, item_name: str, default: int = 0) -> int:
+        with self._lock:
+            if item_name not in self:
+                self[item_name] = default
+
+            return self[item_name]
+
+    def update(self, *args, **kwargs):
+        with self._lock:
+            for item_name, quantity in dict(*args, **kwargs).items():
+                self[item_name] = quantity
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+
+            self._unit_prices.clear()
+
+            self._subtotal = 0
+
+            self.item_count = 0
+
+    def bind(self, inventory) -> None:
+        """Prices the cart from this inventory from now on, repricing the lines already in it."""
+
+        with self._lock:
+            self.inventory = inventory
+
+            for item_name in self:
+                self._set_unit_price(item_name, self._price_of(item_name))
+
+    def reprice(self, diff: dict) -> None:
+        """Applies a hot reload's diff (see inventory.reload_changed_files) to the lines it touches."""
+
+        with self._lock:
+            for item_name, _, new_price in diff.get("repriced", ()):
+                self._set_unit_price(item_name, to_kobo(new_price))
+
+            for item_name in diff.get("removed", ()):
+                self._set_unit_price(item_name, 0)
+
+            for item_name in diff.get("added", ()):
+                self._set_unit_price(item_name, self._price_of(item_name))
+
+    def _set_unit_price(self, item_name: str, price: int) -> None:
+        if item_name in self:
+            self._subtotal += self[item_name] * (price - self._unit_prices[item_name])
+
+            self._unit_prices[item_name] = price
+
+
+def parse_item_list(text: str) -> list[tuple[int, str, int | None]]:
+    """
+    Reads a list of items to buy: JSON ({"name": qty, ...} or [{"name": ..., "qty": ...}, ...]) or one
+    "name,qty" per line, where a missing quantity means 1. Returns (line number, name, quantity) for each
+    entry, with quantity None when it isn't a whole number above zero.
+    """
+
+    stripped = text.strip()
+
+    if stripped[:1] in ("{", "["):
+        try:
+            data = json.loads(stripped)
+
+        except json.JSONDecodeError:
+            data = None
+
+        if isinstance(data, dict):
+            data = [{"name": name, "qty": qty} for name, qty in data.items()]
+
+        if isinstance(data, list):
+            entries = []
+
+            for number, entry in enumerate(data, start=1):
+                entry = entry if isinstance(entry, dict) else {}
+
+                qty = entry.get("qty", entry.get("quantity", 1))
+
+                valid = isinstance(qty, int) and not isinstance(qty, bool) and qty > 0
+
+                entries.append((number, str(entry.get("name", "")).strip(), qty if valid else None))
+
+            return entries
+
+    entries = []
+
+    for number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+
+        if not line or line.startswith("#"):
+            continue
+
+        name, comma, qty = line.rpartition(",")  # the last comma, so names with commas in them still work
+
+        if not comma:
+            name, qty = line, "1"
+
+        qty = qty.strip()
+
+        entries.append((number, name.strip(), int(qty) if qty.isdigit() and int(qty) > 0 else None))
+
+    return entries
+
+
+def resolve_names(names: set[str], inventory: dict) -> dict[str, str]:
+    """Matches the listed names to catalogue names: exactly first, then ignoring case, with a single
+    pass over the catalogue for every name that missed (not one search per item)."""
+
+    resolved = {name: name for name in names if name in inventory}
+
+    missing = names - resolved.keys()
+
+    if missing:
+        folded = {name.casefold(): name for name in missing}
+
+        for item_name in inventory:
+            listed = folded.get(item_name.casefold())
+
+            if listed is not None and listed not in resolved:
+                resolved[listed] = item_name
+
+    return resolved
@@ -0,0 +1,260 @@
+"""This module keeps stock changes across restarts. Every change to the stock sitting in a warehouse
+(a sale at checkout, or new stock added to an item) is appended to a log file as a
+quantity delta. A background thread writes the log in batches, and the log is folded into a snapshot
+every so often so it never grows without limit. On startup the snapshot and the log are added on top
+of the quantities read from the warehouse files. Several copies of the app can share the ledger: each
+batch is written under an exclusive file lock, after reading the lines the other copies wrote, so every
+line keeps a unique seq and a compaction never drops another copy's changes."""
+
+import json
+import os
+import queue
+import threading
+
+from file_lock import FileLock
+from jsonl_file import append_durably, read_entries, write_atomically
+
+DATA_DIR = "data"
+
+STOCK_LOG_FILE = os.path.join(DATA_DIR, "stock.log")
+
+STOCK_SNAPSHOT_FILE = os.path.join(DATA_DIR, "stock.snapshot")
+
+FLUSH_INTERVAL = 0.5  # seconds the writer waits to gather a batch
+
+COMPACT_EVERY = 10000  # log entries between two snapshots
+
+
+class StockLedger:
+    """
+    Durable record of stock deltas per (item name, warehouse).
+
+    record() only puts the delta on a queue, so checkout never waits for the disk. The writer thread
+    appends each batch to the log as one JSON line per delta ([seq, name, warehouse, delta]) and fsyncs
+    it once. Sequence numbers make compaction safe: the snapshot remembers the last seq it includes, and
+    log lines up to that seq are skipped if a crash left them behind.
+    """
+
+    def __init__(self, log_file: str = STOCK_LOG_FILE, snapshot_file: str = STOCK_SNAPSHOT_FILE,
+                 flush_interval: float = FLUSH_INTERVAL, compact_every: int = COMPACT_EVERY):
+        self.log_file = log_file
+
+        self.snapshot_file = snapshot_file
+
+        self.flush_interval = flush_interval
+
+        self.compact_every = compact_every
+
+        self._totals: dict[tuple[str, int], int] = {}  # (name, warehouse) -> sum of every delta so far
+
+        self._seq = 0  # seq of the last delta written
+
+        self._since_compaction = 0
+
+        self._pending: queue.Queue = queue.Queue()
+
+        self._offset = 0  # how far into the log we have read
+
+        self._snapshot_signature: tuple | None = None  # (size, mtime) of the snapshot we loaded
+
+        self._lock = threading.Lock()  # guards _totals, _seq and the files
+
+        self._file_lock = FileLock(os.path.splitext(log_file)[0] + ".lock")  # the same across processes
+
+        self._stop = threading.Event()
+
+        self._thread: threading.Thread | None = None
+
+        with self._file_lock.shared():
+            self._load()
+
+    def _snapshot_stat(self) -> tuple | None:
+        try:
+            stat = os.stat(self.snapshot_file)
+
+        except FileNotFoundError:
+            return None
+
+        return stat.st_size, stat.st_mtime_ns
+
+    def _load(self) -> None:
+        """Rebuilds the totals from the snapshot plus every newer line of the log."""
+
+        self._totals, self._seq, self._offset, self._since_compaction = {}, 0, 0, 0
+
+        self._snapshot_signature = self._snapshot_stat()
+
+        try:
+            with open(self.snapshot_file, 'r') as f:
+                snapshot = json.load(f)
+
+            self._seq = snapshot["seq"]
+
+            self._totals = {(name, warehouse): delta for name, warehouse, delta in snapshot["stock"]}
+
+        except FileNotFoundError:
+            pass
+
+        self._read_log(gaps_allowed=True)
+
+    def _read_log(self, gaps_allowed: bool) -> bool:
+        """
+        Adds the log lines after self._offset to the totals. Returns False if a seq is missing, which
+        means the lines before it were compacted by another process and the totals must be reloaded.
+        """
+
+        for _, self._offset, entry in read_entries(self.log_file, self._offset):
+            try:
+                seq, name, warehouse, delta = entry
+
+            except (ValueError, TypeError):
+                continue  # a damaged line
+
+            if seq <= self._seq:
+                continue  # already folded into the snapshot
+
+            if seq != self._seq + 1 and not gaps_allowed:
+                return False
+
+            key = (name, warehouse)
+
+            self._totals[key] = self._totals.get(key, 0) + delta
+
+            self._seq = seq
+
+            self._since_compaction += 1
+
+        return True
+
+    def _catch_up(self) -> None:
+        """Picks up what other processes wrote since we last looked. Call with both locks held."""
+
+        try:
+            log_size = os.path.getsize(self.log_file)
+
+        except FileNotFoundError:
+            log_size = 0
+
+        if self._snapshot_stat() != self._snapshot_signature or log_size < self._offset:
+            self._load()  # another process compacted
+
+        elif log_size > self._offset and not self._read_log(gaps_allowed=False):
+            self._load()
+
+    def total(self, name: str, warehouse: int) -> int:
+        """The net change recorded so far for an item in one warehouse."""
+
+        with self._lock:
+            return self._totals.get((name, warehouse), 0)
+
+    def totals(self) -> dict[tuple[str, int], int]:
+        """Every recorded net change, keyed by (name, warehouse)."""
+
+        with self._lock:
+            return dict(self._totals)
+
+    def attach(self, inventory) -> None:
+        """Applies the recorded deltas to a freshly loaded inventory, then records its changes from now on."""
+
+        for (name, warehouse), delta in self.totals().items():
+            if name in inventory:
+                inventory.adjust_stock(name, warehouse, delta)
+
+        inventory.ledger = self
+
+        self.start()
+
+    def record(self, name: str, warehouse: int, delta: int) -> None:
+        """Queues a stock change for the writer thread. Never blocks on the disk."""
+
+        if delta:
+            self._pending.put((name, warehouse, delta))
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+
+            self._thread = threading.Thread(target=self._run, name="stock-ledger", daemon=True)
+
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.flush(timeout=self.flush_interval)
+
+        self.flush()
+
+    def flush(self, timeout: float | None = None) -> None:
+        """Writes out whatever is queued as one batch. With a timeout, waits that long for the first delta."""
+
+        batch = []
+
+        try:
+            batch.append(self._pending.get(timeout=timeout) if timeout else self._pending.get_nowait())
+
+            while True:
+                batch.append(self._pending.get_nowait())
+
+        except queue.Empty:
+            pass
+
+        if not batch:
+            return
+
+        with self._file_lock.exclusive(), self._lock:
+            self._catch_up()
+
+            lines = []
+
+            for name, warehouse, delta in batch:
+                self._seq += 1
+
+                key = (name, warehouse)
+
+                self._totals[key] = self._totals.get(key, 0) + delta
+
+                lines.append(json.dumps([self._seq, name, warehouse, delta]) + "\n")
+
+            data = "".join(lines).encode()
+
+            append_durably(self.log_file, data, expected_size=self._offset)  # drops a half-written line left by a crash
+
+            self._offset += len(data)
+
+            self._since_compaction += len(batch)
+
+            if self._since_compaction >= self.compact_every:
+                self._compact()
+
+    def compact(self) -> None:
+        """Folds the log into a new snapshot and empties the log."""
+
+        with self._file_lock.exclusive(), self._lock:
+            self._catch_up()
+
+            self._compact()
+
+    def _compact(self) -> None:
+        write_atomically(self.snapshot_file, json.dumps(
+            {"seq": self._seq, "stock": [[name, warehouse, delta] for (name, warehouse), delta in self._totals.items()]}))
+
+        self._snapshot_signature = self._snapshot_stat()
+
+        # the snapshot already holds everything in the log; if we crash before this, the seqs stop double counting
+        open(self.log_file, 'w').close()
+
+        self._offset = 0
+
+        self._since_compaction = 0
+
+    def close(self) -> None:
+        """Stops the writer thread after it has written everything still queued."""
+
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+            self._thread = None
+
+        self.flush()
@@ -0,0 +1,397 @@
+"""This module picks where accounts and stock changes are kept. The flat-text backend is the one the app has
+always used (accounts.txt plus its journal, and the stock ledger files); the SQLite backend keeps everything in
+one database file in WAL mode, so several copies of the app can share it and a checkout can take the money and
+the stock in a single transaction. Choose with the SHOP_STORAGE environment variable: "text" (default) or "sqlite"."""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+
+from auth import credential_key
+from money_ledger import to_kobo, to_naira
+
+DATA_DIR = "data"
+
+DATABASE_FILE = os.path.join(DATA_DIR, "shop.db")
+
+STORAGE_BACKEND = os.environ.get("SHOP_STORAGE", "text")
+
+SCHEMA_VERSION = 1  # stored in the database as PRAGMA user_version
+
+
+class InsufficientFundsError(ValueError):
+    """Raised when a debit would take an account below zero."""
+
+
+class TextStorage:
+    """The flat-file backend: accounts.txt + accounts.journal, and stock.log + stock.snapshot."""
+
+    name = "text"
+
+    def account_repository(self):
+        from account_store import AccountRepository
+
+        return AccountRepository()
+
+    def stock_ledger(self):
+        from stock_ledger import StockLedger
+
+        return StockLedger()
+
+    def transaction(self):
+        """Plain files can't commit several changes at once, so this only groups them for readability."""
+
+        return nullcontext()
+
+
+class SQLiteStorage:
+    """
+    The SQLite backend. One connection is shared by the account repository and the stock ledger and
+    guarded by a lock; transaction() can be nested, and only the outermost one commits.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = DATABASE_FILE):
+        self.path = path
+
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+
+        self.connection.row_factory = sqlite3.Row
+
+        self._lock = threading.RLock()
+
+        self._depth = 0  # how many transaction() blocks we are inside
+
+        self.connection.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer, or the other way round
+
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS accounts (
+                username      TEXT NOT NULL,
+                username_key  TEXT NOT NULL UNIQUE,
+                email         TEXT NOT NULL,
+                email_key     TEXT NOT NULL UNIQUE,
+                password_hash TEXT NOT NULL,
+                balance       REAL NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS stock (
+                name      TEXT NOT NULL,
+                warehouse INTEGER NOT NULL,
+                delta     INTEGER NOT NULL,
+                PRIMARY KEY (name, warehouse)
+            );
+        """)  # the UNIQUE constraints give us the username and email indexes
+
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self._upgrade()
+
+    def _upgrade(self) -> None:
+        """Brings a database made by an older version up to date (version 1: keys are case-folded, not lower-cased)."""
+
+        with self.transaction() as connection:
+            rows = connection.execute("SELECT rowid, username, email FROM accounts").fetchall()
+
+            connection.executemany("UPDATE accounts SET username_key = ?, email_key = ? WHERE rowid = ?",
+                                   [(credential_key(row["username"]), credential_key(row["email"]), row["rowid"]) for row in rows])
+
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @contextmanager
+    def transaction(self):
+        """Runs the block in one write transaction (BEGIN IMMEDIATE), rolling it back if the block raises."""
+
+        with self._lock:
+            outermost = self._depth == 0
+
+            if outermost:
+                self.connection.execute("BEGIN IMMEDIATE")
+
+            self._depth += 1
+
+            try:
+                yield self.connection
+
+            except BaseException:
+                self._depth -= 1
+
+                if outermost:
+                    self.connection.execute("ROLLBACK")
+
+                raise
+
+            self._depth -= 1
+
+            if outermost:
+                self.connection.execute("COMMIT")
+
+    def query(self, sql: str, parameters: tuple = ()) -> list[sqlite3.Row]:
+        with self._lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def account_repository(self):
+        return SQLiteAccountRepository(self)
+
+    def stock_ledger(self):
+        return SQLiteStockLedger(self)
+
+
+class SQLiteAccountRepository:
+    """
+    Same interface as account_store.AccountRepository, but every lookup is an indexed query, so changes
+    made by another copy of the app are seen straight away. Balances are changed by the difference from
+    the last value this process saw (balance = balance + ?), so two processes never overwrite each other.
+    """
+
+    def __init__(self, storage: SQLiteStorage):
+        self._storage = storage
+
+        self._seen_balance: dict[str, float] = {}  # username key -> balance when we last read or wrote it
+
+        if not storage.query("SELECT 1 FROM accounts LIMIT 1"):
+            self._import_text_accounts()
+
+    def _import_text_accounts(self) -> None:
+        """Fills a new database with the accounts from accounts.txt and its journal."""
+
+        from account_store import AccountRepository
+
+        accounts = AccountRepository().all()
+
+        with self._storage.transaction() as connection:
+            connection.executemany(
+                "INSERT INTO accounts (username, username_key, email, email_key, password_hash, balance) VALUES (?, ?, ?, ?, ?, ?)",
+                [(a['username'], credential_key(a['username']), a['email'], credential_key(a['email']), a['password_hash'], a['balance'])
+                 for a in accounts])
+
+    def _account(self, row: sqlite3.Row | None) -> dict | None:
+        if row is None:
+            return None
+
+        account = {"username": row["username"], "email": row["email"], "password_hash": row["password_hash"],
+                   "balance": row["balance"]}
+
+        self._seen_balance[row["username_key"]] = row["balance"]
+
+        return account
+
+    def _one(self, sql: str, parameters: tuple) -> dict | None:
+        rows = self._storage.query(sql, parameters)
+
+        return self._account(rows[0] if rows else None)
+
+    # --- lookups ---
+
+    def reload(self) -> None:
+        self._seen_balance.clear()
+
+    def refresh(self) -> None:
+        pass  # every lookup already reads the database
+
+    def all(self) -> list[dict]:
+        return [self._account(row) for row in self._storage.query("SELECT * FROM accounts ORDER BY rowid")]
+
+    def get_by_username(self, username: str) -> dict | None:
+        return self._one("SELECT * FROM accounts WHERE username_key = ?", (credential_key(username),))
+
+    def get_by_email(self, email: str) -> dict | None:
+        return self._one("SELECT * FROM accounts WHERE email_key = ?", (credential_key(email),))
+
+    def find(self, username_or_email: str) -> dict | None:
+        return self.get_by_username(username_or_email) or self.get_by_email(username_or_email)
+
+    def username_taken(self, username: str, ignore: dict | None = None) -> bool:
+        rows = self._storage.query("SELECT username_key FROM accounts WHERE username_key = ?", (credential_key(username),))
+
+        return bool(rows) and (ignore is None or rows[0]["username_key"] != credential_key(ignore['username']))
+
+    def email_taken(self, email: str, ignore: dict | None = None) -> bool:
+        rows = self._storage.query("SELECT email_key FROM accounts WHERE email_key = ?", (credential_key(email),))
+
+        return bool(rows) and (ignore is None or rows[0]["email_key"] != credential_key(ignore['email']))
+
+    # --- changes ---
+
+    @contextmanager
+    def _unique(self, message: str):
+        """Turns a UNIQUE constraint failure into the ValueError the text backend raises."""
+
+        try:
+            yield
+
+        except sqlite3.IntegrityError as e:
+            raise ValueError(message) from e
+
+    def add(self, account: dict) -> dict:
+        """Raises ValueError if another session took the username or email since it was checked."""
+
+        with self._storage.transaction() as connection, self._unique("Username or email already registered"):
+            connection.execute(
+                "INSERT INTO accounts (username, username_key, email, email_key, password_hash, balance) VALUES (?, ?, ?, ?, ?, ?)",
+                (account['username'], credential_key(account['username']), account['email'], credential_key(account['email']),
+                 account['password_hash'], account['balance']))
+
+        self._seen_balance[credential_key(account['username'])] = account['balance']
+
+        return account
+
+    def update(self, account: dict) -> None:
+        """Saves the balance (as a difference) and the password hash, then reads the current balance back."""
+
+        key = credential_key(account['username'])
+
+        with self._storage.transaction() as connection:
+            change = account['balance'] - self._seen_balance.get(key, account['balance'])
+
+            cursor = connection.execute(
+                "UPDATE accounts SET balance = balance + ?, password_hash = ? WHERE username_key = ? AND balance + ? >= 0",
+                (change, account['password_hash'], key, change))
+
+            if cursor.rowcount == 0:
+                if not connection.execute("SELECT 1 FROM accounts WHERE username_key = ?", (key,)).fetchone():
+                    raise KeyError(f"No account named {account['username']}")
+
+                raise InsufficientFundsError(f"Insufficient funds in {account['username']}'s wallet")
+
+            balance = connection.execute("SELECT balance FROM accounts WHERE username_key = ?", (key,)).fetchone()[0]
+
+        account['balance'] = balance  # may include money added by another session
+
+        self._seen_balance[key] = balance
+
+    def read_modify_write(self, account: dict, change):
+        """Calls change(record) on the latest row and saves it, inside one write transaction."""
+
+        with self._storage.transaction():
+            latest = self.get_by_username(account['username'])
+
+            if latest is None:
+                raise KeyError(f"No account named {account['username']}")
+
+            account.update(latest)
+
+            result = change(account)
+
+            self.update(account)
+
+        return result
+
+    def credit(self, account: dict, amount: float) -> None:
+        def add(latest: dict) -> None:
+            latest['balance'] = to_naira(to_kobo(latest['balance']) + to_kobo(amount))
+
+        self.read_modify_write(account, add)
+
+    def debit(self, account: dict, amount: float) -> None:
+        def take(latest: dict) -> None:
+            if to_kobo(latest['balance']) < to_kobo(amount):
+                raise InsufficientFundsError(f"Insufficient funds in {latest['username']}'s wallet")
+
+            latest['balance'] = to_naira(to_kobo(latest['balance']) - to_kobo(amount))
+
+        self.read_modify_write(account, take)
+
+    def rename(self, account: dict, new_username: str) -> None:
+        old_key = credential_key(account['username'])
+
+        with self._storage.transaction() as connection, self._unique(f"Username {new_username} already taken"):
+            connection.execute("UPDATE accounts SET username = ?, username_key = ? WHERE username_key = ?",
+                               (new_username, credential_key(new_username), old_key))
+
+        self._seen_balance[credential_key(new_username)] = self._seen_balance.pop(old_key, account['balance'])
+
+        account['username'] = new_username
+
+    def change_email(self, account: dict, new_email: str) -> None:
+        with self._storage.transaction() as connection, self._unique(f"Email {new_email} already registered"):
+            connection.execute("UPDATE accounts SET email = ?, email_key = ? WHERE username_key = ?",
+                               (new_email, credential_key(new_email), credential_key(account['username'])))
+
+        account['email'] = new_email
+
+    def delete(self, account: dict) -> None:
+        with self._storage.transaction() as connection:
+            connection.execute("DELETE FROM accounts WHERE username_key = ?", (credential_key(account['username']),))
+
+        self._seen_balance.pop(credential_key(account['username']), None)
+
+    def save(self) -> None:
+        pass  # every change is committed as it happens
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteStockLedger:
+    """Same interface as stock_ledger.StockLedger, keeping one running total per (item, warehouse) row."""
+
+    def __init__(self, storage: SQLiteStorage):
+        self._storage = storage
+
+        if not storage.query("SELECT 1 FROM stock LIMIT 1"):
+            self._import_text_ledger()
+
+    def _import_text_ledger(self) -> None:
+        """Fills a new database with the stock changes recorded by the flat-file ledger."""
+
+        from stock_ledger import StockLedger
+
+        with self._storage.transaction() as connection:
+            connection.executemany("INSERT INTO stock (name, warehouse, delta) VALUES (?, ?, ?)",
+                                   [(name, warehouse, delta) for (name, warehouse), delta in StockLedger().totals().items()])
+
+    def total(self, name: str, warehouse: int) -> int:
+        rows = self._storage.query("SELECT delta FROM stock WHERE name = ? AND warehouse = ?", (name, warehouse))
+
+        return rows[0]["delta"] if rows else 0
+
+    def attach(self, inventory) -> None:
+        for row in self._storage.query("SELECT name, warehouse, delta FROM stock"):
+            if row["name"] in inventory:
+                inventory.adjust_stock(row["name"], row["warehouse"], row["delta"])
+
+        inventory.ledger = self
+
+    def record(self, name: str, warehouse: int, delta: int) -> None:
+        """Adds the delta in the current transaction, so a checkout's stock and payment commit together."""
+
+        if not delta:
+            return
+
+        with self._storage.transaction() as connection:
+            connection.execute(
+                "INSERT INTO stock (name, warehouse, delta) VALUES (?, ?, ?) "
+                "ON CONFLICT (name, warehouse) DO UPDATE SET delta = delta + excluded.delta",
+                (name, warehouse, delta))
+
+    def flush(self, timeout: float | None = None) -> None:
+        pass
+
+    def compact(self) -> None:
+        pass  # rows are already running totals
+
+    def close(self) -> None:
+        pass
+
+
+_storage = None
+
+
+def get_storage():
+    """Returns the storage backend picked by SHOP_STORAGE, creating it the first time."""
+
+    global _storage
+
+    if _storage is None:
+        if STORAGE_BACKEND == "sqlite":
+            _storage = SQLiteStorage()
+
+        elif STORAGE_BACKEND == "text":
+            _storage = TextStorage()
+
+        else:
+            raise ValueError(f"Unknown SHOP_STORAGE backend '{STORAGE_BACKEND}'. Use 'text' or 'sqlite'.")
+
+    return _storage
@@ -0,0 +1,34 @@
+"""Tests for the account journal: entries after a line cut short by a crash."""
+
+import os
+
+from account_journal import AccountJournal
+
+
+def test_a_line_cut_short_is_dropped_before_the_next_entry(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the snapshot and manifest are looked up under data/
+
+    os.mkdir("data")
+
+    path = os.path.join("data", "accounts.journal")
+
+    journal = AccountJournal(path)
+
+    journal.append("create", "alice", account={"username": "alice", "balance": 0.0}).wait()
+
+    with open(path, 'ab') as f:
+        f.write(b'{"seq": 2, "op": "cre')  # a crash stopped this entry before its newline
+
+    reopened, accounts = AccountJournal(path), {}
+
+    reopened.replay(accounts, 0)
+
+    reopened.append("credit", "alice", kobo=5000)
+
+    reopened.append("debit", "alice", kobo=2000).wait()
+
+    accounts = {}
+
+    AccountJournal(path).replay(accounts, 0)
+
+    assert accounts["alice"]["balance"] == 30.0
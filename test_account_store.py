@@ -0,0 +1,128 @@
+"""Tests for the account repository: balances journaled in whole kobo, and, on sharded account files,
+reading only the shards looked up while still finding accounts renamed into another shard."""
+
+import json
+
+import pytest
+
+from account_shards import reshard, shard_of
+from account_store import AccountRepository
+from auth import credential_key
+
+SHARDS = 4
+
+
+def account(username: str, balance: float = 0.0) -> dict:
+    return {"username": username, "email": f"{username}@example.com", "password_hash": "x", "balance": balance}
+
+
+@pytest.fixture
+def data(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    (tmp_path / "data").mkdir()
+
+    return tmp_path / "data"
+
+
+def test_balances_are_journaled_in_kobo(data):
+    accounts = AccountRepository()
+
+    alice = accounts.add(account("alice"))
+
+    for _ in range(3):
+        accounts.credit(alice, 0.1)
+
+    accounts.debit(alice, 0.05)
+
+    entries = [json.loads(line) for line in (data / "accounts.journal").read_text().splitlines()]
+
+    assert [(entry["op"], entry.get("kobo")) for entry in entries[1:]] == [("credit", 10)] * 3 + [("debit", 5)]
+
+    assert AccountRepository().get_by_username("alice")['balance'] == 0.25
+
+
+def test_entries_with_naira_amounts_still_replay(data):
+    accounts = AccountRepository()
+
+    accounts.add(account("alice"))
+
+    with open(data / "accounts.journal", 'a') as f:  # written before entries were kept in kobo
+        f.write(json.dumps({"seq": 2, "op": "credit", "user": "alice", "amount": 0.1}) + "\n")
+
+        f.write(json.dumps({"seq": 3, "op": "credit", "user": "alice", "amount": 0.2}) + "\n")
+
+    assert accounts.get_by_username("alice")['balance'] == 0.3
+
+    assert AccountRepository().get_by_username("alice")['balance'] == 0.3
+
+
+@pytest.fixture
+def names(data):
+    """Three accounts in a sharded layout under data/: two sharing a shard and one in another."""
+
+    candidates = [f"user{i}" for i in range(50)]
+
+    first = candidates[0]
+
+    same = next(name for name in candidates[1:] if shard_of(name, SHARDS) == shard_of(first, SHARDS))
+
+    other = next(name for name in candidates if shard_of(name, SHARDS) != shard_of(first, SHARDS))
+
+    accounts = AccountRepository()
+
+    for name in (first, same, other):
+        accounts.add(account(name, 10.0))
+
+    accounts.save()
+
+    reshard(SHARDS)
+
+    return first, same, other
+
+
+def test_a_lookup_reads_only_its_shard(names):
+    first, same, other = names
+
+    accounts = AccountRepository()
+
+    assert accounts.get_by_username(first)['balance'] == 10.0
+
+    assert accounts._loaded == {shard_of(first, SHARDS)}
+
+    assert accounts.get_by_username(same) is not None and accounts._loaded == {shard_of(first, SHARDS)}
+
+    assert accounts.get_by_email(f"{other}@example.com") is not None
+
+    assert accounts._loaded == set(range(SHARDS))
+
+
+def test_an_account_renamed_into_another_shard_is_found(names):
+    first, _, other = names
+
+    new_name = next(f"renamed{i}" for i in range(50) if shard_of(f"renamed{i}", SHARDS) == shard_of(other, SHARDS))
+
+    session, watching = AccountRepository(), AccountRepository()
+
+    assert watching.get_by_username(other) is not None  # reads only the shard the account moves into
+
+    moved = session.get_by_username(first)
+
+    session.credit(moved, 5.0)
+
+    session.rename(moved, new_name)
+
+    watching.refresh()  # the rename comes in from a shard it never read
+
+    assert watching._by_username[credential_key(new_name)]['balance'] == 15.0
+
+    assert shard_of(first, SHARDS) not in watching._loaded
+
+    for reopened in (AccountRepository(), AccountRepository()):
+        assert reopened.get_by_username(first) is None
+
+        assert reopened.get_by_username(new_name)['balance'] == 15.0
+
+        session.save()  # the second time round both shards come from the new files
+
+    assert sorted(a['username'] for a in AccountRepository().all()) == sorted([names[1], other, new_name])
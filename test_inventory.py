@@ -0,0 +1,69 @@
+"""Tests for loading the warehouse files: the parsed-file snapshot is plain data and is never run as code."""
+
+import json
+import pickle
+
+import pytest
+
+import inventory
+
+_unpickled = []
+
+
+def _run_on_unpickle():
+    _unpickled.append(True)
+
+
+class _Payload:
+    def __reduce__(self):
+        return _run_on_unpickle, ()
+
+
+@pytest.fixture
+def data(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    (tmp_path / "data").mkdir()
+
+    (tmp_path / "data" / "warehouse1.txt").write_text("Milo (500g): 3500;Salt (1kg): 800;")
+
+    return tmp_path / "data"
+
+
+def test_unchanged_files_come_from_the_snapshot(data, monkeypatch):
+    inventory.load_inventory_from_files()
+
+    snapshot = json.loads((data / "inventory.snapshot").read_text())
+
+    assert snapshot["files"]["warehouse1.txt"]["items"] == {"Milo (500g)": 3500.0, "Salt (1kg)": 800.0}
+
+    def no_parsing(filepath):
+        raise AssertionError(f"{filepath} was parsed again")
+
+    monkeypatch.setattr(inventory, "_parse_warehouse_file", no_parsing)
+
+    assert inventory.load_inventory_from_files()["Milo (500g)"]["price"] == 3500.0
+
+
+def test_a_pickled_snapshot_is_never_unpickled(data):
+    (data / "inventory.snapshot").write_bytes(pickle.dumps({"version": 2, "files": _Payload()}))
+
+    store = inventory.load_inventory_from_files()
+
+    assert not _unpickled
+
+    assert store["Salt (1kg)"]["price"] == 800.0
+
+    assert json.loads((data / "inventory.snapshot").read_text())["version"] == inventory.SNAPSHOT_VERSION
+
+
+def test_entries_of_the_wrong_shape_are_parsed_again(data):
+    inventory.load_inventory_from_files()
+
+    snapshot = json.loads((data / "inventory.snapshot").read_text())
+
+    snapshot["files"]["warehouse1.txt"]["items"] = ["not", "a", "dict"]
+
+    (data / "inventory.snapshot").write_text(json.dumps(snapshot))
+
+    assert inventory.load_inventory_from_files()["Milo (500g)"]["quantity"] == 10
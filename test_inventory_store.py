@@ -0,0 +1,188 @@
+"""Tests for the compact inventory store: per-warehouse stock, holds, warehouses taken away by a reload, and
+many threads buying the same scarce items at once."""
+
+import random
+import threading
+
+import pytest
+
+from inventory_store import InsufficientStockError, InventoryStore
+
+
+class RecordingLedger:
+    """Stands in for the stock ledger and keeps every delta it is told about."""
+
+    def __init__(self):
+        self.deltas = []
+
+    def record(self, name: str, warehouse: int, delta: int) -> None:
+        self.deltas.append((name, warehouse, delta))
+
+    def total(self, name: str, warehouse: int) -> int:
+        return 0
+
+
+@pytest.fixture
+def store():
+    store = InventoryStore()
+
+    store.ledger = RecordingLedger()
+
+    store.set_stock("Milo", 1, 500.0, 10)
+
+    store.set_stock("Milo", 4, 520.0, 3)
+
+    return store
+
+
+def test_stock_is_taken_from_the_highest_warehouse_first(store):
+    assert store.allocate("Milo", 5) == [(4, 3), (1, 2)]
+
+    assert store.available("Milo") == 8
+
+    assert store.release("Milo", 5) == [(1, 2), (4, 3)]
+
+    assert store.available("Milo") == 13 and store.ledger.deltas == []
+
+
+def test_giving_back_units_of_a_removed_warehouse_credits_nobody(store):
+    store.allocate("Milo", 3)  # all of warehouse 4
+
+    store.remove_stock("Milo", 4)
+
+    assert store.available("Milo") == 10
+
+    assert store.release("Milo", 3) == []
+
+    assert store.available("Milo") == 10 and store.locations("Milo") == [(1, 500.0, 10)]
+
+    assert store.ledger.deltas == [] and sum(store._location_held) == 0 and not store._tombstones
+
+
+def test_a_removed_warehouse_keeps_its_holds_apart_from_the_others(store):
+    store.allocate("Milo", 5)  # 3 from warehouse 4, 2 from warehouse 1
+
+    store.remove_stock("Milo", 4)
+
+    store.release("Milo", 3)  # the cart that held warehouse 4's units gives them back
+
+    store.commit("Milo", 2)  # warehouse 1's units are still held and can be sold
+
+    assert store.ledger.deltas == [("Milo", 1, -2)]
+
+    assert store.available("Milo") == 8 and sum(store._location_held) == 0
+
+
+def test_units_held_from_a_removed_warehouse_can_still_be_sold(store):
+    store.allocate("Milo", 3)
+
+    store.remove_stock("Milo", 4)
+
+    store.commit("Milo", 3)
+
+    assert store.ledger.deltas == [("Milo", 4, -3)]
+
+    assert store.available("Milo") == 10 and not store._tombstones
+
+
+def test_holds_on_an_item_removed_and_added_again_are_dropped(store):
+    store.allocate("Milo", 4)
+
+    store.remove_stock("Milo", 4)
+
+    store.remove_stock("Milo", 1)
+
+    assert "Milo" not in store
+
+    store.set_stock("Milo", 1, 500.0, 10)
+
+    assert store.release("Milo", 4) == []
+
+    assert store.available("Milo") == 10 and store.ledger.deltas == []
+
+
+def test_raising_the_quantity_adds_new_stock(store):
+    store["Milo"]["quantity"] = 20
+
+    assert store.available("Milo") == 20
+
+    assert store.ledger.deltas == [("Milo", 4, 7)]
+
+
+def test_lowering_the_quantity_takes_stock_away(store):
+    store["Milo"]["quantity"] -= 4
+
+    assert store.available("Milo") == 9 and sum(store._location_held) == 0
+
+    assert store.ledger.deltas == [("Milo", 4, -3), ("Milo", 1, -1)]
+
+    with pytest.raises(InsufficientStockError):
+        store["Milo"]["quantity"] = -1
+
+    assert store.available("Milo") == 9
+
+
+@pytest.mark.parametrize("basket, error", [({"Milo": 2, "Ovaltine": 1}, InsufficientStockError),
+                                           ({"Milo": 2, "Bournvita": 0}, ValueError)])
+def test_reserving_several_items_takes_nothing_if_one_fails(store, basket, error):
+    store.set_stock("Bournvita", 1, 450.0, 5)
+
+    with pytest.raises(error):
+        store.reserve_many(basket)
+
+    assert store.available("Milo") == 13 and store.available("Bournvita") == 5
+
+    assert sum(store._location_held) == 0
+
+
+@pytest.mark.parametrize("threads_count", [16])
+def test_stock_is_never_oversold(threads_count):
+    # many threads grab random baskets of scarce items; the stock must never be oversold
+    store = InventoryStore()
+
+    for i in range(200):
+        store.set_stock(f"item {i}", 1 + i % 3, 100.0, 50)  # 10,000 units in all
+
+        store.set_stock(f"item {i}", 4, 100.0, 25)
+
+    sold = [0] * threads_count
+
+    def shopper(index: int) -> None:
+        rng = random.Random(index)
+
+        for _ in range(2000):
+            basket = {f"item {rng.randrange(200)}": rng.randint(1, 4) for _ in range(rng.randint(1, 5))}
+
+            try:
+                store.reserve_many(basket)
+
+            except InsufficientStockError:
+                continue
+
+            if rng.random() < 0.3:  # gives some of it back, like a cart that is emptied
+                for name, quantity in basket.items():
+                    store.release(name, quantity)
+
+            else:
+                for name, quantity in basket.items():
+                    store.commit(name, quantity)
+
+                sold[index] += sum(basket.values())
+
+    workers = [threading.Thread(target=shopper, args=(index,)) for index in range(threads_count)]
+
+    for worker in workers:
+        worker.start()
+
+    for worker in workers:
+        worker.join()
+
+    left = sum(store.available(name) for name in store)
+
+    assert sum(sold) + left == 200 * 75, "stock was oversold or lost"
+
+    assert sum(store._location_held) == 0, "a warehouse kept a stale hold"
+
+    assert all(available >= 0 for available in store._location_available), "a warehouse went below zero"
+
+    assert all(store.available(name) == sum(available for _, _, available in store.locations(name)) for name in store)
@@ -0,0 +1,121 @@
+"""Tests for the wallet ledger: linked per-user history across renames and deletions, checkpoints, and
+lines damaged or cut short by a crash."""
+
+import pytest
+
+from money_ledger import MoneyLedger, reconcile
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "money.ledger"), str(tmp_path / "money.checkpoint")
+
+
+@pytest.fixture
+def ledger(paths):
+    return MoneyLedger(*paths)
+
+
+def kinds(entries):
+    return [(entry["user"], entry["kind"], entry.get("amount")) for entry in entries]
+
+
+def test_history_follows_the_user_through_renames(ledger):
+    ledger.credit("alice", 500, 500)
+
+    ledger.credit("bob", 100, 100)
+
+    ledger.rename("alice", "Alicia")
+
+    ledger.debit("alicia", 200, 300)
+
+    assert kinds(ledger.history("ALICIA")) == [("alice", "opening", 0), ("alice", "credit", 500),
+                                               ("alice", "rename", None), ("alicia", "debit", 200)]
+
+    assert kinds(ledger.history("alicia", limit=2)) == [("alice", "rename", None), ("alicia", "debit", 200)]
+
+    assert ledger.history("alice") == []
+
+    assert ledger.balance("alicia") == 300
+
+
+def test_a_reused_name_starts_a_new_history(ledger):
+    ledger.credit("alice", 500, 500)
+
+    ledger.close("alice")
+
+    ledger.credit("alice", 50, 50)
+
+    assert kinds(ledger.history("alice")) == [("alice", "opening", 0), ("alice", "credit", 50)]
+
+
+def test_history_survives_a_checkpoint_and_a_restart(paths):
+    ledger = MoneyLedger(*paths, checkpoint_every=3)
+
+    for amount in range(1, 6):
+        ledger.credit("alice", amount, sum(range(1, amount + 1)))
+
+    ledger.flush()
+
+    reopened = MoneyLedger(*paths)
+
+    assert [entry["amount"] for entry in reopened.history("alice", limit=3)] == [3, 4, 5]
+
+    assert reopened.balance("alice") == 15
+
+
+def test_a_damaged_line_is_skipped(paths):
+    ledger = MoneyLedger(*paths)
+
+    ledger.credit("alice", 500, 500)
+
+    ledger.flush()
+
+    with open(paths[0], 'ab') as f:
+        f.write(b'{"seq": 3, "user": "ali\n')  # a crash cut this entry short, and another was written after it
+
+    reopened = MoneyLedger(*paths)
+
+    assert reopened.balance("alice") == 500
+
+    reopened.debit("alice", 100, 400)
+
+    assert [entry["kind"] for entry in reopened.history("alice")] == ["opening", "credit", "debit"]
+
+    assert reconcile(*paths)["problems"] == []
+
+
+def test_a_line_cut_short_is_dropped_before_the_next_append(paths):
+    ledger = MoneyLedger(*paths)
+
+    ledger.credit("alice", 500, 500)
+
+    ledger.flush()
+
+    with open(paths[0], 'ab') as f:
+        f.write(b'{"seq": 3, "user": "ali')  # a crash stopped this entry before its newline
+
+    reopened = MoneyLedger(*paths)
+
+    reopened.debit("alice", 100, 400)
+
+    reopened.credit("alice", 50, 450)
+
+    reopened.flush()
+
+    assert reconcile(*paths)["problems"] == []
+
+    assert kinds(MoneyLedger(*paths).history("alice")) == [("alice", "opening", 0), ("alice", "credit", 500),
+                                                           ("alice", "debit", 100), ("alice", "credit", 50)]
+
+
+def test_another_copys_entries_show_up_in_history(paths):
+    ours, theirs = MoneyLedger(*paths), MoneyLedger(*paths)
+
+    ours.credit("alice", 500, 500)
+
+    theirs.debit("alice", 100, 400)
+
+    theirs.flush()
+
+    assert [entry["kind"] for entry in ours.history("alice")] == ["opening", "credit", "debit"]
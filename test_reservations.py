@@ -0,0 +1,182 @@
+"""Tests for the timed stock holds in reservations.py, with a fake clock so nothing waits."""
+
+import threading
+
+import pytest
+
+from shopping_cart import Cart
+from inventory_store import InventoryStore
+from reservations import Reservations
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def store():
+    store = InventoryStore()
+
+    store.set_stock("Widget", 1, 10.0, 10)
+
+    store.set_stock("Gadget", 2, 5.0, 10)
+
+    return store
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def reservations(store, clock):
+    reservations = Reservations(ttl=60, clock=clock)
+
+    reservations.attach(store, reaper=False)
+
+    return reservations
+
+
+def test_a_new_cart_never_inherits_a_freed_carts_holds(store, reservations):
+    store.set_stock("Widget", 1, 10.0, 100)  # the freed carts' holds stay until they expire
+
+    for _ in range(50):  # freed carts' ids are handed straight back to new ones
+        old = Cart(store)
+
+        reservations.hold(old, "Widget", 1)
+
+        old_id = id(old)
+
+        del old
+
+        new = Cart(store)
+
+        assert reservations.held(new, "Widget") == 0, f"cart {old_id} -> {id(new)} inherited a hold"
+
+        reservations.release_all(new)
+
+
+def test_holding_several_items_keeps_the_ones_taken_when_others_fail(store, reservations):
+    store.set_stock("Sprocket", 3, 1.0, 1)
+
+    cart = Cart(store)
+
+    held = reservations.hold_each(cart, {"Widget": 2, "Gadget": 0, "Gone": 1, "Sprocket": 3})
+
+    assert held == {"Widget": [(1, 2)], "Gadget": None, "Gone": None, "Sprocket": None}
+
+    assert reservations.held(cart, "Widget") == 2 and store.available("Widget") == 8
+
+    reservations.release_all(cart)
+
+    assert store.available("Widget") == 10 and sum(store._location_held) == 0
+
+
+def test_expired_holds_go_back_to_the_warehouses(store, reservations, clock):
+    cart = Cart(store)
+
+    reservations.hold(cart, "Widget", 4)
+
+    clock.now = 59
+
+    assert reservations.reap() == 0
+
+    clock.now = 61
+
+    assert reservations.reap() == 4
+
+    assert store.available("Widget") == 10 and reservations.held(cart, "Widget") == 0
+
+
+def test_confirm_takes_expired_holds_again(store, reservations, clock):
+    cart = Cart(store)
+
+    reservations.hold(cart, "Widget", 3)
+
+    cart["Widget"] = 3
+
+    clock.now = 120
+
+    assert reservations.confirm(cart, lambda: None) == []
+
+    assert store.available("Widget") == 7 and sum(store._location_held) == 0
+
+
+def test_confirm_gives_back_holds_the_cart_no_longer_lists(store, reservations):
+    cart = Cart(store)
+
+    reservations.hold(cart, "Widget", 5)
+
+    reservations.hold(cart, "Gadget", 2)
+
+    cart["Widget"] = 2  # lowered without releasing, and Gadget never made it into the cart
+
+    assert reservations.confirm(cart, lambda: None) == []
+
+    assert store.available("Widget") == 8 and store.available("Gadget") == 10
+
+    assert sum(store._location_held) == 0
+
+
+def test_confirm_keeps_the_holds_when_payment_fails(store, reservations):
+    cart = Cart(store)
+
+    reservations.hold(cart, "Widget", 2)
+
+    cart["Widget"] = 2
+
+    def pay():
+        raise RuntimeError("declined")
+
+    with pytest.raises(RuntimeError):
+        reservations.confirm(cart, pay)
+
+    assert reservations.held(cart, "Widget") == 2 and store.available("Widget") == 8
+
+
+def test_other_carts_dont_wait_for_a_payment(store, reservations):
+    paying, buyer = Cart(store), Cart(store)
+
+    reservations.hold(paying, "Widget", 2)
+
+    paying["Widget"] = 2
+
+    other_cart_done = threading.Event()
+
+    def add_to_another_cart():
+        reservations.hold(buyer, "Gadget", 1)
+
+        reservations.release(buyer, "Gadget", 1)
+
+        other_cart_done.set()
+
+    def slow_pay():
+        threading.Thread(target=add_to_another_cart).start()
+
+        assert other_cart_done.wait(5), "another cart was blocked while this one paid"
+
+    assert reservations.confirm(paying, slow_pay) == []
+
+    assert store.available("Widget") == 8 and store.available("Gadget") == 10
+
+
+def test_the_reaper_leaves_a_cart_alone_while_it_pays(store, reservations, clock):
+    cart = Cart(store)
+
+    reservations.hold(cart, "Widget", 2)
+
+    cart["Widget"] = 2
+
+    def pay():
+        clock.now = 120
+
+        assert reservations.reap() == 0
+
+    assert reservations.confirm(cart, pay) == []
+
+    assert store.available("Widget") == 8 and sum(store._location_held) == 0
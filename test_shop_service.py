@@ -0,0 +1,163 @@
+"""Tests for the headless shop service: cart operations on an in-memory catalogue, and checkout against
+data files in a temporary directory. No menus involved."""
+
+import threading
+import time
+
+import pytest
+
+import account_store
+import money_ledger
+import order_log
+import shop_service
+import storage
+from shopping_cart import Cart
+from inventory_store import InventoryStore
+
+
+PASSWORD = "Str0ng!Passw0rd-long"
+
+
+@pytest.fixture
+def store():
+    store = InventoryStore()
+
+    store.set_stock("Widget", 1, 10.0, 5)
+
+    return store
+
+
+@pytest.mark.parametrize("quantity", [0, -5])
+def test_add_to_cart_rejects_non_positive_quantities(store, quantity):
+    cart = Cart(store)
+
+    result = shop_service.add_to_cart(cart, store, "Widget", quantity)
+
+    assert not result.ok and result.error == "invalid_quantity"
+
+    assert cart == {} and cart.subtotal == 0
+
+    assert store.available("Widget") == 5
+
+
+@pytest.mark.parametrize("quantity", [0, -2])
+def test_remove_from_cart_rejects_non_positive_quantities(store, quantity):
+    cart = Cart(store)
+
+    shop_service.add_to_cart(cart, store, "Widget", 2)
+
+    result = shop_service.remove_from_cart(cart, store, "Widget", quantity)
+
+    assert not result.ok and result.error == "invalid_quantity"
+
+    assert cart == {"Widget": 2}
+
+    assert store.available("Widget") == 3
+
+
+@pytest.mark.parametrize("method", ["allocate", "release", "commit"])
+def test_stock_moves_need_a_positive_quantity(store, method):
+    with pytest.raises(ValueError):
+        getattr(store, method)("Widget", 0)
+
+    assert store.available("Widget") == 5
+
+
+def test_a_saved_cart_comes_back_cut_to_the_stock_left(store):
+    cart = Cart(store)
+
+    result = shop_service.restore_cart(cart, store, {"Widget": 7, "Gone": 1})
+
+    assert not result.ok and result.error == "partial"
+
+    assert result.report == [{"name": "Widget", "quantity": 7, "restored": 5}, {"name": "Gone", "quantity": 1, "restored": 0}]
+
+    assert result.message.count("no longer in stock") == 1
+
+    assert cart == {"Widget": 5} and store.available("Widget") == 0
+
+    assert shop_service.clear_cart(cart, store).ok and store.available("Widget") == 5
+
+
+@pytest.fixture
+def user(tmp_path, monkeypatch):
+    """A signed-in user whose data files live in tmp_path, with the app's singletons reset around the test."""
+
+    monkeypatch.chdir(tmp_path)
+
+    (tmp_path / "data").mkdir()
+
+    for module, name in ((account_store, "_repository"), (money_ledger, "_ledger"), (order_log, "_order_log"),
+                         (storage, "_storage")):
+        monkeypatch.setattr(module, name, None)
+
+    assert shop_service.sign_up("alice", "alice@example.com", PASSWORD).ok
+
+    return shop_service.sign_in("alice", PASSWORD).account
+
+
+def test_password_checks_run_on_the_bounded_pool(user, monkeypatch):
+    running, most, threads, lock = 0, 0, set(), threading.Lock()
+
+    def slow_verify(password, stored_hash):
+        nonlocal running, most
+
+        with lock:
+            threads.add(threading.current_thread().name.split("_")[0])
+
+            running += 1
+
+            most = max(most, running)
+
+        time.sleep(0.02)
+
+        with lock:
+            running -= 1
+
+        return True
+
+    monkeypatch.setattr(shop_service, "verify_password", slow_verify)
+
+    sessions = [threading.Thread(target=shop_service.check_password, args=(user, PASSWORD)) for _ in range(12)]
+
+    for session in sessions:
+        session.start()
+
+    for session in sessions:
+        session.join()
+
+    assert most == shop_service.PASSWORD_WORKERS and threads == {"password-check"}
+
+
+def test_checkout_sees_money_added_in_another_session(user, store):
+    other_session = account_store.AccountRepository()
+
+    other_session.credit(other_session.find("alice"), 100.0)
+
+    assert user['balance'] == 0  # this session hasn't looked since
+
+    cart = Cart(store)
+
+    shop_service.add_to_cart(cart, store, "Widget", 3)
+
+    result = shop_service.checkout(user, cart, store)
+
+    assert result.ok and result.balance == 70.0
+
+    assert cart == {} and store.available("Widget") == 2 and sum(store._location_held) == 0
+
+
+def test_checkout_without_the_money_empties_the_cart(user, store):
+    shop_service.fund_wallet(user, 15.0)
+
+    cart = Cart(store)
+
+    shop_service.add_to_cart(cart, store, "Widget", 2)
+
+    result = shop_service.checkout(user, cart, store)
+
+    assert not result.ok and result.error == "insufficient_funds"
+
+    assert cart == {} and store.available("Widget") == 5
+
+    assert user['balance'] == 15.0
@@ -0,0 +1,24 @@
+"""Tests for the stock ledger's log: lines cut short by a crash."""
+
+from stock_ledger import StockLedger
+
+
+def test_a_line_cut_short_is_dropped_before_the_next_batch(tmp_path):
+    log_file, snapshot_file = str(tmp_path / "stock.log"), str(tmp_path / "stock.snapshot")
+
+    ledger = StockLedger(log_file, snapshot_file)
+
+    ledger.record("Milo", 1, 10)
+
+    ledger.flush()
+
+    with open(log_file, 'ab') as f:
+        f.write(b'[2, "Mil')  # a crash stopped this line before its newline
+
+    reopened = StockLedger(log_file, snapshot_file)
+
+    reopened.record("Milo", 1, -3)
+
+    reopened.flush()
+
+    assert StockLedger(log_file, snapshot_file).total("Milo", 1) == 7